@@ -0,0 +1,455 @@
+"""
+run.py measures the overhead of kubipy's own Python orchestration layer.
+The real minikube, kubectl and docker are replaced by the scripted stand-ins
+of shim.py, so no cluster is needed. Every benchmark records its wall time and
+the time spent in external commands. The difference, the overhead, is what
+kubipy itself costs and what two runs should be compared on.
+
+Usage:
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --counts 10 100 1000 --repeat 10 --output after.json
+    python benchmarks/run.py compare before.json after.json
+"""
+
+# import libs
+import contextlib
+import subprocess
+import statistics
+import argparse
+import platform
+import tempfile
+import shutil
+import json
+import time
+import sys
+import io
+import os
+
+# make the package importable from a checkout
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# import modules
+from kubipy.utils import minipy
+from kubipy.runner import CommandRunner, percentile
+
+# define the tools the shims stand in for
+TOOLS = ('minikube', 'kubectl', 'docker', 'VBoxManage')
+
+
+# setup class
+class Sandbox:
+
+    # describe class
+    def __init__(self, latency = None):
+
+        """
+        Class to put the shims on the PATH and isolate the kubipy caches.
+        Parameters
+        ----------
+        latency : dict
+            Dictionary with the seconds per command name the shims sleep
+        """
+
+        # define the slots
+        self.root = tempfile.mkdtemp(prefix = 'kubipy-bench-')
+        self.bin_dir = os.path.join(self.root, 'bin')
+        self.config_path = os.path.join(self.root, 'config.json')
+        self.config = {'latency': dict(latency or {}), 'objects': {}, 'state_dir': os.path.join(self.root, 'state')}
+        self.__environ = None
+
+        # write one wrapper per tool
+        os.makedirs(self.bin_dir)
+        shim = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shim.py')
+        for tool in TOOLS:
+            path = os.path.join(self.bin_dir, tool)
+            with open(path, 'w') as file:
+                file.write('#!' + sys.executable + '\nimport runpy, sys\nsys.argv.insert(1, ' + repr(tool)
+                           + ')\nrunpy.run_path(' + repr(shim) + ", run_name = '__main__')\n")
+            os.chmod(path, 0o755)
+
+    # function to configure the shims
+    def configure(self, **objects):
+
+        """
+        Main method to set the number of objects 'kubectl get' returns.
+        """
+
+        # write the configuration
+        self.config['objects'] = dict(objects)
+        with open(self.config_path, 'w') as file:
+            json.dump(self.config, file)
+
+    # function to set the state of the cluster
+    def set_cluster(self, state):
+
+        """
+        Main method to set the state of the cluster, e.g. 'stopped'.
+        """
+
+        # write the state the minikube shim reports
+        os.makedirs(os.path.join(self.config['state_dir'], 'clusters'), exist_ok = True)
+        with open(os.path.join(self.config['state_dir'], 'clusters', 'minikube'), 'w') as file:
+            file.write(state)
+
+    # function to reset the caches
+    def clear_cache(self):
+
+        """
+        Main method to remove the kubipy caches, e.g. for cold starts.
+        """
+
+        # remove the directory
+        shutil.rmtree(os.path.join(self.root, 'home'), ignore_errors = True)
+
+    # function to enter the sandbox
+    def __enter__(self):
+
+        # remember the environment
+        self.__environ = dict(os.environ)
+
+        # put the shims first and isolate the caches
+        os.environ['PATH'] = self.bin_dir + os.pathsep + os.environ.get('PATH', '')
+        os.environ['KUBIPY_HOME'] = os.path.join(self.root, 'home')
+        os.environ['KUBIPY_BENCH_CONFIG'] = self.config_path
+        self.configure()
+
+        # return self
+        return self
+
+    # function to leave the sandbox
+    def __exit__(self, *exc_info):
+
+        # restore the environment
+        os.environ.clear()
+        os.environ.update(self.__environ)
+
+        # remove the files
+        shutil.rmtree(self.root, ignore_errors = True)
+
+
+# setup class
+class Timer:
+
+    # describe class
+    def __init__(self):
+
+        """
+        Class to collect the time spent in external commands, as a runner
+        hook. Commands running at the same time, like the component probes,
+        are counted once.
+        """
+
+        # define the slots
+        self.intervals = []
+
+    # function called with every result
+    def __call__(self, result):
+
+        # keep the interval the command ran in
+        ended = time.perf_counter()
+        self.intervals.append((ended - result.seconds, ended))
+
+    # function to count the commands
+    @property
+    def commands(self):
+
+        # count the intervals
+        return len(self.intervals)
+
+    # function to add up the time
+    @property
+    def seconds(self):
+
+        # merge overlapping intervals
+        total = 0.0
+        start, end = None, None
+        for begin, finish in sorted(self.intervals):
+            if end is None or begin > end:
+                if end is not None:
+                    total = total + end - start
+                start, end = begin, finish
+            else:
+                end = max(end, finish)
+
+        # add the last one
+        if end is not None:
+            total = total + end - start
+
+        # return the time
+        return total
+
+
+# function to measure a benchmark
+def measure(name, setup, body, repeat, results):
+
+    """
+    Function to run a benchmark several times and summarize it.
+    Parameters
+    ----------
+    name : string
+        String with the name of the benchmark
+    setup : function
+        Function run before every repetition, returning the argument of body
+    body : function
+        Function timed, called with the result of setup and a runner
+    repeat : int
+        Integer with the number of repetitions
+    results : dict
+        Dictionary the summary is added to
+    """
+
+    # run the repetitions
+    walls = []
+    overheads = []
+    commands = 0
+    for _ in range(repeat):
+
+        # prepare the repetition
+        state = setup()
+        timer = Timer()
+        runner = CommandRunner(hooks = [timer])
+
+        # time the body, the banners of kubipy are not part of the benchmark
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            body(state, runner)
+            wall = time.perf_counter() - started
+
+        # keep the numbers
+        walls.append(wall)
+        overheads.append(max(wall - timer.seconds, 0.0))
+        commands = timer.commands
+
+    # summarize
+    walls.sort()
+    overheads.sort()
+    results[name] = {'repeat': repeat,
+                     'commands': commands,
+                     'wall_min': walls[0],
+                     'wall_median': statistics.median(walls),
+                     'wall_p95': percentile(walls, 0.95),
+                     'overhead_min': overheads[0],
+                     'overhead_median': statistics.median(overheads),
+                     'overhead_p95': percentile(overheads, 0.95)}
+
+    # show progress on stderr
+    print (name.ljust(36) + format(results[name]['wall_median'] * 1000, '10.2f') + ' ms wall'
+           + format(results[name]['overhead_median'] * 1000, '10.2f') + ' ms overhead', file = sys.stderr)
+
+
+# function to run all benchmarks
+def run(counts, repeat, latency):
+
+    """
+    Function to run all benchmarks.
+    Parameters
+    ----------
+    counts : list
+        List with the numbers of objects the listings are measured at
+    repeat : int
+        Integer with the number of repetitions per benchmark
+    latency : dict
+        Dictionary with the seconds per command name the shims sleep
+    Returns
+    -------
+    dict
+        Dictionary with the summary per benchmark
+    """
+
+    # collect the results
+    results = {}
+
+    # work in the sandbox
+    with Sandbox(latency) as sandbox:
+
+        # write the files to deploy
+        script_file = os.path.join(sandbox.root, 'api.py')
+        requirements_file = os.path.join(sandbox.root, 'requirements.txt')
+        with open(requirements_file, 'w') as file:
+            file.write('flask\n')
+
+        # define helper to write a script, new content means a new image
+        def write_script(content):
+            with open(script_file, 'w') as file:
+                file.write('# ' + content + '\nprint("api")\n')
+
+        # construction without and with the component cache
+        def cold():
+            sandbox.clear_cache()
+        measure('construct_cold', cold, lambda _, runner: minipy(greeting = False, runner = runner),
+                repeat, results)
+        measure('construct_warm', lambda: None, lambda _, runner: minipy(greeting = False, runner = runner),
+                repeat, results)
+        measure('construct_lazy', lambda: None, lambda _, runner: minipy(lazy = True, runner = runner),
+                repeat, results)
+
+        # start a running, a paused and a stopped cluster
+        def start(_, runner):
+            minipy(lazy = True, runner = runner).start()
+        for state in ('running', 'paused', 'stopped'):
+            measure('start_' + state, lambda state = state: sandbox.set_cluster(state), start, repeat, results)
+        sandbox.set_cluster('running')
+
+        # deploy, with a build and with an unchanged image
+        def changed():
+            write_script(str(time.perf_counter_ns()))
+        def deploy(_, runner):
+            minipy(greeting = False, runner = runner).deploy(script_file, requirements_file, '8000', 'bench-api')
+        measure('deploy_build', changed, deploy, repeat, results)
+        measure('deploy_cached', lambda: None, deploy, repeat, results)
+
+        # listings and deletions at every object count
+        for count in counts:
+
+            # configure the shims
+            sandbox.configure(pods = count, services = count, deployments = count)
+
+            # list every kind
+            for kind in ('deployments', 'services', 'pods'):
+                def listing(_, runner, kind = kind):
+                    getattr(minipy(lazy = True, runner = runner), 'get_' + kind)()
+                measure('get_' + kind + '_' + str(count), lambda: None, listing, repeat, results)
+
+            # delete a pod, a service and a deployment
+            def delete(_, runner):
+                minipy(lazy = True, runner = runner).delete_object(pod = 'api-0', service = 'api-0',
+                                                                   deployment = 'api-0')
+            measure('delete_object_' + str(count), lambda: None, delete, repeat, results)
+
+    # return the results
+    return results
+
+
+# helper function to describe the environment
+def environment():
+
+    """
+    Function to describe the machine and the commit the results belong to.
+    """
+
+    # try to read the commit
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = ROOT, capture_output = True,
+                                timeout = 10).stdout.decode('utf-8').strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        commit = None
+
+    # return the description
+    return {'commit': commit,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+# function to compare two runs
+def compare(base_path, head_path, threshold, metric, min_delta):
+
+    """
+    Function to compare two result files and print the changes.
+    Parameters
+    ----------
+    base_path : string
+        String with the path of the results to compare against
+    head_path : string
+        String with the path of the new results
+    threshold : float
+        Float with the relative slowdown that counts as regression, e.g. 0.1
+    metric : string
+        String with the metric compared, e.g. 'overhead_median'
+    min_delta : float
+        Float with the seconds a change has to exceed to be flagged, so noise
+        in sub-millisecond benchmarks is not reported
+    Returns
+    -------
+    int
+        Integer with the number of regressions
+    """
+
+    # read both files
+    with open(base_path) as file:
+        base = json.load(file)
+    with open(head_path) as file:
+        head = json.load(file)
+
+    # print the header
+    print ('benchmark'.ljust(36) + 'base (ms)'.rjust(12) + 'head (ms)'.rjust(12) + 'change'.rjust(10))
+
+    # compare every benchmark in both files
+    regressions = 0
+    for name in head['results']:
+
+        # skip new benchmarks
+        if name not in base['results']:
+            continue
+
+        # compute the change
+        before = base['results'][name][metric]
+        after = head['results'][name][metric]
+        change = (after - before) / before if before else 0.0
+
+        # flag regressions
+        flag = ''
+        if change > threshold and after - before > min_delta:
+            flag = '  slower'
+            regressions = regressions + 1
+        elif change < -threshold and before - after > min_delta:
+            flag = '  faster'
+
+        # print the line
+        print (name.ljust(36) + format(before * 1000, '12.2f') + format(after * 1000, '12.2f')
+               + format(change * 100, '+9.1f') + '%' + flag)
+
+    # return the regressions
+    return regressions
+
+
+# function to parse the arguments
+def main(argv = None):
+
+    """
+    Function to run the benchmarks or compare two runs from the command line.
+    """
+
+    # define the arguments
+    parser = argparse.ArgumentParser(description = 'Benchmark the kubipy orchestration layer.')
+    subparsers = parser.add_subparsers(dest = 'command')
+    parser.add_argument('--counts', type = int, nargs = '+', default = [10, 100, 1000],
+                        help = 'object counts the listings are measured at')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'repetitions per benchmark')
+    parser.add_argument('--latency', type = json.loads, default = {},
+                        help = 'JSON with seconds per command, e.g. \'{"docker build": 0.5}\'')
+    parser.add_argument('--output', help = 'file the JSON results are written to, default stdout')
+    comparison = subparsers.add_parser('compare', help = 'compare two result files')
+    comparison.add_argument('base')
+    comparison.add_argument('head')
+    comparison.add_argument('--threshold', type = float, default = 0.10,
+                            help = 'relative slowdown that counts as regression')
+    comparison.add_argument('--metric', default = 'overhead_median', help = 'metric to compare')
+    comparison.add_argument('--min-delta', type = float, default = 0.001,
+                            help = 'seconds a change has to exceed to be flagged')
+    args = parser.parse_args(argv)
+
+    # compare two runs, regressions make the exit code non-zero
+    if args.command == 'compare':
+        return 1 if compare(args.base, args.head, args.threshold, args.metric, args.min_delta) else 0
+
+    # run the benchmarks
+    report = {'environment': environment(),
+              'settings': {'counts': args.counts, 'repeat': args.repeat, 'latency': args.latency},
+              'results': run(args.counts, args.repeat, args.latency)}
+
+    # write the results
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+    else:
+        json.dump(report, sys.stdout, indent = 2)
+
+    # done
+    return 0
+
+
+# run the benchmarks
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+shim.py is a scripted stand-in for minikube, kubectl, docker and VBoxManage.
+run.py installs one small wrapper per tool on the PATH, which runs this file
+with the name of the tool as first argument. The behaviour is read from the
+JSON file in KUBIPY_BENCH_CONFIG:
+
+latency : dict
+    Seconds to sleep per command name, e.g. {"docker build": 0.5}, with the
+    executable name and 'default' as fallbacks
+objects : dict
+    Number of objects 'kubectl get' returns per kind
+state_dir : str
+    Directory in which built images and the state of every profile are
+    remembered
+cluster : str
+    State of a profile before its first start, stop or pause: 'running'
+    (default), 'paused', 'stopped' or 'missing'
+boot : dict
+    Seconds 'minikube start' spends on the 'driver' and the 'kubernetes'
+    phase, printed like minikube does
+ready_after : float
+    Seconds after a start until /readyz answers 'ok'
+service_url : str
+    Url 'minikube service --url' prints, e.g. of a local HTTP stand-in
+log_lines : int
+    Lines per pod 'kubectl logs' prints without -f, with -f one line per pod
+    follows every log_interval seconds
+"""
+
+# import libs
+import datetime
+import json
+import time
+import sys
+import os
+
+
+# helper function to read the configuration
+def load_config():
+
+    """
+    Function to read the configuration of the shims.
+    """
+
+    # read the file
+    with open(os.environ['KUBIPY_BENCH_CONFIG']) as file:
+        return json.load(file)
+
+
+# helper function to name a command
+def command_name(tool, args):
+
+    """
+    Function to name a command like the runner does, e.g. 'kubectl get'.
+    """
+
+    # skip options and their values
+    index = 0
+    while index < len(args):
+        if not args[index].startswith('-'):
+            return tool + ' ' + args[index]
+        if args[index] in ('-p', '--profile', '-n', '--namespace', '--context'):
+            index = index + 1
+        index = index + 1
+
+    # the executable only
+    return tool
+
+
+# helper function to create fake objects
+def render_items(kind, count, namespace):
+
+    """
+    Function to create the objects 'kubectl get -o json' returns.
+    """
+
+    # all objects are one hour old
+    created = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours = 1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # build the objects
+    items = []
+    for index in range(count):
+
+        # every object belongs to a deployment
+        app = 'api-' + str(index)
+        metadata = {'name': app, 'namespace': namespace, 'creationTimestamp': created,
+                    'resourceVersion': str(1000 + index), 'uid': 'uid-' + kind + '-' + str(index),
+                    'labels': {'app': app, 'app.kubernetes.io/managed-by': 'kubipy'}}
+
+        # pods
+        if kind.startswith('pod'):
+            metadata = dict(metadata, name = app + '-5d9c7b6f4-x' + str(index),
+                            ownerReferences = [{'kind': 'ReplicaSet', 'name': app + '-5d9c7b6f4'}])
+            items.append({'apiVersion': 'v1', 'kind': 'Pod', 'metadata': metadata,
+                          'spec': {'nodeName': 'minikube',
+                                   'containers': [{'name': app, 'image': 'kubipy-image:0123456789abcdef',
+                                                   'ports': [{'containerPort': 8000}]}]},
+                          'status': {'phase': 'Running', 'podIP': '172.17.0.' + str(index % 250 + 2),
+                                     'containerStatuses': [{'name': app, 'ready': True, 'restartCount': 0,
+                                                            'state': {'running': {'startedAt': created}}}]}})
+
+        # services
+        elif kind.startswith('service') or kind == 'svc':
+            items.append({'apiVersion': 'v1', 'kind': 'Service', 'metadata': metadata,
+                          'spec': {'type': 'NodePort', 'clusterIP': '10.96.0.' + str(index % 250 + 2),
+                                   'selector': {'app': app},
+                                   'ports': [{'port': 8000, 'targetPort': 8000, 'protocol': 'TCP',
+                                              'nodePort': 30000 + index % 2767}]}})
+
+        # deployments
+        else:
+            items.append({'apiVersion': 'apps/v1', 'kind': 'Deployment', 'metadata': metadata,
+                          'spec': {'replicas': 1, 'selector': {'matchLabels': {'app': app}},
+                                   'template': {'metadata': {'labels': {'app': app}},
+                                                'spec': {'containers': [{'name': app,
+                                                                         'image': 'kubipy-image:0123456789abcdef'}]}}},
+                          'status': {'replicas': 1, 'readyReplicas': 1, 'updatedReplicas': 1,
+                                     'availableReplicas': 1, 'observedGeneration': 1}})
+
+    # return the objects
+    return items
+
+
+# helper function to answer minikube
+def minikube(args, config):
+
+    """
+    Function to answer a minikube command.
+    """
+
+    # every profile has a state of its own
+    profile = 'minikube'
+    if args[:1] in (['-p'], ['--profile']):
+        profile, args = args[1], args[2:]
+
+    # docker-env, as shell exports or as plain pairs
+    if 'docker-env' in args:
+        env = {'DOCKER_TLS_VERIFY': '1', 'DOCKER_HOST': 'tcp://127.0.0.1:2376',
+               'DOCKER_CERT_PATH': os.path.join(config['state_dir'], 'certs'), 'MINIKUBE_ACTIVE_DOCKERD': 'minikube'}
+        plain = '--shell' in args and args[args.index('--shell') + 1] == 'none'
+        for key, value in env.items():
+            print (key + '=' + value if plain else 'export ' + key + '="' + value + '"')
+        return 0
+
+    # the url of a service
+    if args[:1] == ['service']:
+        print (config.get('service_url', 'http://192.168.59.100:30080'))
+        return 0
+
+    # start prints its phases
+    boot = config.get('boot', {})
+    if args[:1] == ['start']:
+        print ('😄  minikube v1.32.0 on Darwin 14.1')
+        print ('🔥  Creating virtualbox VM (CPUs=2, Memory=2048MB, Disk=20000MB) ...', flush = True)
+        time.sleep(boot.get('driver', 0))
+        print ('🐳  Preparing Kubernetes v1.28.3 on Docker 24.0.7 ...', flush = True)
+        time.sleep(boot.get('kubernetes', 0))
+        print ('🏄  Done! kubectl is now configured to use "minikube" cluster', flush = True)
+
+    # the cluster remembers start, stop, pause and delete
+    state_path = os.path.join(config['state_dir'], 'clusters', profile)
+    transitions = {'start': 'running', 'unpause': 'running', 'pause': 'paused', 'stop': 'stopped', 'delete': 'missing'}
+    if args[:1] and args[0] in transitions:
+        os.makedirs(os.path.dirname(state_path), exist_ok = True)
+        with open(state_path, 'w') as file:
+            file.write(transitions[args[0]])
+        return 0
+
+    # the status, as json or as text
+    if args[:1] == ['status']:
+        try:
+            with open(state_path) as file:
+                state = file.read()
+        except OSError:
+            state = config.get('cluster', 'running')
+        if state == 'missing':
+            print ('Profile "' + profile + '" not found. Run "minikube profile list" to view all profiles.')
+            return 85
+        host = 'Stopped' if state == 'stopped' else 'Running'
+        kubelet = 'Running' if state == 'running' else 'Stopped'
+        apiserver = {'running': 'Running', 'paused': 'Paused'}.get(state, 'Stopped')
+        if '-o' in args or '--output' in args:
+            print (json.dumps({'Name': profile, 'Host': host, 'Kubelet': kubelet,
+                               'APIServer': apiserver, 'Kubeconfig': 'Configured'}))
+        else:
+            print (profile + '\ntype: Control Plane\nhost: ' + host + '\nkubelet: ' + kubelet + '\napiserver: ' + apiserver)
+        return 0 if state == 'running' else 2 if state == 'paused' else 7
+
+    # the version
+    if args[:1] == ['version']:
+        print ('v1.32.0')
+        return 0
+
+    # anything else just works
+    return 0
+
+
+# helper function to answer kubectl
+def kubectl(args, config):
+
+    """
+    Function to answer a kubectl command.
+    """
+
+    # the context names the profile
+    context = 'minikube'
+    if args[:1] == ['--context']:
+        context, args = args[1], args[2:]
+
+    # the version
+    if args[:1] == ['version']:
+        print ('Client Version: v1.28.3')
+        return 0
+
+    # the readiness of the API server, some time after a start
+    if args[:3] == ['get', '--raw', '/readyz']:
+        try:
+            started = os.path.getmtime(os.path.join(config['state_dir'], 'clusters', context))
+        except OSError:
+            started = 0
+        if time.time() - started < config.get('ready_after', 0):
+            sys.stderr.write('Error from server (InternalError): an error on the server has prevented the request\n')
+            return 1
+        print ('ok')
+        return 0
+
+    # the metrics API, one sample per pod and node with the current time
+    if args[:3] == ['get', '--raw', args[2]] and args[2].startswith('/apis/metrics.k8s.io/'):
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if args[2].endswith('/nodes'):
+            items = [{'metadata': {'name': context}, 'timestamp': stamp, 'usage': {'cpu': '250m', 'memory': '1Gi'}}]
+        else:
+            items = [{'metadata': {'name': item['metadata']['name']}, 'timestamp': stamp,
+                      'containers': [{'name': 'app', 'usage': {'cpu': '1500000n', 'memory': '64Mi'}}]}
+                     for item in render_items('pods', config.get('objects', {}).get('pods', 0), 'default')]
+        sys.stdout.write(json.dumps({'kind': 'PodMetricsList', 'items': items}))
+        return 0
+
+    # the endpoints of a service, ready right away
+    if args[:2] == ['get', 'endpoints'] and len(args) > 2 and not args[2].startswith('-'):
+        sys.stdout.write(json.dumps({'kind': 'Endpoints', 'metadata': {'name': args[2]},
+                                     'subsets': [{'addresses': [{'ip': '10.244.0.5'}]}]}))
+        return 0
+
+    # lists
+    if args[:1] == ['get']:
+        kind = args[1]
+        namespace = args[args.index('-n') + 1] if '-n' in args else 'default'
+        key = 'pods' if kind.startswith('po') else 'services' if kind.startswith('s') else 'deployments'
+        items = render_items(kind, config.get('objects', {}).get(key, 0), namespace)
+        sys.stdout.write(json.dumps({'apiVersion': 'v1', 'kind': 'List', 'items': items,
+                                     'metadata': {'resourceVersion': ''}}))
+        return 0
+
+    # apply reads the objects from stdin
+    if args[:1] == ['apply']:
+        objects = json.loads(sys.stdin.read() or '{}')
+        for item in objects.get('items', [objects]):
+            print (item.get('kind', 'object').lower() + '/' + item.get('metadata', {}).get('name', '')
+                   + ' serverside-applied')
+        return 0
+
+    # logs of every pod, prefixed and timestamped, followed until killed
+    if args[:1] == ['logs']:
+        count = config.get('objects', {}).get('pods', 0)
+        line = 0
+        while True:
+            for index in range(count):
+                stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+                print ('[pod/api-' + str(index) + '-5d9c7b6f4-x' + str(index) + '/api-' + str(index) + '] '
+                       + stamp + ' GET / 200 line ' + str(line), flush = True)
+            line = line + 1
+            if '-f' not in args and line >= config.get('log_lines', 3):
+                return 0
+            if '-f' in args:
+                time.sleep(config.get('log_interval', 0.1))
+
+    # deletions, by name or by label
+    if args[:1] == ['delete']:
+        if '-l' in args:
+            for kind in args[1].split(','):
+                for item in render_items(kind, config.get('objects', {}).get(kind, 0), 'default'):
+                    print (kind.rstrip('s') + '/' + item['metadata']['name'])
+            return 0
+        print (args[1] + ' "' + args[2] + '" deleted')
+        return 0
+
+    # logs, rollout and anything else just works
+    return 0
+
+
+# helper function to answer docker
+def docker(args, config):
+
+    """
+    Function to answer a docker command.
+    """
+
+    # the version
+    if args[:1] == ['--version']:
+        print ('Docker version 24.0.7, build afdd53b')
+        return 0
+
+    # images exist once they were built
+    if args[:2] == ['image', 'inspect']:
+        marker = os.path.join(config['state_dir'], 'images', args[2].replace('/', '_').replace(':', '_'))
+        if os.path.exists(marker):
+            print ('[{"RepoTags": ["' + args[2] + '"]}]')
+            return 0
+        sys.stderr.write('Error: No such image: ' + args[2] + '\n')
+        return 1
+
+    # builds read the context from stdin and remember the image
+    if args[:1] == ['build']:
+        context = sys.stdin.buffer.read()
+        tag = args[args.index('-t') + 1]
+        os.makedirs(os.path.join(config['state_dir'], 'images'), exist_ok = True)
+        with open(os.path.join(config['state_dir'], 'images', tag.replace('/', '_').replace(':', '_')), 'w') as file:
+            file.write(str(len(context)))
+        return 0
+
+    # anything else just works
+    return 0
+
+
+# function to run the shim
+def main(tool, args):
+
+    """
+    Function to answer one command after its configured latency.
+    """
+
+    # read the configuration
+    config = load_config()
+
+    # sleep like the real tool would
+    latency = config.get('latency', {})
+    name = command_name(tool, args)
+    time.sleep(latency.get(name, latency.get(tool, latency.get('default', 0))))
+
+    # answer the command
+    handlers = {'minikube': minikube, 'kubectl': kubectl, 'docker': docker}
+    if tool in handlers:
+        return handlers[tool](args, config)
+
+    # VBoxManage and others only know their version
+    print ('7.0.12r159484')
+    return 0
+
+
+# run the shim
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2:]))
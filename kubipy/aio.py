@@ -0,0 +1,680 @@
+"""
+aio.py contains the class AsyncMinipy(), the asyncio-native variant of
+minipy(). Every method is a coroutine built on asyncio subprocesses, so many
+cluster operations can overlap in a single event loop without a thread per
+call.
+Slots:
+--------
+current_status : str
+    Stores the current status of the minikube cluster
+py_version : string
+    Stores the version of Python in use
+docker_env : dict
+    Stores the docker-env variables of the cluster, resolved once per session
+image_tag : string
+    Stores the content-addressed tag of the last deployed image
+service_url : string
+    Stores the service url of the last deployment
+boot_report : dict
+    Stores what the last start did and the seconds it spent per boot phase
+max_concurrency : int
+    Stores the maximum number of processes running at once
+profile : str
+    Stores the name of the minikube profile, which is also the kubectl
+    context
+runner : CommandRunner
+    Stores the layer all external commands run through, with their timings
+timeouts : dict
+    Stores the seconds each operation may take, e.g. 'build' or 'url'
+retries : dict
+    Stores how often each transiently failing operation is retried
+"""
+
+# import libs
+import asyncio
+import json
+import time
+import sys
+import os
+
+# import modules
+from kubipy.records import RecordTable
+from kubipy.cluster import parse_status, cluster_state, BootTimer
+from kubipy.runner import CommandRunner, CommandTimeout, DEFAULT_TIMEOUTS, DEFAULT_RETRIES, DEFAULT_RETRY_ON
+from kubipy.runner import backoff_delay
+from kubipy.build import image_digest, image_tag, render_dockerfile, build_context, parse_docker_env
+from kubipy.build import DOCKER_CONNECTION_ERRORS
+from kubipy.manifests import render_deployment, render_service, render_list, FIELD_MANAGER
+
+
+# setup class
+class AsyncMinipy:
+
+    # describe class
+    def __init__(self, max_concurrency = 32, runner = None, timeouts = None, retries = None, profile = 'minikube'):
+
+        """
+        Class to manage a Minikube cluster from asyncio code.
+        Parameters
+        ----------
+        max_concurrency : int
+            Integer with the maximum number of processes running at once
+        runner : CommandRunner
+            Runner all commands go through, e.g. one shared with a minipy()
+        timeouts : dict
+            Dictionary with the seconds per operation, merged into the
+            defaults of kubipy.runner.DEFAULT_TIMEOUTS
+        retries : dict
+            Dictionary with the retries per operation, merged into the
+            defaults of kubipy.runner.DEFAULT_RETRIES
+        profile : string
+            String with the name of the minikube profile
+        """
+
+        # define the slots
+        self.current_status = 'initialized'
+        self.py_version = '.'.join(str(part) for part in sys.version_info[:3])
+        self.docker_env = None
+        self.image_tag = None
+        self.service_url = None
+        self.boot_report = None
+        self.profile = profile
+        self.runner = runner if runner is not None else CommandRunner()
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = dict(DEFAULT_RETRIES, **(retries or {}))
+
+        # bound the number of processes, the semaphore is created in the loop
+        self.max_concurrency = max_concurrency
+        self.__semaphore = None
+
+        # remember the running builds, so the same image is never built twice at once
+        self.__builds = {}
+
+        # remember the resolution of the docker-env, so it runs once at a time
+        self.__docker_env_future = None
+
+    # helper function to run a command
+    async def __run(self, operation, command, input = None, shell = False, **kwargs):
+
+        """
+        Private method to run a command as an asyncio subprocess through the
+        command runner, with the timeout and the retries of its operation.
+        minikube and kubectl commands are pointed to the profile.
+        Parameters
+        ----------
+        operation : string
+            String with the operation, a key of self.timeouts, e.g. 'build'
+        command : string
+            String with the command
+        input : bytes
+            Bytes sent to stdin of the process
+        shell : boolean
+            Boolean indicating whether the command runs in a shell
+        kwargs : dict
+            Further arguments of CommandRunner.run_async()
+        Returns
+        -------
+        tuple
+            Tuple with the exit code, stdout and stderr
+        """
+
+        # create the semaphore in the running loop
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # wait for a free slot
+        async with self.__semaphore:
+
+            # point minikube and kubectl to the profile
+            if not shell:
+                args = command.split() if isinstance(command, str) else list(command)
+                if args[:1] == ['minikube']:
+                    command = args[:1] + ['-p', self.profile] + args[1:]
+                elif args[:1] == ['kubectl']:
+                    command = args[:1] + ['--context', self.profile] + args[1:]
+
+            # run the command through the runner, which records it
+            kwargs.setdefault('retry_on', DEFAULT_RETRY_ON.get(operation))
+            result = await self.runner.run_async(command, input = input, shell = shell,
+                                                 timeout = kwargs.pop('timeout', self.timeouts.get(operation)),
+                                                 retries = self.retries.get(operation, 0), **kwargs)
+
+        # return the results
+        return result.returncode, result.stdout, result.stderr
+
+    # helper function to resolve the docker-env of the cluster
+    async def __resolve_docker_env(self, refresh = False):
+
+        """
+        Private method to resolve the variables that point docker to the
+        daemon inside Minikube, once per cluster session. Concurrent callers
+        share one 'minikube docker-env'.
+        """
+
+        # forget the variables if asked for
+        if refresh and self.__docker_env_future is not None and self.__docker_env_future.done():
+            self.__invalidate_docker_env()
+
+        # answer from memory
+        if self.docker_env is not None:
+            return self.docker_env
+
+        # define helper to resolve the variables
+        async def resolve():
+            command = ['minikube', 'docker-env', '--shell', 'none']
+            code, stdout, stderr = await self.__run('docker-env', command)
+            if code != 0:
+                raise Exception('I could not resolve the docker-env: ' + stderr.decode('utf-8', 'replace'))
+            self.docker_env = parse_docker_env(stdout.decode('utf-8'))
+            return self.docker_env
+
+        # start the resolution once
+        if self.__docker_env_future is None:
+            self.__docker_env_future = asyncio.ensure_future(resolve())
+
+        # wait for it, a failed resolution is tried again next time
+        try:
+            return await asyncio.shield(self.__docker_env_future)
+        except Exception:
+            self.__docker_env_future = None
+            raise
+
+    # helper function to forget the docker-env
+    def __invalidate_docker_env(self):
+
+        """
+        Private method to forget the docker-env variables, e.g. because the
+        cluster was restarted. Builds still running belong to the old daemon
+        and are not shared with later deploys either.
+        """
+
+        # forget them
+        self.docker_env = None
+        self.__docker_env_future = None
+        self.__builds = {}
+
+    # helper function to run docker against the minikube daemon
+    async def __docker(self, operation, args, variables = None, input = None, **kwargs):
+
+        """
+        Private method to run a docker command against the docker daemon in
+        Minikube, without a shell. Stale variables are resolved again once.
+        Returns
+        -------
+        tuple
+            Tuple with the exit code, stdout and stderr
+        """
+
+        # define helper to detect an unreachable daemon
+        def unreachable(stderr):
+            return stderr is not None and any(error in stderr for error in DOCKER_CONNECTION_ERRORS)
+
+        # retrying with the same variables does not help an unreachable daemon
+        retry_on = kwargs.pop('retry_on', None)
+        kwargs['retry_on'] = lambda result: not unreachable(result.stderr) and (retry_on is None or retry_on(result))
+
+        # run with the cached variables
+        env = dict(os.environ, **(await self.__resolve_docker_env()), **(variables or {}))
+        code, stdout, stderr = await self.__run(operation, args, input = input, env = env, **kwargs)
+
+        # a daemon that cannot be reached means the variables are stale
+        if code != 0 and unreachable(stderr):
+
+            # resolve them again and retry once
+            env = dict(os.environ, **(await self.__resolve_docker_env(refresh = True)), **(variables or {}))
+            code, stdout, stderr = await self.__run(operation, args, input = input, env = env, **kwargs)
+
+        # return the results
+        return code, stdout, stderr
+
+    # helper function to build an image if it does not exist
+    async def __ensure_image(self, tag, dockerfile, script_file, requirements_file, buildkit):
+
+        """
+        Private method to build an image, unless the minikube docker daemon
+        already has it.
+        """
+
+        # check if the image already exists in the minikube docker daemon
+        code, _, _ = await self.__docker('inspect', ['docker', 'image', 'inspect', tag],
+                                         retry_on = lambda result: b'No such' not in (result.stderr or b''))
+
+        # build it if not
+        if code != 0:
+
+            # stream the minimal build context
+            context = build_context(dockerfile, {'api.py': script_file, 'requirements.txt': requirements_file})
+            code, _, stderr = await self.__docker('build', ['docker', 'build', '-t', tag, '-'],
+                                                  variables = {'DOCKER_BUILDKIT': '1' if buildkit else '0'},
+                                                  input = context)
+
+            # check if it worked
+            if code != 0:
+
+                # raise Exception
+                raise Exception('I could not built a Docker image: ' + stderr.decode('utf-8', 'replace'))
+
+    # helper function to wait for the API server
+    async def __wait_api(self, timeout):
+
+        """
+        Private method to probe /readyz of the API server with jittered
+        exponential backoff until it is ready, see minipy.start().
+        Returns
+        -------
+        tuple
+            Tuple with the time.perf_counter() at which the API server was
+            ready, or None, and the number of probes
+        """
+
+        # compute the deadline
+        deadline = time.monotonic() + timeout
+
+        # probe until it is ready or the time is up
+        probes = 0
+        while True:
+
+            # probe once, the endpoint answers 'ok'
+            probes = probes + 1
+            try:
+                code, stdout, _ = await self.__run('ready', 'kubectl get --raw /readyz')
+                if code == 0 and stdout.strip() == b'ok':
+                    return time.perf_counter(), probes
+            except CommandTimeout:
+                pass
+
+            # give up at the deadline or after a cancel
+            if time.monotonic() >= deadline or self.runner.cancelled:
+                return None, probes
+
+            # wait before the next probe
+            await asyncio.sleep(min(backoff_delay(probes - 1, 0.25, 5), max(deadline - time.monotonic(), 0)))
+
+    # function to start minikube
+    async def start(self, cpus = '2', memory = '2G', force = False, ready_timeout = 300):
+
+        """
+        Main method to start the Minikube cluster.
+        A cluster that already runs healthy is left as it is and a paused one
+        is resumed. In every case the method only returns once the API server
+        answers on /readyz.
+        Parameters
+        ----------
+        cpus : str
+            String to indicate the number of cores used for the cluster
+        memory: str
+            String to indicate the amount of memory allocated to the cluster
+        force : boolean
+            Boolean indicating whether 'minikube start' runs in any case
+        ready_timeout : float
+            Float with the number of seconds to wait for the API server
+        Returns
+        -------
+        dict
+            Dictionary with the report of the start, see minipy.start()
+        """
+
+        # start the clock
+        started = time.perf_counter()
+        report = {'state': None, 'action': 'start', 'phases': {}, 'ready': False, 'probes': 0,
+                  'seconds': None, 'log': []}
+
+        # check if the cluster is up already
+        if not force:
+
+            # read the state, the status exits non-zero unless it runs
+            try:
+                _, stdout, _ = await self.__run('status', 'minikube status -o json')
+                report['state'] = cluster_state(parse_status(stdout))
+
+            # a hanging status tells nothing
+            except CommandTimeout:
+                report['state'] = 'degraded'
+
+            # nothing to do for a running cluster
+            if report['state'] == 'running':
+                report['action'] = 'none'
+
+            # a paused cluster only needs to be resumed
+            elif report['state'] == 'paused':
+                report['action'] = 'resume'
+                await self.resume()
+                report['phases']['resume'] = time.perf_counter() - started
+
+        # boot the cluster
+        if report['action'] == 'start':
+
+            # a (re)started cluster may serve docker on a new address
+            self.__invalidate_docker_env()
+
+            # start minikube and time the phases from its output
+            timer = BootTimer()
+            command = str('minikube start --driver=virtualbox --cpus=' + cpus + ' --memory=' + memory)
+            code, _, _ = await self.__run('start', command, on_line = timer)
+            timer.exit()
+
+            # check if it worked
+            if code != 0:
+
+                # update current_status
+                self.current_status = 'crashed'
+
+                # raise error
+                raise Exception('Starting Minikube failed')
+
+            # keep the output
+            report['log'] = timer.log
+
+        # wait for the API server
+        api_started = time.perf_counter()
+        ready_at, report['probes'] = await self.__wait_api(ready_timeout)
+        report['ready'] = ready_at is not None
+
+        # time the phases
+        if report['action'] == 'start':
+            report['phases'] = timer.phases(ready_at)
+        else:
+            report['phases']['api'] = None if ready_at is None else ready_at - api_started
+        report['seconds'] = time.perf_counter() - started
+
+        # keep the report
+        self.boot_report = report
+
+        # check if the API server serves
+        if not report['ready']:
+
+            # update current_status
+            self.current_status = 'not ready'
+
+            # raise error
+            raise Exception('The Minikube API server was not ready after ' + str(ready_timeout) + ' seconds')
+
+        # update current_status
+        self.current_status = 'running'
+
+        # return the report
+        return report
+
+    # function to pause minikube
+    async def pause(self):
+
+        """
+        Main method to pause the Minikube cluster, see minipy.pause().
+        """
+
+        # pause minikube, the docker daemon keeps its address
+        code, _, _ = await self.__run('pause', 'minikube pause')
+
+        # check if it worked
+        if code != 0:
+
+            # raise error
+            raise Exception('I could not pause minikube')
+
+        # update current_status
+        self.current_status = 'paused'
+
+    # function to resume minikube
+    async def resume(self):
+
+        """
+        Main method to resume a paused Minikube cluster.
+        """
+
+        # unpause minikube
+        code, _, _ = await self.__run('pause', 'minikube unpause')
+
+        # check if it worked
+        if code != 0:
+
+            # raise error
+            raise Exception('I could not resume minikube')
+
+        # update current_status
+        self.current_status = 'running'
+
+    # function to check the status
+    async def status(self):
+
+        """
+        Main method to check the status of the cluster.
+        Returns
+        -------
+        string
+            String with the output of 'minikube status'
+        """
+
+        # check minikube status, it exits non-zero for stopped clusters
+        _, stdout, _ = await self.__run('status', 'minikube status')
+
+        # return the output
+        return stdout.decode('utf-8', 'replace')
+
+    # helper function to list objects
+    async def __get(self, kind, fields, namespace):
+
+        """
+        Private method to list objects as compact records.
+        """
+
+        # create the empty records (this also checks the fields)
+        records = RecordTable(kind, fields)
+
+        # get the objects as JSON
+        code, stdout, _ = await self.__run('get', 'kubectl get ' + kind + ' -o json -n ' + namespace)
+
+        # check if it worked
+        if code != 0:
+
+            # raise Exception
+            raise Exception('I could not get the list of ' + kind)
+
+        # add the objects
+        return records.extend(json.loads(stdout).get('items', []))
+
+    # function to list all deployments
+    async def get_deployments(self, fields = None, namespace = 'default'):
+
+        """
+        Main method to get deployments on Minikube as compact records.
+        """
+
+        # list the deployments
+        return await self.__get('deployments', fields, namespace)
+
+    # function to list all services
+    async def get_services(self, fields = None, namespace = 'default'):
+
+        """
+        Main method to get services on Minikube as compact records.
+        """
+
+        # list the services
+        return await self.__get('services', fields, namespace)
+
+    # function to list all pods
+    async def get_pods(self, fields = None, namespace = 'default'):
+
+        """
+        Main method to get pods on Minikube as compact records.
+        """
+
+        # list the pods
+        return await self.__get('pods', fields, namespace)
+
+    # function to delete pods, services
+    async def delete_object(self, pod = None, service = None, deployment = None):
+
+        """
+        Main method to delete pods, deployments and services on Minikube.
+        The deletions run concurrently.
+        """
+
+        # collect the deletions
+        targets = [(kind, name) for kind, name in (('pod', pod), ('service', service), ('deployment', deployment))
+                   if name is not None]
+
+        # run them concurrently
+        results = await asyncio.gather(*(self.__run('remove', 'kubectl delete ' + kind + ' ' + name)
+                                         for kind, name in targets))
+
+        # check if they worked
+        for (kind, name), (code, _, _) in zip(targets, results):
+            if code != 0:
+
+                # raise Exception
+                raise Exception('I could not delete your ' + kind)
+
+    # function to deploy app
+    async def deploy(self, script_file, requirements_file, port, deployment_name = None, base_image = None,
+                     buildkit = True, wait = False, timeout = 300):
+
+        """
+        Main method to deploy APIs to minikube.
+        This function works like minipy().deploy(): the image is tagged by its
+        content digest and only built if it does not exist yet, and the
+        deployment and service are applied in one server-side apply.
+        Parameters
+        ----------
+        script_file : string
+            String with the path to the python script file
+        requirements_file : string
+            String with the path to the requirements file
+        port : string
+            String with the port number to expose
+        deployment_name : string
+            String with the name of the deployment
+        base_image : string
+            String with the base image, 'full', 'slim' or any image
+        buildkit : boolean
+            Boolean indicating whether the image is built with BuildKit
+        wait : boolean
+            Boolean indicating whether to block until the rollout is complete
+        timeout : float
+            Float with the number of seconds to wait for the rollout
+        Returns
+        -------
+        string
+            String with the url of the service
+        """
+
+        # take care of special characters
+        deployment_name = (deployment_name or 'kubipy-deployment').replace('_', '-').replace('/', '-')
+
+        # resolve the home directory
+        script_file = os.path.expanduser(script_file)
+        requirements_file = os.path.expanduser(requirements_file)
+
+        # render the Dockerfile
+        dockerfile = render_dockerfile(self.py_version, 'api.py', 'requirements.txt', port,
+                                       base_image = base_image, buildkit = buildkit)
+
+        # derive the immutable tag from the content
+        tag = image_tag(image_digest(dockerfile, [script_file, requirements_file], self.py_version))
+
+        # build the image, concurrent deploys of the same content share one build
+        build = self.__builds.get(tag)
+        if build is None:
+            build = asyncio.ensure_future(self.__ensure_image(tag, dockerfile, script_file,
+                                                              requirements_file, buildkit))
+            self.__builds[tag] = build
+
+            # forget it once it is done, later deploys check the daemon for the image again
+            build.add_done_callback(lambda done: self.__builds.pop(tag) if self.__builds.get(tag) is done else None)
+
+        # wait for the build
+        await asyncio.shield(build)
+
+        # write the tag to self
+        self.image_tag = tag
+
+        # apply the deployment and the service in one call
+        objects = render_list([render_deployment(deployment_name, image = tag, port = port),
+                               render_service(deployment_name, port = port)])
+        command = str('kubectl apply --server-side --force-conflicts --field-manager=' + FIELD_MANAGER + ' -f -')
+        code, _, stderr = await self.__run('apply', command, input = json.dumps(objects).encode('utf-8'))
+
+        # check if it worked
+        if code != 0:
+
+            # raise Exception
+            raise Exception('I could not apply the deployment and the service: ' + stderr.decode('utf-8', 'replace'))
+
+        # wait for the rollout if asked for, kubectl follows it with a watch
+        if wait:
+
+            # wait, kubectl ends the wait itself, the timeout only guards against a wedged kubectl
+            command = str('kubectl rollout status deployment/' + deployment_name + ' --timeout=' + str(int(timeout)) + 's')
+            code, _, _ = await self.__run('wait', command, timeout = timeout + 30)
+
+            # check if it worked
+            if code != 0:
+
+                # raise Exception
+                raise Exception('The deployment was not ready after ' + str(timeout) + ' seconds')
+
+        # get the service url
+        code, stdout, _ = await self.__run('url', 'minikube service ' + deployment_name + ' --url')
+
+        # check if it worked
+        if code != 0:
+
+            # raise Exception
+            raise Exception('I could not get the url of the service')
+
+        # write the url to self
+        self.service_url = stdout.decode('utf-8').strip() + '/<your_route>'
+
+        # return the url
+        return self.service_url
+
+    # function to get the command statistics
+    def stats(self):
+
+        """
+        Main method to get the statistics of all external commands.
+        Returns
+        -------
+        dict
+            Dictionary with count, failures, total/p50/p95/max seconds and
+            output bytes per command
+        """
+
+        # return the statistics
+        return self.runner.stats()
+
+    # function to cancel running commands
+    def cancel(self):
+
+        """
+        Main method to cancel every running external command. The process
+        groups are killed and the waiting coroutines get CommandCancelled.
+        """
+
+        # cancel the commands
+        self.runner.cancel()
+
+    # function to stop minikube
+    async def stop(self):
+
+        """
+        Main method to stop the Minikube cluster.
+        """
+
+        # the docker-env of this session ends with the cluster
+        self.__invalidate_docker_env()
+
+        # stop minikube
+        code, _, _ = await self.__run('stop', 'minikube stop')
+
+        # check if it worked
+        if code != 0:
+
+            # update current_status
+            self.current_status = 'not responding'
+
+            # raise error
+            raise Exception('I could not stop minikube')
+
+        # update current_status
+        self.current_status = 'stopped'
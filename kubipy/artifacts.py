@@ -0,0 +1,255 @@
+"""
+artifacts.py contains the class ArtifactCache(), a content-addressed store of
+downloaded installers and binaries.
+Files are stored once per sha256 digest under 'sha256/<digest>' and found by
+name through one small index file per name, so several machines can share
+the directory over a file share: every write goes to a temporary file first
+and is moved into place, and nothing is ever modified in place.
+Slots:
+--------
+root : str
+    Stores the directory of the cache
+"""
+
+# import libs
+import threading
+import hashlib
+import json
+import time
+import os
+
+
+# setup class
+class ArtifactCache:
+
+    # describe class
+    def __init__(self, root):
+
+        """
+        Class to store and serve downloaded artifacts by checksum.
+        Parameters
+        ----------
+        root : string
+            String with the directory of the cache, e.g. ~/.kubipy/artifacts
+        """
+
+        # define the slots
+        self.root = os.path.expanduser(root)
+
+    # helper function to find the index entry of a name
+    def __index_path(self, name):
+
+        """
+        Private method to get the path of the index entry of a name.
+        """
+
+        # keep names flat and safe as file names
+        safe = ''.join(char if char.isalnum() or char in '.-_+@' else '_' for char in name)
+        return os.path.join(self.root, 'index', safe + '.json')
+
+    # helper function to find a blob
+    def blob_path(self, digest):
+
+        """
+        Main method to get the path of the blob of a digest.
+        Parameters
+        ----------
+        digest : string
+            String with the hex sha256 digest
+        Returns
+        -------
+        string
+            String with the path
+        """
+
+        # return the path
+        return os.path.join(self.root, 'sha256', digest)
+
+    # helper function to copy a file and hash it on the way
+    @staticmethod
+    def __copy(source, target):
+
+        """
+        Private method to copy a file to a temporary file next to the target
+        and hash it in the same pass.
+        Returns
+        -------
+        tuple
+            Tuple with the temporary path and the hex sha256 digest
+        """
+
+        # make sure the directory exists
+        os.makedirs(os.path.dirname(target), exist_ok = True)
+
+        # copy chunk by chunk
+        digest = hashlib.sha256()
+        tmp_path = str(target + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp')
+        with open(source, 'rb') as reader, open(tmp_path, 'wb') as writer:
+            for chunk in iter(lambda: reader.read(1 << 20), b''):
+                digest.update(chunk)
+                writer.write(chunk)
+
+        # return the temporary file and the digest
+        return tmp_path, digest.hexdigest()
+
+    # function to look up a name
+    def lookup(self, name):
+
+        """
+        Main method to look up the index entry of a name.
+        Parameters
+        ----------
+        name : string
+            String with the name, e.g. the file name of a download
+        Returns
+        -------
+        dict
+            Dictionary with name, sha256, size and stored_at, or None
+        """
+
+        # try to read the entry
+        try:
+            with open(self.__index_path(name)) as file:
+                entry = json.load(file)
+
+        # handle missing or broken entries
+        except (OSError, ValueError):
+            return None
+
+        # return it if its blob exists
+        return entry if os.path.isfile(self.blob_path(entry.get('sha256', ''))) else None
+
+    # function to check a name
+    def __contains__(self, name):
+
+        # look it up
+        return self.lookup(name) is not None
+
+    # function to store a file
+    def store(self, name, path):
+
+        """
+        Main method to add a file to the cache under a name.
+        Parameters
+        ----------
+        name : string
+            String with the name, e.g. the file name of a download
+        path : string
+            String with the path of the file
+        Returns
+        -------
+        string
+            String with the hex sha256 digest
+        """
+
+        # copy and hash the file
+        tmp_path, digest = self.__copy(path, os.path.join(self.root, 'sha256', 'incoming'))
+
+        # keep the blob once per digest
+        if os.path.isfile(self.blob_path(digest)):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, self.blob_path(digest))
+
+        # write the index entry
+        index_path = self.__index_path(name)
+        os.makedirs(os.path.dirname(index_path), exist_ok = True)
+        tmp_index = str(index_path + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp')
+        with open(tmp_index, 'w') as file:
+            json.dump({'name': name, 'sha256': digest, 'size': os.path.getsize(self.blob_path(digest)),
+                       'stored_at': time.time()}, file, indent = 2)
+        os.replace(tmp_index, index_path)
+
+        # return the digest
+        return digest
+
+    # function to restore a file
+    def restore(self, name, path):
+
+        """
+        Main method to copy a cached file to a path.
+        The content is verified against its digest on the way. A blob that
+        does not match is removed, so it is downloaded and stored again.
+        Parameters
+        ----------
+        name : string
+            String with the name, e.g. the file name of a download
+        path : string
+            String with the path the file is restored to
+        Returns
+        -------
+        boolean
+            Returns 'True' if the file was restored, otherwise 'False'
+        """
+
+        # look up the name
+        entry = self.lookup(name)
+        if entry is None:
+            return False
+
+        # copy and verify the blob
+        tmp_path, digest = self.__copy(self.blob_path(entry['sha256']), path)
+
+        # drop corrupt blobs
+        if digest != entry['sha256']:
+            os.remove(tmp_path)
+            try:
+                os.remove(self.blob_path(entry['sha256']))
+            except OSError:
+                pass
+            return False
+
+        # move the file into place
+        os.replace(tmp_path, path)
+        return True
+
+    # function to list the cache
+    def entries(self):
+
+        """
+        Main method to list all index entries.
+        Returns
+        -------
+        list
+            List with the entries
+        """
+
+        # read every entry
+        entries = []
+        index_dir = os.path.join(self.root, 'index')
+        for file_name in sorted(os.listdir(index_dir)) if os.path.isdir(index_dir) else []:
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(index_dir, file_name)) as file:
+                    entries.append(json.load(file))
+            except (OSError, ValueError):
+                pass
+
+        # return them
+        return entries
+
+    # function to remove blobs without index entries
+    def prune(self):
+
+        """
+        Main method to remove blobs no index entry refers to.
+        Returns
+        -------
+        int
+            Integer with the number of bytes freed
+        """
+
+        # collect the digests in use
+        used = {entry.get('sha256') for entry in self.entries()}
+
+        # remove the others
+        freed = 0
+        blob_dir = os.path.join(self.root, 'sha256')
+        for digest in os.listdir(blob_dir) if os.path.isdir(blob_dir) else []:
+            if digest not in used and '.' not in digest:
+                freed = freed + os.path.getsize(self.blob_path(digest))
+                os.remove(self.blob_path(digest))
+
+        # return the freed bytes
+        return freed
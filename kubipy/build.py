@@ -0,0 +1,219 @@
+"""
+build.py contains the helper functions to build Docker images for deploy().
+Images are content-addressed: the tag is derived from everything that ends up
+in the image, so an unchanged script never has to be built twice.
+"""
+
+# import libs
+import hashlib
+import tarfile
+import io
+
+# define the repository of all kubipy images
+IMAGE_REPOSITORY = 'kubipy-image'
+
+# define the shortcuts for base images
+BASE_IMAGES = {'full': 'python:{version}',
+               'slim': 'python:{version}-slim'}
+
+# define the errors meaning the docker daemon could not be reached
+DOCKER_CONNECTION_ERRORS = (b'Cannot connect to the Docker daemon', b'error during connect',
+                            b'connection refused', b'no such host', b'i/o timeout')
+
+
+# function to render a Dockerfile
+def render_dockerfile(py_version, script_file, requirements_file, port, base_image = None, buildkit = True):
+
+    """
+    Function to render the Dockerfile of an API image.
+    The layers are ordered by how often they change: the requirements are
+    copied and installed first, the script, which changes most, comes last.
+    Editing the script therefore only rebuilds the last layer. With BuildKit
+    the pip cache is kept in a cache mount across builds, so changed
+    requirements do not download every wheel again. Cache mounts work with
+    the builtin frontend of current Docker, so no frontend image is pulled.
+    Parameters
+    ----------
+    py_version : string
+        String with the Python version, e.g. '3.8.2'
+    script_file : string
+        String with the path of the script inside the build context
+    requirements_file : string
+        String with the path of the requirements inside the build context
+    port : string
+        String with the port number to expose
+    base_image : string
+        String with the base image, 'full' (default), 'slim' or any image
+    buildkit : boolean
+        Boolean indicating whether BuildKit features may be used
+    Returns
+    -------
+    string
+        String with the content of the Dockerfile
+    """
+
+    # resolve the base image
+    base_image = BASE_IMAGES.get(base_image or 'full', base_image).format(version = py_version)
+
+    # install with a pip cache mount, or without a cache in the image
+    if buildkit:
+        install = 'RUN --mount=type=cache,target=/root/.cache/pip python -m pip install -r /api/requirements.txt'
+    else:
+        install = 'RUN python -m pip install --no-cache-dir -r /api/requirements.txt'
+
+    # build the lines, least frequently changing first, without a syntax
+    # directive, which would pull the frontend image on every build
+    lines = ['FROM ' + base_image,
+             'ENV PIP_DISABLE_PIP_VERSION_CHECK=1 PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1',
+             'WORKDIR /api',
+             'COPY ' + requirements_file + ' /api/requirements.txt',
+             install,
+             'EXPOSE ' + str(int(port)),
+             'COPY ' + script_file + ' /api/api.py',
+             'ENTRYPOINT ["python", "/api/api.py"]']
+
+    # return the content
+    return '\n'.join(lines) + '\n'
+
+
+# function to compute the digest of an image
+def image_digest(dockerfile, files, py_version):
+
+    """
+    Function to compute the content digest of an image.
+    The digest covers the Dockerfile, the Python version and the content of
+    every file copied into the image. Each part is length-prefixed, so moving
+    bytes from one part to another changes the digest.
+    Parameters
+    ----------
+    dockerfile : string
+        String with the content of the Dockerfile
+    files : list
+        List with the paths of the files copied into the image
+    py_version : string
+        String with the Python version of the base image
+    Returns
+    -------
+    string
+        String with the hex sha256 digest
+    """
+
+    # start the hash with a format version
+    digest = hashlib.sha256(b'kubipy-image-v1\0')
+
+    # define helper to add a length-prefixed part
+    def add(data):
+        digest.update(str(len(data)).encode('ascii') + b'\0')
+        digest.update(data)
+
+    # add the Python version and the Dockerfile
+    add(py_version.encode('utf-8'))
+    add(dockerfile.encode('utf-8'))
+
+    # add every file in chunks
+    for path in files:
+        file_digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                file_digest.update(chunk)
+        add(file_digest.digest())
+
+    # return the digest
+    return digest.hexdigest()
+
+
+# function to derive the tag of an image
+def image_tag(digest):
+
+    """
+    Function to derive the immutable tag of an image from its digest.
+    Parameters
+    ----------
+    digest : string
+        String with the hex digest from image_digest()
+    Returns
+    -------
+    string
+        String with the image reference, e.g. 'kubipy-image:3f2a...'
+    """
+
+    # use the first 16 hex characters, like short git hashes
+    return IMAGE_REPOSITORY + ':' + digest[:16]
+
+
+# function to assemble a build context
+def build_context(dockerfile, files):
+
+    """
+    Function to assemble a minimal build context in memory.
+    The context only holds the Dockerfile and the given files, whatever else
+    lives next to them. All entries get fixed owners, modes and mtimes, so the
+    same content always produces the same context.
+    Parameters
+    ----------
+    dockerfile : string
+        String with the content of the Dockerfile
+    files : dict
+        Dictionary mapping the names inside the context to the paths on disk
+    Returns
+    -------
+    bytes
+        Bytes with the uncompressed tar archive, ready for 'docker build -'
+    """
+
+    # define helper to add an entry
+    def add(archive, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mode = 0o644
+        info.mtime = 0
+        archive.addfile(info, io.BytesIO(data))
+
+    # write the archive to memory
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj = buffer, mode = 'w', format = tarfile.USTAR_FORMAT) as archive:
+
+        # add the Dockerfile
+        add(archive, 'Dockerfile', dockerfile.encode('utf-8'))
+
+        # add the files
+        for name, path in files.items():
+            with open(path, 'rb') as file:
+                add(archive, name, file.read())
+
+    # return the archive
+    return buffer.getvalue()
+
+
+# function to parse the output of 'minikube docker-env'
+def parse_docker_env(output):
+
+    """
+    Function to parse the variables of 'minikube docker-env --shell none'.
+    Parameters
+    ----------
+    output : string
+        String with one KEY=VALUE pair per line
+    Returns
+    -------
+    dict
+        Dictionary with the variables, e.g. DOCKER_HOST
+    """
+
+    # read every assignment, skipping comments
+    variables = {}
+    for line in output.splitlines():
+
+        # strip an 'export' and skip everything that is not an assignment
+        line = line.strip()
+        if line.startswith('export '):
+            line = line[len('export '):]
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+
+        # split and unquote
+        key, value = line.split('=', 1)
+        variables[key.strip()] = value.strip().strip('"')
+
+    # return the variables
+    return variables
@@ -0,0 +1,826 @@
+"""
+client.py contains the class KubeClient(), which talks to the Kubernetes API
+server of a Minikube cluster directly, without spawning kubectl.
+Slots:
+--------
+server : str
+    Stores the url of the API server
+namespace : str
+    Stores the default namespace
+timeout : float
+    Stores the default timeout of a request in seconds
+pool_size : int
+    Stores the maximum number of pooled keep-alive connections
+"""
+
+# import libs
+import http.client
+import urllib.parse
+import threading
+import tempfile
+import base64
+import socket
+import queue
+import time
+import json
+import ssl
+import os
+
+# import modules
+from kubipy.runner import CommandRunner, DEFAULT_TIMEOUTS
+
+# yaml is optional, kubeconfigs are read via kubectl otherwise
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# define the API paths of the supported kinds: group path and namespaced flag
+RESOURCES = {'pods': ('/api/v1', True),
+             'services': ('/api/v1', True),
+             'endpoints': ('/api/v1', True),
+             'nodes': ('/api/v1', False),
+             'deployments': ('/apis/apps/v1', True),
+             'replicasets': ('/apis/apps/v1', True)}
+
+# define the short names kubectl accepts for these kinds
+ALIASES = {'pod': 'pods', 'po': 'pods',
+           'service': 'services', 'svc': 'services',
+           'endpoint': 'endpoints', 'ep': 'endpoints',
+           'node': 'nodes', 'no': 'nodes',
+           'deployment': 'deployments', 'deploy': 'deployments',
+           'replicaset': 'replicasets', 'rs': 'replicasets'}
+
+
+# define the error of failed API requests
+class KubeApiError(Exception):
+
+    """
+    Exception raised when the API server answers with an error status.
+    Slots:
+    --------
+    status : int
+        Stores the HTTP status code
+    reason : str
+        Stores the reason of the Kubernetes Status object, e.g. 'NotFound'
+    body : dict
+        Stores the decoded response body
+    """
+
+    # describe class
+    def __init__(self, status, reason, body = None):
+
+        # define the slots
+        self.status = status
+        self.reason = reason
+        self.body = body if body is not None else {}
+
+        # build the message
+        message = self.body.get('message') if isinstance(self.body, dict) else None
+        super().__init__('API request failed with {status} {reason}: {message}'.format(status = status,
+                                                                                      reason = reason,
+                                                                                      message = message))
+
+
+# define helper to resolve kinds
+def resource_path(kind, namespace = None, name = None, subresource = None):
+
+    """
+    Function to build the API path of a kind.
+    Parameters
+    ----------
+    kind : string
+        String with the kind, plural or kubectl short name, e.g. 'pods' or 'svc'
+    namespace : string
+        String with the namespace, ignored for cluster-scoped kinds
+    name : string
+        String with the name of a single object
+    subresource : string
+        String with a subresource of the object, e.g. 'log'
+    Returns
+    -------
+    string
+        String with the path on the API server
+    """
+
+    # resolve short names
+    kind = ALIASES.get(kind, kind)
+
+    # check if the kind is supported
+    if kind not in RESOURCES:
+
+        # raise Exception
+        raise Exception('I do not know the kind ' + str(kind))
+
+    # look up the group path
+    group, namespaced = RESOURCES[kind]
+
+    # build the path
+    path = group
+    if namespaced and namespace is not None:
+        path = path + '/namespaces/' + namespace
+    path = path + '/' + kind
+    if name is not None:
+        path = path + '/' + name
+    if subresource is not None:
+        path = path + '/' + subresource
+
+    # return the path
+    return path
+
+
+# setup class
+class KubeClient:
+
+    # describe class
+    def __init__(self, server, ca_file = None, ca_data = None, cert_file = None, key_file = None,
+                 token = None, insecure = False, namespace = 'default', pool_size = 4, timeout = 30):
+
+        """
+        Class to talk to the Kubernetes API server over pooled keep-alive
+        connections. Connections are reused between requests, so the TLS
+        handshake is paid once per connection instead of once per call.
+        Parameters
+        ----------
+        server : string
+            String with the url of the API server, http:// urls are allowed
+            (e.g. for local stub servers)
+        ca_file : string
+            String with the path to the CA certificate of the cluster
+        ca_data : string
+            String with the PEM encoded CA certificate of the cluster
+        cert_file : string
+            String with the path to the client certificate
+        key_file : string
+            String with the path to the client key
+        token : string
+            String with a bearer token
+        insecure : boolean
+            Boolean indicating whether the server certificate is not verified
+        namespace : string
+            String with the default namespace
+        pool_size : int
+            Integer with the maximum number of connections
+        timeout : float
+            Float with the default timeout of a request in seconds
+        """
+
+        # define the slots
+        self.server = server.rstrip('/')
+        self.namespace = namespace
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        # split the url
+        url = urllib.parse.urlsplit(self.server)
+        self.__scheme = url.scheme
+        self.__host = url.hostname
+        self.__port = url.port
+        self.__prefix = url.path.rstrip('/')
+
+        # build the default headers
+        self.__headers = {'Accept': 'application/json', 'User-Agent': 'kubipy'}
+        if token is not None:
+            self.__headers['Authorization'] = 'Bearer ' + token
+
+        # build the TLS context once, it is shared by all connections
+        self.__ssl_context = None
+        if self.__scheme == 'https':
+
+            # verify the server, unless asked not to
+            if insecure:
+                context = ssl._create_unverified_context()
+            else:
+                context = ssl.create_default_context(cafile = ca_file, cadata = ca_data)
+
+            # add the client certificate
+            if cert_file is not None:
+                context.load_cert_chain(cert_file, key_file)
+
+            # store the context
+            self.__ssl_context = context
+
+        # the pool keeps idle connections, the semaphore bounds all of them
+        self.__idle = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(pool_size)
+
+    # function to create a client from a kubeconfig
+    @classmethod
+    def from_kubeconfig(cls, path = None, context = None, run = None, **kwargs):
+
+        """
+        Function to create a client from a kubeconfig.
+        The kubeconfig is read once. JSON kubeconfigs are read directly, YAML
+        kubeconfigs with PyYAML if it is installed, and otherwise with a
+        single 'kubectl config view' call.
+        Parameters
+        ----------
+        path : string
+            String with the path to the kubeconfig, by default $KUBECONFIG or
+            ~/.kube/config
+        context : string
+            String with the context to use, by default the current context
+        run : function
+            Function running a command (list of arguments) and returning its
+            stdout, raising if it fails, by default a CommandRunner
+        Returns
+        -------
+        KubeClient
+            Client connected to the cluster of the context
+        """
+
+        # find the kubeconfig
+        if path is None:
+            path = os.environ.get('KUBECONFIG', '').split(os.pathsep)[0] or os.path.expanduser('~/.kube/config')
+
+        # read the kubeconfig
+        config = cls.__read_kubeconfig(path, run)
+
+        # pick the context
+        context = context or config.get('current-context')
+        ctx = cls.__lookup(config, 'contexts', context)
+        cluster = cls.__lookup(config, 'clusters', ctx['cluster'])
+        user = cls.__lookup(config, 'users', ctx['user']) if ctx.get('user') else {}
+
+        # relative paths in a kubeconfig are relative to the file
+        base = os.path.dirname(os.path.abspath(path))
+
+        # define helper to resolve paths
+        def resolve(file):
+            return None if file is None else os.path.join(base, os.path.expanduser(file))
+
+        # read the CA certificate
+        ca_data = cluster.get('certificate-authority-data')
+        ca_data = base64.b64decode(ca_data).decode('utf-8') if ca_data else None
+
+        # build the client, client certificates given as data need a file
+        cert_data = user.get('client-certificate-data')
+        key_data = user.get('client-key-data')
+        if cert_data and key_data:
+
+            # write them to a private temporary directory, only for loading
+            with tempfile.TemporaryDirectory(prefix = 'kubipy-') as tmp_dir:
+
+                # write certificate and key
+                cert_file = os.path.join(tmp_dir, 'client.crt')
+                key_file = os.path.join(tmp_dir, 'client.key')
+                with open(cert_file, 'wb') as file:
+                    file.write(base64.b64decode(cert_data))
+                with open(os.open(key_file, os.O_WRONLY | os.O_CREAT, 0o600), 'wb') as file:
+                    file.write(base64.b64decode(key_data))
+
+                # create the client while the files exist
+                return cls(cluster['server'],
+                           ca_file = resolve(cluster.get('certificate-authority')),
+                           ca_data = ca_data,
+                           cert_file = cert_file,
+                           key_file = key_file,
+                           token = user.get('token'),
+                           insecure = cluster.get('insecure-skip-tls-verify', False),
+                           namespace = ctx.get('namespace', 'default'),
+                           **kwargs)
+
+        # create the client
+        return cls(cluster['server'],
+                   ca_file = resolve(cluster.get('certificate-authority')),
+                   ca_data = ca_data,
+                   cert_file = resolve(user.get('client-certificate')),
+                   key_file = resolve(user.get('client-key')),
+                   token = user.get('token'),
+                   insecure = cluster.get('insecure-skip-tls-verify', False),
+                   namespace = ctx.get('namespace', 'default'),
+                   **kwargs)
+
+    # helper function to read a kubeconfig
+    @staticmethod
+    def __read_kubeconfig(path, run = None):
+
+        """
+        Private method to read a kubeconfig into a dictionary.
+        Parameters
+        ----------
+        path : string
+            String with the path to the kubeconfig
+        run : function
+            Function running a command and returning its stdout
+        Returns
+        -------
+        dict
+            Dictionary with the kubeconfig
+        """
+
+        # read the file
+        try:
+            with open(path) as file:
+                content = file.read()
+        except OSError:
+            raise Exception('I could not read the kubeconfig ' + path)
+
+        # JSON is valid, and the cheapest to read
+        try:
+            return json.loads(content)
+        except ValueError:
+            pass
+
+        # YAML with PyYAML, if it is there
+        if yaml is not None:
+            return yaml.safe_load(content)
+
+        # run through a command runner of its own, if none is given
+        if run is None:
+            run = lambda command: CommandRunner().run(command, timeout = DEFAULT_TIMEOUTS['config'], check = True).stdout
+
+        # otherwise let kubectl convert it, once
+        try:
+            command = ['kubectl', 'config', 'view', '--raw', '-o', 'json', '--kubeconfig', path]
+            return json.loads(run(command))
+        except Exception:
+            raise Exception('I could not read the kubeconfig, install PyYAML or kubectl')
+
+    # helper function to look up named kubeconfig entries
+    @staticmethod
+    def __lookup(config, section, name):
+
+        """
+        Private method to look up a named entry of a kubeconfig section.
+        Parameters
+        ----------
+        config : dict
+            Dictionary with the kubeconfig
+        section : string
+            String with the section, e.g. 'clusters'
+        name : string
+            String with the name of the entry
+        Returns
+        -------
+        dict
+            Dictionary with the entry
+        """
+
+        # search the section
+        for entry in config.get(section) or []:
+
+            # return the matching entry without the wrapper
+            if entry.get('name') == name:
+                return entry.get(section[:-1], {})
+
+        # raise Exception
+        raise Exception('I could not find ' + str(name) + ' in the ' + section + ' of the kubeconfig')
+
+    # helper function to open a new connection
+    def __connect(self, timeout):
+
+        """
+        Private method to open a new connection to the API server.
+        Parameters
+        ----------
+        timeout : float
+            Float with the socket timeout in seconds
+        Returns
+        -------
+        http.client.HTTPConnection
+            New connection
+        """
+
+        # open a TLS connection
+        if self.__scheme == 'https':
+            return http.client.HTTPSConnection(self.__host, self.__port, timeout = timeout,
+                                               context = self.__ssl_context)
+
+        # open a plain connection
+        return http.client.HTTPConnection(self.__host, self.__port, timeout = timeout)
+
+    # helper function to build the url of a request
+    def __url(self, path, params):
+
+        """
+        Private method to build the url of a request.
+        Parameters
+        ----------
+        path : string
+            String with the API path
+        params : dict
+            Dictionary with query parameters, None values are left out
+        Returns
+        -------
+        string
+            String with the path and query
+        """
+
+        # build the query
+        query = urllib.parse.urlencode({key: value for key, value in (params or {}).items() if value is not None})
+
+        # return path and query
+        return self.__prefix + path + ('?' + query if query else '')
+
+    # function to send a request
+    def request(self, method, path, params = None, body = None, content_type = 'application/json', timeout = None):
+
+        """
+        Main method to send a request to the API server.
+        The request is sent over an idle pooled connection if there is one.
+        A stale keep-alive connection is replaced once transparently.
+        Parameters
+        ----------
+        method : string
+            String with the HTTP method
+        path : string
+            String with the API path, e.g. '/api/v1/namespaces/default/pods'
+        params : dict
+            Dictionary with query parameters
+        body : dict
+            Dictionary with the request body, sent as JSON
+        content_type : string
+            String with the content type of the body
+        timeout : float
+            Float with the timeout of the request in seconds
+        Returns
+        -------
+        dict
+            Dictionary with the decoded response
+        """
+
+        # build the request
+        url = self.__url(path, params)
+        headers = dict(self.__headers)
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = content_type
+
+        # take a slot of the pool
+        self.__slots.acquire()
+
+        # try to send the request
+        try:
+
+            # an idle connection may have been closed by the server, so try twice
+            for attempt in range(2):
+
+                # reuse an idle connection or open a new one
+                try:
+                    connection = self.__idle.get_nowait()
+                    reused = True
+                except queue.Empty:
+                    connection = self.__connect(timeout or self.timeout)
+                    reused = False
+
+                # send the request and read the full response
+                try:
+                    if timeout is not None and connection.sock is not None:
+                        connection.sock.settimeout(timeout)
+                    connection.request(method, url, body = payload, headers = headers)
+                    response = connection.getresponse()
+                    data = response.read()
+
+                # a reused connection may be stale, retry on a new one
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                        http.client.CannotSendRequest, http.client.BadStatusLine):
+                    connection.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+
+                # anything else closes the connection
+                except BaseException:
+                    connection.close()
+                    raise
+
+                # keep the connection for the next request, with the timeout of the client
+                if response.will_close:
+                    connection.close()
+                else:
+                    if connection.sock is not None:
+                        connection.sock.settimeout(self.timeout)
+                    self.__idle.put(connection)
+
+                # stop retrying
+                break
+
+        # give the slot back
+        finally:
+            self.__slots.release()
+
+        # decode the response
+        try:
+            decoded = json.loads(data) if data else {}
+        except ValueError:
+            decoded = {'message': data.decode('utf-8', 'replace')}
+
+        # raise on errors
+        if response.status >= 400:
+            raise KubeApiError(response.status, decoded.get('reason', response.reason), decoded)
+
+        # return the response
+        return decoded
+
+    # function to stream a response line by line
+    def stream(self, path, params = None, timeout = None, on_connect = None, on_response = None):
+
+        """
+        Main method to stream a response line by line, e.g. a watch or logs.
+        A stream holds its connection for a long time, so it uses a dedicated
+        connection outside the pool, which is closed with the generator.
+        Parameters
+        ----------
+        path : string
+            String with the API path
+        params : dict
+            Dictionary with query parameters
+        timeout : float
+            Float with the socket timeout in seconds, None waits forever
+        on_connect : function
+            Function called with the connection once the request is sent, 
+            e.g. to be able to shut it down from another thread
+        on_response : function
+            Function called without arguments once the server accepted the
+            request, e.g. to know that a watch is running
+        Returns
+        -------
+        generator
+            Generator yielding the lines of the response as bytes
+        """
+
+        # open a dedicated connection
+        connection = self.__connect(timeout)
+
+        # try to stream
+        try:
+
+            # send the request
+            connection.request('GET', self.__url(path, params), headers = self.__headers)
+            if on_connect is not None:
+                on_connect(connection)
+            response = connection.getresponse()
+
+            # raise on errors
+            if response.status >= 400:
+                data = response.read()
+                try:
+                    decoded = json.loads(data)
+                except ValueError:
+                    decoded = {'message': data.decode('utf-8', 'replace')}
+                raise KubeApiError(response.status, decoded.get('reason', response.reason), decoded)
+
+            # tell the caller the stream is running
+            if on_response is not None:
+                on_response()
+
+            # yield line by line
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                yield line
+
+        # close the connection with the generator
+        finally:
+            connection.close()
+
+    # function to list objects
+    def list(self, kind, namespace = None, label_selector = None, field_selector = None):
+
+        """
+        Main method to list objects of a kind.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, e.g. 'pods'
+        namespace : string
+            String with the namespace, by default the namespace of the client
+        label_selector : string
+            String with a label selector, e.g. 'app=my-deployment'
+        field_selector : string
+            String with a field selector
+        Returns
+        -------
+        dict
+            Dictionary with the list object, the objects are in 'items'
+        """
+
+        # list the objects
+        return self.request('GET', resource_path(kind, namespace or self.namespace),
+                            params = {'labelSelector': label_selector, 'fieldSelector': field_selector})
+
+    # function to list objects page by page
+    def list_pages(self, kind, namespace = None, label_selector = None, field_selector = None, limit = 500):
+
+        """
+        Main method to list objects of a kind in pages.
+        Large lists are fetched in chunks of 'limit' objects, so only one page
+        has to be decoded and held in memory at a time.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, e.g. 'pods'
+        namespace : string
+            String with the namespace, by default the namespace of the client
+        label_selector : string
+            String with a label selector
+        field_selector : string
+            String with a field selector
+        limit : int
+            Integer with the maximum number of objects per page
+        Returns
+        -------
+        generator
+            Generator yielding the list of objects of every page
+        """
+
+        # start with the first page
+        token = None
+
+        # fetch until there is no continue token
+        while True:
+
+            # fetch the page
+            page = self.request('GET', resource_path(kind, namespace or self.namespace),
+                                params = {'labelSelector': label_selector, 'fieldSelector': field_selector,
+                                          'limit': limit, 'continue': token})
+
+            # yield the objects
+            yield page.get('items') or []
+
+            # check for the next page
+            token = page.get('metadata', {}).get('continue')
+            if not token:
+                break
+
+    # function to get a single object
+    def get(self, kind, name, namespace = None):
+
+        """
+        Main method to get a single object.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, e.g. 'deployments'
+        name : string
+            String with the name of the object
+        namespace : string
+            String with the namespace, by default the namespace of the client
+        Returns
+        -------
+        dict
+            Dictionary with the object
+        """
+
+        # get the object
+        return self.request('GET', resource_path(kind, namespace or self.namespace, name))
+
+    # function to check if an object exists
+    def exists(self, kind, name, namespace = None):
+
+        """
+        Main method to check if an object exists.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the object exists, otherwise 'False'
+        """
+
+        # try to get the object
+        try:
+            self.get(kind, name, namespace)
+            return True
+
+        # a 404 means it does not exist
+        except KubeApiError as error:
+            if error.status == 404:
+                return False
+            raise
+
+    # function to delete an object
+    def delete(self, kind, name, namespace = None):
+
+        """
+        Main method to delete an object.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, e.g. 'services'
+        name : string
+            String with the name of the object
+        namespace : string
+            String with the namespace, by default the namespace of the client
+        Returns
+        -------
+        dict
+            Dictionary with the response of the API server
+        """
+
+        # delete the object, dependents are removed in the background like kubectl does
+        return self.request('DELETE', resource_path(kind, namespace or self.namespace, name),
+                            body = {'kind': 'DeleteOptions', 'apiVersion': 'v1', 'propagationPolicy': 'Background'})
+
+    # function to apply an object
+    def apply(self, manifest, field_manager = 'kubipy', force = True):
+
+        """
+        Main method to apply an object with server-side apply.
+        The API server creates the object or merges the changes into it in a
+        single request, e.g. a new image rolls the pods of a deployment over.
+        Parameters
+        ----------
+        manifest : dict
+            Dictionary with the full object, including kind and metadata
+        field_manager : string
+            String with the name of the field manager
+        force : boolean
+            Boolean indicating whether fields owned by other managers are
+            taken over
+        Returns
+        -------
+        dict
+            Dictionary with the applied object
+        """
+
+        # resolve the path of the object
+        path = resource_path(manifest['kind'].lower(), manifest['metadata'].get('namespace') or self.namespace,
+                             manifest['metadata']['name'])
+
+        # apply the object, JSON is valid YAML
+        return self.request('PATCH', path,
+                            params = {'fieldManager': field_manager, 'force': 'true' if force else None},
+                            body = manifest,
+                            content_type = 'application/apply-patch+yaml')
+
+    # function to wait for an object to reach a state
+    def wait_for(self, kind, predicate, namespace = None, label_selector = None, field_selector = None,
+                 timeout = 300):
+
+        """
+        Main method to wait until an object satisfies a condition.
+        This function opens a single watch. The API server first sends the
+        existing objects and then every change, so the condition is checked
+        the moment it changes instead of by polling.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, e.g. 'pods'
+        predicate : function
+            Function taking an object and returning 'True' once it is ready
+        namespace : string
+            String with the namespace, by default the namespace of the client
+        label_selector : string
+            String with a label selector
+        field_selector : string
+            String with a field selector, e.g. 'metadata.name=my-deployment'
+        timeout : float
+            Float with the number of seconds to wait at most
+        Returns
+        -------
+        dict
+            Dictionary with the first object that satisfied the condition
+        """
+
+        # compute the deadline
+        deadline = time.monotonic() + timeout
+
+        # watch until the deadline
+        while True:
+
+            # compute the time left
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('waited ' + str(timeout) + ' seconds for ' + kind)
+
+            # define the watch, the server ends it at the deadline
+            params = {'watch': '1', 'labelSelector': label_selector, 'fieldSelector': field_selector,
+                      'timeoutSeconds': max(1, int(remaining))}
+
+            # try to follow the changes
+            try:
+
+                # read event by event
+                for line in self.stream(resource_path(kind, namespace or self.namespace), params = params,
+                                        timeout = remaining):
+
+                    # skip keep-alive lines
+                    if not line.strip():
+                        continue
+
+                    # decode the event
+                    event = json.loads(line)
+
+                    # check the object
+                    if event.get('type') in ('ADDED', 'MODIFIED') and predicate(event.get('object') or {}):
+                        return event['object']
+
+            # the socket timed out, the loop checks the deadline
+            except socket.timeout:
+                continue
+
+    # function to close all connections
+    def close(self):
+
+        """
+        Main method to close all idle connections of the pool.
+        """
+
+        # close every idle connection
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                break
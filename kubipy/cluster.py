@@ -0,0 +1,153 @@
+"""
+cluster.py contains the helper functions to read the state of a Minikube
+cluster and to time its boot, shared by minipy() and AsyncMinipy().
+"""
+
+# import libs
+import json
+import time
+
+# define the components a healthy cluster runs
+HEALTHY_COMPONENTS = ('Host', 'Kubelet', 'APIServer')
+
+# define the line of 'minikube start' after which the driver is up and the
+# Kubernetes bootstrap begins
+BOOTSTRAP_MARKER = 'Preparing Kubernetes'
+
+
+# function to parse the status of a cluster
+def parse_status(output):
+
+    """
+    Function to parse the output of 'minikube status -o json'.
+    Multi-node clusters print one object per node, the control plane first.
+    Parameters
+    ----------
+    output : bytes
+        Bytes with the output of the command
+    Returns
+    -------
+    dict
+        Dictionary with the status of the control plane, e.g. {'Host':
+        'Running', 'APIServer': 'Paused'}, or an empty dict
+    """
+
+    # decode the output
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+
+    # missing profiles print a message instead of json
+    try:
+        status = json.loads(output)
+    except ValueError:
+        return {}
+
+    # keep the control plane
+    if isinstance(status, list):
+        status = status[0] if status else {}
+
+    # return the status
+    return status if isinstance(status, dict) else {}
+
+
+# function to name the state of a cluster
+def cluster_state(status):
+
+    """
+    Function to name the state of a cluster from its parsed status.
+    Parameters
+    ----------
+    status : dict
+        Dictionary returned by parse_status()
+    Returns
+    -------
+    string
+        String with the state: 'running', 'paused', 'stopped', 'missing' or
+        'degraded' if the host runs but Kubernetes does not serve
+    """
+
+    # no profile, no cluster
+    if not status or status.get('Host') in (None, 'Nonexistent'):
+        return 'missing'
+
+    # the host is down
+    if status.get('Host') != 'Running':
+        return 'stopped'
+
+    # minikube pause freezes the control plane
+    if status.get('APIServer') == 'Paused':
+        return 'paused'
+
+    # everything runs and kubectl points to it
+    if all(status.get(component) == 'Running' for component in HEALTHY_COMPONENTS) \
+            and status.get('Kubeconfig', 'Configured') == 'Configured':
+        return 'running'
+
+    # anything else needs a real start
+    return 'degraded'
+
+
+# setup class
+class BootTimer:
+
+    # describe class
+    def __init__(self):
+
+        """
+        Class to time the phases of a cluster start from the output of
+        'minikube start', as on_line function of the command runner.
+        The driver phase (creating or restarting the VM) ends with the line
+        'Preparing Kubernetes ...', the Kubernetes bootstrap ends when the
+        command exits and the API phase when /readyz answers.
+        """
+
+        # define the slots
+        self.started = time.perf_counter()
+        self.bootstrap_started = None
+        self.exited = None
+        self.log = []
+
+    # function called with every line
+    def __call__(self, line):
+
+        # keep the line with its offset
+        now = time.perf_counter()
+        if line.strip():
+            self.log.append([round(now - self.started, 3), line.strip()])
+
+        # the driver is up once kubernetes is prepared
+        if self.bootstrap_started is None and BOOTSTRAP_MARKER in line:
+            self.bootstrap_started = now
+
+    # function to stop the clock of the command
+    def exit(self):
+
+        """
+        Main method to note that 'minikube start' exited.
+        """
+
+        # stop the clock
+        self.exited = time.perf_counter()
+
+    # function to get the phases
+    def phases(self, ready_at = None):
+
+        """
+        Main method to get the seconds per boot phase.
+        Parameters
+        ----------
+        ready_at : float
+            Float with the time.perf_counter() at which /readyz answered
+        Returns
+        -------
+        dict
+            Dictionary with the seconds of 'driver', 'kubernetes' and 'api',
+            None where the output of minikube did not tell
+        """
+
+        # split the command at the marker, if minikube printed it
+        exited = self.exited if self.exited is not None else time.perf_counter()
+        split = self.bootstrap_started
+        return {'driver': None if split is None else split - self.started,
+                'kubernetes': None if split is None else exited - split,
+                'api': None if ready_at is None else ready_at - exited}
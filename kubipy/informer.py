@@ -0,0 +1,603 @@
+"""
+informer.py contains the classes Informer() and InformerCache(), which keep a
+local, indexed copy of cluster objects current through watch streams.
+An informer lists the objects once and then only follows the changes. Reads
+are answered from memory, without a request to the API server.
+Slots:
+--------
+kind : str
+    Stores the kind of the objects, e.g. 'pods'
+namespace : str
+    Stores the namespace of the objects
+resource_version : str
+    Stores the resourceVersion the watch resumes from
+relists : int
+    Stores how often the informer had to list all objects again
+"""
+
+# import libs
+import threading
+import socket
+import json
+
+# import modules
+from kubipy.client import KubeApiError, resource_path
+
+
+# define the signal of an expired resourceVersion
+class WatchExpired(Exception):
+
+    """
+    Exception raised when the resourceVersion of a watch is too old (410 Gone)
+    and the objects have to be listed again.
+    """
+
+
+# setup class
+class Informer:
+
+    # describe class
+    def __init__(self, client, kind, namespace = 'default', watch_timeout = 300):
+
+        """
+        Class to keep the objects of one kind current in memory.
+        The objects are indexed by name, by label and by owner.
+        Parameters
+        ----------
+        client : KubeClient
+            Client of the API server
+        kind : string
+            String with the kind, e.g. 'pods'
+        namespace : string
+            String with the namespace
+        watch_timeout : int
+            Integer with the seconds after which the server ends a watch, it
+            is resumed from the last resourceVersion right away
+        """
+
+        # define the slots
+        self.kind = kind
+        self.namespace = namespace
+        self.resource_version = None
+        self.relists = 0
+
+        # keep the client and the settings
+        self.__client = client
+        self.__watch_timeout = watch_timeout
+
+        # define the store and the indexes
+        self.__lock = threading.RLock()
+        self.__objects = {}
+        self.__labels = {}
+        self.__owners = {}
+
+        # define the state of the thread
+        self.__synced = threading.Event()
+        self.__current = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread = None
+        self.__connection = None
+
+    # helper function to add an object to the indexes
+    def __index(self, item):
+
+        """
+        Private method to add an object to the store and the indexes.
+        """
+
+        # read the name
+        name = item['metadata']['name']
+
+        # remove an old version first
+        self.__unindex(name)
+
+        # store the object
+        self.__objects[name] = item
+
+        # index the labels
+        for key, value in (item['metadata'].get('labels') or {}).items():
+            self.__labels.setdefault((key, value), set()).add(name)
+
+        # index the owners
+        for owner in item['metadata'].get('ownerReferences') or []:
+            self.__owners.setdefault((owner.get('kind'), owner.get('name')), set()).add(name)
+
+    # helper function to remove an object from the indexes
+    def __unindex(self, name):
+
+        """
+        Private method to remove an object from the store and the indexes.
+        """
+
+        # remove the object
+        item = self.__objects.pop(name, None)
+
+        # nothing to do
+        if item is None:
+            return
+
+        # remove it from the label index
+        for key, value in (item['metadata'].get('labels') or {}).items():
+            names = self.__labels.get((key, value))
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.__labels[(key, value)]
+
+        # remove it from the owner index
+        for owner in item['metadata'].get('ownerReferences') or []:
+            names = self.__owners.get((owner.get('kind'), owner.get('name')))
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.__owners[(owner.get('kind'), owner.get('name'))]
+
+    # helper function to list all objects
+    def __relist(self):
+
+        """
+        Private method to list all objects and replace the store.
+        """
+
+        # list the objects
+        response = self.__client.list(self.kind, namespace = self.namespace)
+
+        # replace the store
+        with self.__lock:
+
+            # clear everything
+            self.__objects = {}
+            self.__labels = {}
+            self.__owners = {}
+
+            # index the objects
+            for item in response.get('items') or []:
+                self.__index(item)
+
+            # resume from the version of the list
+            self.resource_version = response.get('metadata', {}).get('resourceVersion')
+
+        # count the relists
+        self.relists = self.relists + 1
+
+        # the store is usable and current now
+        self.__synced.set()
+        self.__current.set()
+
+    # helper function to follow the changes
+    def __watch(self):
+
+        """
+        Private method to follow the changes from the last resourceVersion
+        until the server ends the watch.
+        """
+
+        # define the watch
+        params = {'watch': '1',
+                  'resourceVersion': self.resource_version,
+                  'allowWatchBookmarks': 'true',
+                  'timeoutSeconds': self.__watch_timeout}
+
+        # remember the connection, so stop() can shut it down
+        def remember(connection):
+            self.__connection = connection
+
+        # a running watch keeps the store current
+        def running():
+            self.__current.set()
+
+        # try to follow the changes
+        try:
+
+            # read event by event
+            for line in self.__client.stream(resource_path(self.kind, self.namespace), params = params,
+                                             on_connect = remember, on_response = running):
+
+                # skip keep-alive lines
+                if not line.strip():
+                    continue
+
+                # decode the event
+                event = json.loads(line)
+                kind = event.get('type')
+                item = event.get('object') or {}
+
+                # an error event carries a Status, 410 means the version expired
+                if kind == 'ERROR':
+                    if item.get('code') == 410:
+                        raise WatchExpired(item.get('message'))
+                    raise Exception('watch failed: ' + str(item.get('message')))
+
+                # apply the event
+                with self.__lock:
+                    if kind in ('ADDED', 'MODIFIED'):
+                        self.__index(item)
+                    elif kind == 'DELETED':
+                        self.__unindex(item['metadata']['name'])
+                    self.resource_version = item.get('metadata', {}).get('resourceVersion', self.resource_version)
+
+        # a 410 can also come as the answer to the request
+        except KubeApiError as error:
+            if error.status == 410:
+                raise WatchExpired(str(error))
+            raise
+
+        # forget the connection
+        finally:
+            self.__connection = None
+
+    # helper function running in the thread
+    def __run(self):
+
+        """
+        Private method running the list and watch loop until stop() is called.
+        Expired watches list again, broken connections resume the watch with
+        exponential backoff. While it fails, the store is not current.
+        """
+
+        # start with a short backoff
+        backoff = 0.5
+
+        # loop until stopped
+        while not self.__stopped.is_set():
+
+            # try to list and watch
+            try:
+
+                # list if there is no version to resume from
+                if self.resource_version is None:
+                    self.__relist()
+
+                # follow the changes
+                self.__watch()
+
+                # a clean end resets the backoff
+                backoff = 0.5
+
+            # the version expired, so list again
+            except WatchExpired:
+
+                # forget the version
+                self.resource_version = None
+
+            # anything else waits and resumes
+            except Exception:
+
+                # the store misses the changes until the watch is back
+                self.__current.clear()
+
+                # wait, unless stopped
+                if self.__stopped.wait(backoff):
+                    break
+
+                # back off further
+                backoff = min(backoff * 2, 30)
+
+    # function to start the informer
+    def start(self):
+
+        """
+        Main method to start the informer in a background thread.
+        """
+
+        # start the thread once
+        if self.__thread is None:
+
+            # start the thread
+            self.__thread = threading.Thread(target = self.__run, name = 'kubipy-informer-' + self.kind,
+                                             daemon = True)
+            self.__thread.start()
+
+        # return self to allow chaining
+        return self
+
+    # function to wait until the store is filled
+    def wait_for_sync(self, timeout = None):
+
+        """
+        Main method to wait until the first list is in memory.
+        Parameters
+        ----------
+        timeout : float
+            Float with the number of seconds to wait at most
+        Returns
+        -------
+        boolean
+            Returns 'True' if the informer is synced, otherwise 'False'
+        """
+
+        # wait for the event
+        return self.__synced.wait(timeout)
+
+    # function to check if the store is filled
+    def is_synced(self):
+
+        """
+        Main method to check if the first list is in memory.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the informer is synced, otherwise 'False'
+        """
+
+        # check the event
+        return self.__synced.is_set()
+
+    # function to check if the store follows the changes
+    def is_current(self):
+
+        """
+        Main method to check if the store is synced and its watch is running.
+        It is not current while the list or the watch keep failing, e.g. on
+        network errors, then the objects in memory may be out of date.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the informer is current, otherwise 'False'
+        """
+
+        # check both events
+        return self.__synced.is_set() and self.__current.is_set()
+
+    # function to stop the informer
+    def stop(self, timeout = 5):
+
+        """
+        Main method to stop the informer and its thread.
+        Parameters
+        ----------
+        timeout : float
+            Float with the number of seconds to wait for the thread
+        """
+
+        # signal the thread
+        self.__stopped.set()
+
+        # unblock a running watch
+        connection = self.__connection
+        if connection is not None and connection.sock is not None:
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        # wait for the thread
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    # function to get an object by name
+    def get(self, name):
+
+        """
+        Main method to get an object by name.
+        Returns
+        -------
+        dict
+            Dictionary with the object, or None if it does not exist
+        """
+
+        # look it up
+        with self.__lock:
+            return self.__objects.get(name)
+
+    # function to check if an object exists
+    def exists(self, name):
+
+        """
+        Main method to check if an object exists.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the object exists, otherwise 'False'
+        """
+
+        # look it up
+        with self.__lock:
+            return name in self.__objects
+
+    # function to list all objects
+    def list(self):
+
+        """
+        Main method to list all objects.
+        Returns
+        -------
+        list
+            List with the objects
+        """
+
+        # copy the list
+        with self.__lock:
+            return list(self.__objects.values())
+
+    # function to find objects by label
+    def by_label(self, selector):
+
+        """
+        Main method to find objects by their labels.
+        Parameters
+        ----------
+        selector : dict
+            Dictionary with the labels all objects must have, a string like
+            'app=api,tier=web' works as well
+        Returns
+        -------
+        list
+            List with the matching objects
+        """
+
+        # parse string selectors
+        if isinstance(selector, str):
+            selector = dict(part.split('=', 1) for part in selector.split(',') if part)
+
+        # intersect the index entries
+        with self.__lock:
+
+            # start with the first label
+            names = None
+            for key, value in selector.items():
+                matches = self.__labels.get((key, value), set())
+                names = set(matches) if names is None else names & matches
+
+            # an empty selector matches everything
+            if names is None:
+                names = set(self.__objects)
+
+            # return the objects
+            return [self.__objects[name] for name in sorted(names)]
+
+    # function to find objects by owner
+    def by_owner(self, owner_kind, owner_name):
+
+        """
+        Main method to find objects by their owner reference.
+        Parameters
+        ----------
+        owner_kind : string
+            String with the kind of the owner, e.g. 'ReplicaSet'
+        owner_name : string
+            String with the name of the owner
+        Returns
+        -------
+        list
+            List with the owned objects
+        """
+
+        # look up the index
+        with self.__lock:
+            names = self.__owners.get((owner_kind, owner_name), set())
+            return [self.__objects[name] for name in sorted(names)]
+
+
+# setup class
+class InformerCache:
+
+    # describe class
+    def __init__(self, client, kinds = ('pods', 'services', 'deployments'), namespace = 'default'):
+
+        """
+        Class to bundle the informers of several kinds in one namespace.
+        Parameters
+        ----------
+        client : KubeClient
+            Client of the API server
+        kinds : tuple
+            Tuple with the kinds to keep in memory
+        namespace : string
+            String with the namespace
+        """
+
+        # define the slots
+        self.namespace = namespace
+        self.informers = {kind: Informer(client, kind, namespace = namespace) for kind in kinds}
+
+    # function to start all informers
+    def start(self, timeout = 30):
+
+        """
+        Main method to start all informers and wait until they are synced.
+        Parameters
+        ----------
+        timeout : float
+            Float with the number of seconds to wait for the first lists
+        Returns
+        -------
+        boolean
+            Returns 'True' if all informers are synced, otherwise 'False'
+        """
+
+        # start all threads, the lists run concurrently
+        for informer in self.informers.values():
+            informer.start()
+
+        # wait for all of them
+        return all(informer.wait_for_sync(timeout) for informer in self.informers.values())
+
+    # function to stop all informers
+    def stop(self):
+
+        """
+        Main method to stop all informers.
+        """
+
+        # stop every informer
+        for informer in self.informers.values():
+            informer.stop()
+
+    # function to check if a kind is answered from memory
+    def serves(self, kind, namespace = None):
+
+        """
+        Main method to check if a kind can be answered from memory.
+        Returns
+        -------
+        boolean
+            Returns 'True' if an informer for the kind is current, otherwise
+            the kind has to be listed from the API server
+        """
+
+        # check the namespace and the informer
+        informer = self.informers.get(kind)
+        return (informer is not None and informer.is_current()
+                and (namespace is None or namespace == self.namespace))
+
+    # function to check if an object exists
+    def exists(self, kind, name):
+
+        """
+        Main method to check if an object exists.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the object exists, otherwise 'False'
+        """
+
+        # ask the informer
+        return self.informers[kind].exists(name)
+
+    # function to list all objects of a kind
+    def list(self, kind):
+
+        """
+        Main method to list all objects of a kind.
+        Returns
+        -------
+        list
+            List with the objects
+        """
+
+        # ask the informer
+        return self.informers[kind].list()
+
+    # function to find the pods of a deployment
+    def pods_for_deployment(self, deployment_name):
+
+        """
+        Main method to find the pods of a deployment.
+        The pods are matched with the label selector of the deployment.
+        Parameters
+        ----------
+        deployment_name : string
+            String with the name of the deployment
+        Returns
+        -------
+        list
+            List with the pods
+        """
+
+        # look up the deployment
+        deployment = self.informers['deployments'].get(deployment_name)
+
+        # no deployment, no pods
+        if deployment is None:
+            return []
+
+        # read the selector
+        selector = deployment.get('spec', {}).get('selector', {}).get('matchLabels') or {}
+
+        # an empty selector would match every pod
+        if not selector:
+            return []
+
+        # match the pods by the selector
+        return self.informers['pods'].by_label(selector)
@@ -0,0 +1,574 @@
+"""
+install.py contains the class Step() and the function run_steps(), which run
+the steps of an installation as a dependency graph.
+A step starts as soon as all steps it requires are done, so independent
+downloads and installs overlap. Steps sharing a lock, e.g. everything that
+writes to the Homebrew prefix, still run one after another.
+The class InstallState() checkpoints the finished steps and components, so a
+failed installation resumes where it stopped.
+Slots:
+--------
+name : str
+    Stores the name of the step, '<component>:<action>', e.g. 'kubectl:fetch'
+action : function
+    Stores the function doing the work, it raises if the step fails
+requires : tuple
+    Stores the names of the steps that have to be done first
+lock : str
+    Stores the name of the lock the step holds while it runs
+"""
+
+# import libs
+import concurrent.futures
+import threading
+import hashlib
+import json
+import time
+import os
+
+# define the Homebrew recipes: the download, where Homebrew keeps it, the
+# commands installing it, the commands run afterwards and the components it
+# depends on
+COMPONENTS = {'docker': {'fetch': 'brew fetch --cask docker',
+                         'cache': 'brew --cache --cask docker',
+                         'install': ['brew install --cask docker'],
+                         'launch': ['open /Applications/Docker.app'],
+                         'requires': ()},
+              'virtualbox': {'fetch': 'brew fetch --cask virtualbox',
+                             'cache': 'brew --cache --cask virtualbox',
+                             'install': ['brew install --cask virtualbox'],
+                             'launch': [],
+                             'requires': ()},
+              'kubectl': {'fetch': 'brew fetch kubectl',
+                          'cache': 'brew --cache kubectl',
+                          'install': ['brew install kubectl', 'brew link --overwrite kubernetes-cli'],
+                          'launch': [],
+                          'requires': ()},
+              'minikube': {'fetch': 'brew fetch minikube',
+                           'cache': 'brew --cache minikube',
+                           'install': ['brew install minikube'],
+                           'launch': [],
+                           'requires': ('kubectl',)}}
+
+
+# helper function to compute the checksum of a file
+def file_checksum(path):
+
+    """
+    Function to compute the sha256 checksum of a file in chunks.
+    Parameters
+    ----------
+    path : string
+        String with the path of the file
+    Returns
+    -------
+    string
+        String with the hex digest
+    """
+
+    # hash the file chunk by chunk
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+
+    # return the digest
+    return digest.hexdigest()
+
+
+# define the error of a failed installation
+class InstallError(Exception):
+
+    """
+    Exception raised when steps of an installation failed.
+    Slots:
+    --------
+    results : dict
+        Stores the result of every step
+    """
+
+    # describe class
+    def __init__(self, results):
+
+        # define the slots
+        self.results = results
+
+        # build the message from the failed steps
+        failed = [name + ' (' + str(result['error']) + ')' for name, result in results.items()
+                  if result['status'] == 'failed']
+        super().__init__('failed steps: ' + ', '.join(failed))
+
+
+# setup class
+class Step:
+
+    # keep instances small
+    __slots__ = ('name', 'action', 'requires', 'lock')
+
+    # describe class
+    def __init__(self, name, action, requires = (), lock = None):
+
+        """
+        Class to describe one step of an installation.
+        Parameters
+        ----------
+        name : string
+            String with the name, '<component>:<action>', e.g. 'kubectl:fetch'
+        action : function
+            Function doing the work, it raises if the step fails
+        requires : tuple
+            Tuple with the names of the steps that have to be done first
+        lock : string
+            String with the name of a lock, steps with the same lock never
+            run at the same time
+        """
+
+        # define the slots
+        self.name = name
+        self.action = action
+        self.requires = tuple(requires)
+        self.lock = lock
+
+    # function to get the component
+    @property
+    def component(self):
+
+        # take the part before the colon
+        return self.name.split(':')[0]
+
+    # function to describe the step
+    def __repr__(self):
+
+        # return the description
+        return '<Step ' + self.name + '>'
+
+
+# function to fetch a component through the artifact cache
+def fetch_cached(name, run, artifacts):
+
+    """
+    Function to fetch the download of a component through an artifact cache.
+    If the cache has the download, it is copied into the Homebrew cache and
+    nothing is downloaded, so 'brew install' works offline. Otherwise it is
+    fetched by Homebrew and added to the artifact cache.
+    Parameters
+    ----------
+    name : string
+        String with the name of the component
+    run : function
+        Function called with the operation and the command, returning the
+        CommandResult, it raises if the command fails
+    artifacts : ArtifactCache
+        Cache of the downloads
+    Returns
+    -------
+    boolean
+        Returns 'True' if the download came from the artifact cache
+    """
+
+    # ask Homebrew where it keeps the download, the file name carries the version
+    recipe = COMPONENTS[name]
+    path = run('fetch', recipe['cache']).stdout.decode('utf-8').strip()
+    key = name + '/' + os.path.basename(path)
+
+    # seed the Homebrew cache from the artifact cache
+    if path and artifacts.restore(key, path):
+        return True
+
+    # download it and keep it
+    run('fetch', recipe['fetch'])
+    if path and os.path.isfile(path):
+        artifacts.store(key, path)
+    return False
+
+
+# function to plan the steps of components
+def plan_steps(components, run, artifacts = None):
+
+    """
+    Function to plan the steps installing components with Homebrew.
+    Every component is fetched without a lock, so all downloads run at the
+    same time. The installs hold the 'brew' lock, because Homebrew does not
+    allow two installs at once, and wait for the installs of the components
+    they depend on, if those are installed in the same run.
+    Parameters
+    ----------
+    components : list
+        List with the names of the components to install
+    run : function
+        Function called with the operation ('fetch' or 'install') and the
+        command, it raises if the command fails
+    artifacts : ArtifactCache
+        Cache the downloads are served from and added to, if given
+    Returns
+    -------
+    list
+        List with the steps
+    """
+
+    # define helper to bind commands to an action
+    def action(operation, commands):
+        def execute():
+            for command in commands:
+                run(operation, command)
+        return execute
+
+    # plan every component
+    steps = []
+    for name in components:
+
+        # look up the recipe
+        recipe = COMPONENTS[name]
+
+        # download, through the artifact cache if there is one
+        if artifacts is not None:
+            steps.append(Step(name + ':fetch', lambda name = name: fetch_cached(name, run, artifacts)))
+        else:
+            steps.append(Step(name + ':fetch', action('fetch', [recipe['fetch']])))
+
+        # install after the download and the installs of the dependencies
+        requires = [name + ':fetch'] + [dependency + ':install' for dependency in recipe['requires']
+                                        if dependency in components]
+        steps.append(Step(name + ':install', action('install', recipe['install']), requires = requires,
+                          lock = 'brew'))
+
+        # launch after the install
+        if recipe['launch']:
+            steps.append(Step(name + ':launch', action('install', recipe['launch']), requires = [name + ':install']))
+
+    # return the steps
+    return steps
+
+
+# helper function to check a graph
+def check_steps(steps):
+
+    """
+    Function to check that all requirements exist and there is no cycle.
+    Parameters
+    ----------
+    steps : list
+        List with the steps
+    """
+
+    # index the steps
+    by_name = {step.name: step for step in steps}
+
+    # check the requirements
+    for step in steps:
+        missing = [name for name in step.requires if name not in by_name]
+        if missing:
+            raise Exception(step.name + ' requires unknown steps: ' + ', '.join(missing))
+
+    # remove steps without open requirements until nothing is left
+    open_steps = dict(by_name)
+    while open_steps:
+        free = [name for name, step in open_steps.items()
+                if not any(required in open_steps for required in step.requires)]
+        if not free:
+            raise Exception('the steps have a cycle: ' + ', '.join(sorted(open_steps)))
+        for name in free:
+            del open_steps[name]
+
+
+# function to run the steps
+def run_steps(steps, max_workers = 4, on_event = None, completed = ()):
+
+    """
+    Function to run steps as soon as their requirements are done.
+    A failed step does not stop independent steps, but every step that
+    requires it is skipped.
+    Parameters
+    ----------
+    steps : list
+        List with the steps
+    max_workers : int
+        Integer with the maximum number of steps running at once
+    on_event : function
+        Function called with the step, the event ('started', 'done',
+        'failed', 'skipped' or 'resumed') and the result, e.g. to show
+        progress
+    completed : set
+        Set with the names of steps finished in an earlier run, they count
+        as done without running
+    Returns
+    -------
+    dict
+        Dictionary with one result per step: status, seconds (running),
+        waited (for its lock) and error
+    """
+
+    # check the graph
+    check_steps(steps)
+
+    # define the locks
+    locks = {step.lock: threading.Lock() for step in steps if step.lock is not None}
+
+    # define helper to tell about an event
+    def tell(step, event, result):
+        if on_event is not None:
+            try:
+                on_event(step, event, result)
+            except Exception:
+                pass
+
+    # define helper running a step
+    def execute(step):
+
+        # wait for the lock
+        started = time.perf_counter()
+        lock = locks.get(step.lock)
+        if lock is not None:
+            lock.acquire()
+
+        # run the action
+        try:
+            ran = time.perf_counter()
+            tell(step, 'started', None)
+            step.action()
+            return {'status': 'done', 'seconds': time.perf_counter() - ran, 'waited': ran - started, 'error': None}
+
+        # a failure is a result, not an exception of the pool
+        except Exception as error:
+            return {'status': 'failed', 'seconds': time.perf_counter() - ran, 'waited': ran - started,
+                    'error': error}
+
+        # free the lock
+        finally:
+            if lock is not None:
+                lock.release()
+
+    # collect the results, steps finished earlier are done already
+    results = {}
+    pending = {}
+    running = {}
+    for step in steps:
+        if step.name in completed:
+            results[step.name] = {'status': 'done', 'seconds': 0.0, 'waited': 0.0, 'error': None}
+            tell(step, 'resumed', results[step.name])
+        else:
+            pending[step.name] = step
+
+    # run until every step has a result
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+        while pending or running:
+
+            # skip steps whose requirements failed or were skipped
+            skipped = True
+            while skipped:
+                skipped = False
+                for name, step in list(pending.items()):
+                    if any(results.get(required, {}).get('status') in ('failed', 'skipped')
+                           for required in step.requires):
+                        results[name] = {'status': 'skipped', 'seconds': 0.0, 'waited': 0.0, 'error': None}
+                        tell(step, 'skipped', results[name])
+                        del pending[name]
+                        skipped = True
+
+            # start the steps whose requirements are done
+            for name, step in list(pending.items()):
+                if all(results.get(required, {}).get('status') == 'done' for required in step.requires):
+                    running[executor.submit(execute, step)] = step
+                    del pending[name]
+
+            # nothing left to wait for
+            if not running:
+                break
+
+            # wait for the next step to end
+            done, _ = concurrent.futures.wait(running, return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                results[step.name] = future.result()
+                tell(step, results[step.name]['status'], results[step.name])
+
+    # return the results in the order of the steps
+    return {step.name: results[step.name] for step in steps}
+
+
+# setup class
+class InstallState:
+
+    # describe class
+    def __init__(self, path):
+
+        """
+        Class to checkpoint an installation on disk.
+        The file records every finished step and every installed component
+        with its path, version and checksum. Steps are recorded as they 
+        finish, from the threads running them, so the file is always written
+        under a lock and moved into place atomically.
+        Parameters
+        ----------
+        path : string
+            String with the path of the file, e.g. ~/.kubipy/install-state.json
+        """
+
+        # define the slots
+        self.path = path
+        self.__lock = threading.Lock()
+
+        # try to read the file
+        try:
+            with open(path) as file:
+                state = json.load(file)
+            self.steps = dict(state.get('steps', {}))
+            self.components = dict(state.get('components', {}))
+
+        # handle missing or broken files
+        except (OSError, ValueError, AttributeError):
+            self.steps = {}
+            self.components = {}
+
+    # helper function to write the file
+    def __save(self):
+
+        """
+        Private method to write the file atomically, the lock is held.
+        """
+
+        # try to write the file
+        try:
+
+            # make sure the directory exists
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+
+            # write to a temporary file and move it into place
+            tmp_path = str(self.path + '.' + str(os.getpid()) + '.tmp')
+            with open(tmp_path, 'w') as file:
+                json.dump({'steps': self.steps, 'components': self.components}, file, indent = 2)
+            os.replace(tmp_path, self.path)
+
+        # a checkpoint that cannot be written is not fatal
+        except OSError:
+            pass
+
+    # function to checkpoint a step
+    def mark_step(self, name):
+
+        """
+        Main method to record a finished step.
+        Parameters
+        ----------
+        name : string
+            String with the name of the step, e.g. 'kubectl:fetch'
+        """
+
+        # record and write
+        with self.__lock:
+            self.steps[name] = {'completed_at': time.time()}
+            self.__save()
+
+    # function to get the finished steps of a component
+    def completed_steps(self, component, max_age = None):
+
+        """
+        Main method to get the finished steps of a component.
+        Parameters
+        ----------
+        component : string
+            String with the name of the component
+        max_age : float
+            Float with the seconds after which a checkpoint is not trusted
+        Returns
+        -------
+        set
+            Set with the names of the steps
+        """
+
+        # filter the steps
+        with self.__lock:
+            return {name for name, entry in self.steps.items()
+                    if name.split(':')[0] == component
+                    and (max_age is None or time.time() - entry.get('completed_at', 0) < max_age)}
+
+    # function to record a component
+    def record_component(self, name, path, version):
+
+        """
+        Main method to record an installed component with its checksum.
+        Parameters
+        ----------
+        name : string
+            String with the name of the component
+        path : string
+            String with the path of its executable
+        version : string
+            String with its version
+        """
+
+        # fingerprint the executable
+        stat = os.stat(path)
+        entry = {'path': path, 'version': version, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                 'sha256': file_checksum(path), 'recorded_at': time.time()}
+
+        # record and write
+        with self.__lock:
+            self.components[name] = entry
+            self.__save()
+
+    # function to verify a component
+    def verify_component(self, name):
+
+        """
+        Main method to verify a recorded component cheaply.
+        An executable with unchanged mtime and size is trusted right away.
+        Otherwise it is hashed, and only if the checksum differs as well the
+        component counts as changed.
+        Parameters
+        ----------
+        name : string
+            String with the name of the component
+        Returns
+        -------
+        boolean
+            Returns 'True' if the component is still what was installed
+        """
+
+        # look up the record
+        with self.__lock:
+            entry = dict(self.components.get(name) or {})
+
+        # nothing recorded
+        if not entry.get('path'):
+            return False
+
+        # try to compare the executable
+        try:
+
+            # compare the fingerprint
+            stat = os.stat(entry['path'])
+            if stat.st_mtime_ns == entry.get('mtime_ns') and stat.st_size == entry.get('size'):
+                return True
+
+            # compare the content, and remember the new fingerprint if it is the same
+            if file_checksum(entry['path']) == entry.get('sha256'):
+                with self.__lock:
+                    self.components[name] = dict(entry, mtime_ns = stat.st_mtime_ns, size = stat.st_size)
+                    self.__save()
+                return True
+
+        # the executable is gone
+        except OSError:
+            pass
+
+        # changed or gone
+        return False
+
+    # function to forget a component
+    def forget(self, component):
+
+        """
+        Main method to forget a component and all its steps, so it is
+        installed from scratch.
+        Parameters
+        ----------
+        component : string
+            String with the name of the component
+        """
+
+        # remove and write
+        with self.__lock:
+            self.components.pop(component, None)
+            self.steps = {name: entry for name, entry in self.steps.items() if name.split(':')[0] != component}
+            self.__save()
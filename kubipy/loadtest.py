@@ -0,0 +1,539 @@
+"""
+loadtest.py contains the load generator of minipy.load_test(): the class
+LatencyHistogram(), a log-linear histogram in the style of HdrHistogram, and
+the coroutine run_load(), which drives an HTTP endpoint over a pool of
+keep-alive HTTP/1.1 connections.
+With a request rate, requests are due on a fixed schedule and their latency
+counts from the moment they were due, not from the moment a free connection
+sent them. A slow server therefore shows up in the percentiles instead of
+quietly lowering the rate (coordinated omission).
+Slots:
+--------
+lowest : float
+    Stores the smallest latency in seconds that is told apart from zero
+highest : float
+    Stores the largest latency in seconds, larger ones are counted as it
+significant_digits : int
+    Stores the number of significant decimal digits every value keeps
+count : int
+    Stores the number of recorded values
+"""
+
+# import libs
+import collections
+import urllib.parse
+import asyncio
+import array
+import math
+import ssl
+import time
+
+# define the percentiles of a summary
+SUMMARY_PERCENTILES = (('p50', 50), ('p90', 90), ('p99', 99), ('p999', 99.9))
+
+
+# setup class
+class LatencyHistogram:
+
+    # describe class
+    def __init__(self, lowest = 1e-6, highest = 3600, significant_digits = 3):
+
+        """
+        Class to count latencies in log-linear buckets: every power of two
+        is split into the same number of linear sub-buckets, so every value
+        keeps its significant digits, from microseconds to an hour, in a
+        fixed array of counts.
+        Parameters
+        ----------
+        lowest : float
+            Float with the resolution in seconds, one microsecond by default
+        highest : float
+            Float with the largest latency in seconds
+        significant_digits : int
+            Integer with the number of significant digits, 1 to 5
+        """
+
+        # check the precision
+        if not 1 <= significant_digits <= 5:
+
+            # raise Exception
+            raise Exception('significant_digits should be between 1 and 5')
+
+        # define the slots
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_digits = significant_digits
+        self.count = 0
+
+        # define the buckets, values are counted in units of lowest
+        self.__sub_bucket_magnitude = int(math.ceil(math.log2(2 * 10 ** significant_digits))) - 1
+        self.__sub_bucket_half = 1 << self.__sub_bucket_magnitude
+        self.__highest_value = max(int(math.ceil(highest / lowest)), 2 * self.__sub_bucket_half)
+        self.__counts = array.array('Q', bytes(8 * (self.__index(self.__highest_value) + 1)))
+        self.__sum = 0.0
+        self.__min = None
+        self.__max = None
+
+    # helper function to find the bucket of a value
+    def __index(self, value):
+
+        """
+        Private method to get the index of the count of a value in units.
+        """
+
+        # the power of two above the first bucket and the linear step in it
+        bucket = max(value.bit_length() - self.__sub_bucket_magnitude - 1, 0)
+        return (bucket << self.__sub_bucket_magnitude) + (value >> bucket)
+
+    # helper function to get the value of a bucket
+    def __value(self, index):
+
+        """
+        Private method to get the highest value in units a count stands for.
+        """
+
+        # split the index like __index() built it
+        bucket = max((index >> self.__sub_bucket_magnitude) - 1, 0)
+        sub_bucket = index - (bucket << self.__sub_bucket_magnitude)
+        return ((sub_bucket + 1) << bucket) - 1
+
+    # function to record a latency
+    def record(self, seconds, count = 1):
+
+        """
+        Main method to count a latency.
+        Parameters
+        ----------
+        seconds : float
+            Float with the latency in seconds, clamped to the range
+        count : int
+            Integer with the number of times it happened
+        """
+
+        # count it in its bucket
+        value = min(max(int(seconds / self.lowest), 0), self.__highest_value)
+        self.__counts[self.__index(value)] += count
+        self.count = self.count + count
+
+        # keep the exact extremes and the sum
+        self.__sum = self.__sum + seconds * count
+        self.__min = seconds if self.__min is None else min(self.__min, seconds)
+        self.__max = seconds if self.__max is None else max(self.__max, seconds)
+
+    # function to add another histogram
+    def merge(self, other):
+
+        """
+        Main method to add the counts of a histogram with the same settings,
+        e.g. of another worker.
+        """
+
+        # check the settings
+        if (other.lowest, other.highest, other.significant_digits) != \
+                (self.lowest, self.highest, self.significant_digits):
+
+            # raise Exception
+            raise Exception('Only histograms with the same settings can be merged')
+
+        # add the counts
+        for index, count in enumerate(other.__counts):
+            if count:
+                self.__counts[index] += count
+        self.count = self.count + other.count
+        self.__sum = self.__sum + other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.__min = value if self.__min is None else min(self.__min, value)
+                self.__max = value if self.__max is None else max(self.__max, value)
+
+    # function to get the sum
+    @property
+    def total(self):
+
+        # return the sum of all latencies
+        return self.__sum
+
+    # function to get the smallest latency
+    @property
+    def min(self):
+
+        # return the exact minimum
+        return self.__min
+
+    # function to get the largest latency
+    @property
+    def max(self):
+
+        # return the exact maximum
+        return self.__max
+
+    # function to get the mean
+    @property
+    def mean(self):
+
+        # return the exact mean
+        return self.__sum / self.count if self.count else None
+
+    # function to get a percentile
+    def percentile(self, percent):
+
+        """
+        Main method to get the latency below which a share of the values
+        falls, exact to the significant digits.
+        Parameters
+        ----------
+        percent : float
+            Float with the percentile, e.g. 99.9
+        Returns
+        -------
+        float
+            Float with the latency in seconds, None if nothing was recorded
+        """
+
+        # nothing recorded
+        if not self.count:
+            return None
+
+        # walk the counts up to the rank of the percentile
+        rank = max(int(math.ceil(min(percent, 100) / 100 * self.count)), 1)
+        seen = 0
+        for index, count in enumerate(self.__counts):
+            seen = seen + count
+            if seen >= rank:
+                return min(max(self.__value(index) * self.lowest, self.__min), self.__max)
+
+        # return the largest value
+        return self.__max
+
+    # function to summarize the latencies
+    def summary(self):
+
+        """
+        Main method to summarize the latencies.
+        Returns
+        -------
+        dict
+            Dictionary with count, min, mean, p50, p90, p99, p999 and max,
+            latencies in seconds
+        """
+
+        # build the summary
+        summary = {'count': self.count, 'min': self.min, 'mean': self.mean}
+        for name, percent in SUMMARY_PERCENTILES:
+            summary[name] = self.percentile(percent)
+        summary['max'] = self.max
+
+        # return it
+        return summary
+
+
+# setup class
+class ConnectionPool:
+
+    # describe class
+    def __init__(self, url, size, timeout):
+
+        """
+        Class to reuse keep-alive connections to one host. HTTP/1.0
+        connections are only kept if the server says 'Connection:
+        keep-alive'.
+        Parameters
+        ----------
+        url : string
+            String with the url, http or https
+        size : int
+            Integer with the number of connections kept open
+        timeout : float
+            Float with the number of seconds a request may take
+        """
+
+        # define the target
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+
+            # raise Exception
+            raise Exception('I can only load test http and https urls, not ' + url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self.host_header = parts.netloc
+        self.timeout = timeout
+
+        # define the idle connections
+        self.size = size
+        self.opened = 0
+        self.__idle = collections.deque()
+
+    # helper function to open a connection
+    async def __open(self, fresh = False):
+
+        """
+        Private method to take an idle connection or open a new one.
+        Returns
+        -------
+        tuple
+            Tuple with the reader, the writer and whether the connection was
+            used before
+        """
+
+        # reuse one, unless the server closed it meanwhile
+        while self.__idle and not fresh:
+            reader, writer = self.__idle.pop()
+            if not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+
+        # or open one
+        self.opened = self.opened + 1
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl = self.ssl)
+        return reader, writer, False
+
+    # helper function to read a response
+    async def __read(self, reader):
+
+        """
+        Private method to read a response, its body by length or in chunks.
+        Returns
+        -------
+        tuple
+            Tuple with the status code, the body size and whether the
+            connection may be reused, None if the connection was closed
+            before the first byte of the response
+        """
+
+        # read the status line, a closed connection ends here
+        try:
+            status_line = await reader.readuntil(b'\r\n')
+        except (asyncio.IncompleteReadError, ConnectionResetError) as error:
+            if getattr(error, 'partial', b''):
+                raise
+            return None
+        version, status = status_line.split(b' ', 2)[:2]
+        status = int(status)
+
+        # read the headers
+        headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # read the body, chunked or by length
+        size = 0
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                chunk = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                await reader.readexactly(chunk + 2)
+                size = size + chunk
+                if not chunk:
+                    break
+        elif 'content-length' in headers:
+            size = int(headers['content-length'])
+            await reader.readexactly(size)
+        elif status >= 200 and status not in (204, 304):
+            size = len(await reader.read())
+            return status, size, False
+
+        # HTTP/1.1 keeps the connection unless told otherwise, HTTP/1.0 only if told so
+        connection = headers.get('connection', '').lower()
+        keep = connection != 'close' if version.upper() == b'HTTP/1.1' else connection == 'keep-alive'
+
+        # return the response
+        return status, size, keep
+
+    # function to send a request
+    async def request(self, method = 'GET', body = None, headers = None):
+
+        """
+        Main method to send a request on a pooled connection.
+        Parameters
+        ----------
+        method : string
+            String with the HTTP method
+        body : bytes
+            Bytes with the request body
+        headers : dict
+            Dictionary with further headers
+        Returns
+        -------
+        tuple
+            Tuple with the status code and the body size
+        """
+
+        # write the request
+        body = body or b''
+        lines = [method + ' ' + self.target + ' HTTP/1.1', 'Host: ' + self.host_header,
+                 'Connection: keep-alive', 'Content-Length: ' + str(len(body))]
+        lines.extend(name + ': ' + value for name, value in (headers or {}).items())
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+        # send it and read the answer, a reused connection the server closed meanwhile is replaced once
+        fresh = False
+        while True:
+            reader, writer, reused = await asyncio.wait_for(self.__open(fresh), self.timeout)
+            try:
+                writer.write(payload)
+                response = await asyncio.wait_for(self.__read(reader), self.timeout)
+
+            # a broken connection is not reused
+            except BaseException:
+                writer.close()
+                raise
+
+            # check if the server answered
+            if response is not None:
+                break
+            writer.close()
+            if not reused:
+                raise ConnectionResetError('The server closed the connection without a response')
+            fresh = True
+        status, size, keep = response
+
+        # keep the connection for the next request
+        if keep and len(self.__idle) < self.size:
+            self.__idle.append((reader, writer))
+        else:
+            writer.close()
+
+        # return the answer
+        return status, size
+
+    # function to close the connections
+    def close(self):
+
+        """
+        Main method to close all idle connections.
+        """
+
+        # close them
+        while self.__idle:
+            _, writer = self.__idle.pop()
+            writer.close()
+
+
+# function to drive an endpoint
+async def run_load(url, rps = None, concurrency = 10, duration = 10, method = 'GET', body = None, headers = None,
+                   timeout = 10, histogram = False):
+
+    """
+    Function to send requests to an url for a while and measure them.
+    Parameters
+    ----------
+    url : string
+        String with the url, e.g. 'http://192.168.59.100:30080/predict'
+    rps : float
+        Float with the requests per second, None to send as fast as the
+        connections allow
+    concurrency : int
+        Integer with the number of requests in flight at most, which is also
+        the number of pooled connections
+    duration : float
+        Float with the number of seconds requests are started
+    method : string
+        String with the HTTP method
+    body : bytes
+        Bytes with the request body
+    headers : dict
+        Dictionary with further headers
+    timeout : float
+        Float with the number of seconds a request may take
+    histogram : boolean
+        Boolean indicating whether the LatencyHistogram is added to the
+        report as 'histogram', which makes it no plain data any more
+    Returns
+    -------
+    dict
+        Dictionary with the report, see minipy.load_test()
+    """
+
+    # check the load
+    if concurrency < 1 or duration <= 0 or (rps is not None and rps <= 0):
+
+        # raise Exception
+        raise Exception('concurrency, duration and rps should be positive')
+
+    # define the measurements
+    pool = ConnectionPool(url, concurrency, timeout)
+    latency = LatencyHistogram()
+    service = LatencyHistogram()
+    statuses = collections.Counter()
+    errors = collections.Counter()
+    sent = [0]
+    received = [0]
+
+    # define the schedule
+    started = time.perf_counter()
+    deadline = started + duration
+
+    # define one worker, they share the schedule
+    async def worker():
+        while True:
+
+            # take the next request of the schedule
+            if rps is not None:
+                due = started + sent[0] / rps
+                if due >= deadline:
+                    return
+                sent[0] = sent[0] + 1
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                due = time.perf_counter()
+                if due >= deadline:
+                    return
+                sent[0] = sent[0] + 1
+
+            # send it
+            begin = time.perf_counter()
+            try:
+                status, size = await pool.request(method, body, headers)
+                statuses[status] += 1
+                received[0] = received[0] + size
+                if status >= 400:
+                    errors['HTTP ' + str(status)] += 1
+
+            # count what went wrong
+            except asyncio.TimeoutError:
+                errors['timeout'] += 1
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError) as error:
+                errors[type(error).__name__] += 1
+
+            # measure from the time it was due and from the time it was sent
+            end = time.perf_counter()
+            latency.record(end - due)
+            service.record(end - begin)
+
+    # run the workers
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        pool.close()
+    elapsed = time.perf_counter() - started
+
+    # build the report
+    failed = sum(errors.values())
+    report = {'url': url,
+              'requests': sent[0],
+              'errors': failed,
+              'error_rate': failed / sent[0] if sent[0] else 0.0,
+              'error_kinds': dict(errors),
+              'status_codes': dict(sorted(statuses.items())),
+              'seconds': elapsed,
+              'throughput': (sent[0] - failed) / elapsed if elapsed else 0.0,
+              'target_rps': rps,
+              'concurrency': concurrency,
+              'connections': pool.opened,
+              'bytes_received': received[0],
+              'latency': latency.summary(),
+              'service_time': service.summary()}
+
+    # hand out the histogram, e.g. to merge several runs
+    if histogram:
+        report['histogram'] = latency
+
+    # return the report
+    return report
@@ -0,0 +1,383 @@
+"""
+logs.py contains the helpers of minipy.stream_logs(): the LogLine record, the
+parsing of 'kubectl logs --prefix --timestamps' and the class LogStreams(),
+which follows the logs of all pods of a deployment at once through the API
+server and merges them into one bounded queue.
+A full queue blocks the readers, which stop reading their connections, so a
+chatty deployment slows down to the pace of the consumer instead of filling
+the memory.
+Slots:
+--------
+namespace : str
+    Stores the namespace of the pods
+selector : str
+    Stores the label selector of the pods, e.g. 'app=my-deployment'
+follow : boolean
+    Stores if new lines and new pods are followed
+since : int
+    Stores how many seconds of past logs are read, None for all
+buffer_size : int
+    Stores how many lines are buffered at most
+refresh : float
+    Stores how many seconds pass between two looks for new pods
+"""
+
+# import libs
+import collections
+import threading
+import socket
+import queue
+import math
+import time
+
+# import modules
+from kubipy.client import resource_path
+
+# define a log line, tagged with its pod and container
+LogLine = collections.namedtuple('LogLine', ('pod', 'container', 'timestamp', 'message'))
+
+# define the seconds per unit of a duration
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+# function to convert a duration
+def since_seconds(since):
+
+    """
+    Function to convert the 'since' of stream_logs() to seconds.
+    Parameters
+    ----------
+    since : int, float or string
+        Seconds, or a duration like '30s', '5m', '2h' or '1d', None for all
+    Returns
+    -------
+    int
+        Integer with the seconds, None for all
+    """
+
+    # nothing to convert
+    if since is None:
+        return None
+
+    # numbers are seconds
+    if isinstance(since, (int, float)):
+        return max(int(math.ceil(since)), 1)
+
+    # durations have a unit
+    try:
+        return max(int(math.ceil(float(since[:-1]) * DURATION_UNITS[since[-1]])), 1)
+
+    # handle anything else
+    except (KeyError, ValueError, IndexError, TypeError):
+
+        # raise Exception
+        raise Exception("since should be seconds or a duration like '5m'")
+
+
+# helper function to split off the timestamp
+def split_timestamp(line):
+
+    """
+    Function to split the RFC3339 timestamp Kubernetes puts in front of a
+    log line with timestamps=true.
+    Returns
+    -------
+    tuple
+        Tuple with the timestamp, None if there is none, and the message
+    """
+
+    # the timestamp ends at the first space
+    timestamp, _, message = line.partition(' ')
+    if len(timestamp) >= 20 and timestamp[4:5] == '-' and timestamp[10:11] == 'T':
+        return timestamp, message
+
+    # no timestamp
+    return None, line
+
+
+# helper function to compare timestamps
+def timestamp_key(timestamp):
+
+    """
+    Function to turn a UTC timestamp with up to nanoseconds into something
+    comparable, RFC3339Nano drops trailing zeros of the fraction.
+    """
+
+    # pad the fraction
+    seconds, _, fraction = timestamp.rstrip('Z').partition('.')
+    return seconds, fraction.ljust(9, '0')
+
+
+# function to parse a line of kubectl
+def parse_prefixed(line):
+
+    """
+    Function to parse a line of 'kubectl logs --prefix --timestamps', e.g.
+    '[pod/api-5d9c7b6f4-x0/api] 2024-01-01T00:00:00.1Z message'.
+    Parameters
+    ----------
+    line : string
+        String with the line, without the line break
+    Returns
+    -------
+    LogLine
+        Record with pod, container, timestamp and message
+    """
+
+    # split off the prefix
+    pod, container = None, None
+    if line.startswith('[') and '] ' in line:
+        prefix, line = line[1:].split('] ', 1)
+        parts = prefix.split('/')
+        if len(parts) == 3:
+            pod, container = parts[1], parts[2]
+
+    # split off the timestamp
+    timestamp, message = split_timestamp(line)
+    return LogLine(pod, container, timestamp, message)
+
+
+# setup class
+class LogStreams:
+
+    # describe class
+    def __init__(self, client, namespace, selector, follow = True, since = None, buffer_size = 1000,
+                 refresh = 5):
+
+        """
+        Class to follow the logs of several pods through the API server and
+        merge them, as an iterator over LogLine records.
+        Every container of every matching pod gets a reader thread with its
+        own streaming connection. With follow, pods that appear later, e.g.
+        in a rollout, are picked up, and streams that broke off resume after
+        their last line. A failed look for pods is retried at the next one.
+        The resume asks for the logs since the second of the last line, as
+        sinceTime has no finer precision, and skips the lines up to the last
+        one by their timestamp and message, so new lines with the same
+        timestamp are kept.
+        Parameters
+        ----------
+        client : KubeClient
+            Client of the API server
+        namespace : string
+            String with the namespace of the pods
+        selector : string
+            String with the label selector of the pods
+        follow : boolean
+            Boolean indicating whether new lines are followed
+        since : int
+            Integer with the seconds of past logs, None for all
+        buffer_size : int
+            Integer with the maximum number of buffered lines
+        refresh : float
+            Float with the seconds between two looks for new pods
+        """
+
+        # define the slots
+        self.namespace = namespace
+        self.selector = selector
+        self.follow = follow
+        self.since = since
+        self.buffer_size = buffer_size
+        self.refresh = refresh
+
+        # define the readers
+        self.__client = client
+        self.__queue = queue.Queue(maxsize = buffer_size)
+        self.__stopped = threading.Event()
+        self.__lock = threading.Lock()
+        self.__readers = {}
+        self.__connections = {}
+        self.__last = {}
+        self.__finished = set()
+
+    # helper function to hand a line to the consumer
+    def __put(self, item):
+
+        """
+        Private method to put an item into the queue, waiting while it is
+        full unless the streams are stopped.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the item was queued, otherwise 'False'
+        """
+
+        # wait for space
+        while not self.__stopped.is_set():
+            try:
+                self.__queue.put(item, timeout = 0.5)
+                return True
+            except queue.Full:
+                pass
+
+        # stopped
+        return False
+
+    # helper function running in a reader thread
+    def __read(self, pod, container, finished = False):
+
+        """
+        Private method to stream the log of a container into the queue.
+        The log of a finished pod is read once.
+        """
+
+        # define the request, a resumed stream starts at its last line
+        key = (pod, container)
+        resume_at, replayed = self.__last.get(key, (None, ()))
+        replayed = collections.Counter(replayed)
+        params = {'container': container, 'timestamps': 'true', 'follow': 'true' if self.follow else None}
+        if resume_at is not None:
+            params['sinceTime'] = resume_at
+        elif self.since is not None:
+            params['sinceSeconds'] = self.since
+
+        # remember the connection, so stop() can shut it down
+        def remember(connection):
+            with self.__lock:
+                self.__connections[key] = connection
+
+        # try to stream
+        try:
+
+            # read line by line
+            path = resource_path('pods', self.namespace, pod, 'log')
+            for raw in self.__client.stream(path, params = params, on_connect = remember):
+
+                # split off the timestamp
+                timestamp, message = split_timestamp(raw.decode('utf-8', 'replace').rstrip('\r\n'))
+
+                # a resumed stream repeats the lines up to where it broke off
+                if resume_at is not None and timestamp is not None:
+                    if timestamp_key(timestamp) < timestamp_key(resume_at):
+                        continue
+                    if timestamp_key(timestamp) > timestamp_key(resume_at):
+                        resume_at = None
+                    elif replayed[message] > 0:
+                        replayed[message] = replayed[message] - 1
+                        continue
+
+                # remember the last timestamp and the messages it had
+                if timestamp is not None:
+                    last = self.__last.get(key)
+                    if last is not None and last[0] == timestamp:
+                        last[1].append(message)
+                    else:
+                        self.__last[key] = (timestamp, [message])
+
+                # hand it on
+                if not self.__put(LogLine(pod, container, timestamp, message)):
+                    break
+
+            # the log of a finished pod was read to its end
+            else:
+                if finished:
+                    self.__finished.add(key)
+
+        # broken streams are resumed by the next look for pods
+        except Exception:
+            pass
+
+        # forget the reader
+        finally:
+            with self.__lock:
+                self.__connections.pop(key, None)
+                self.__readers.pop(key, None)
+            self.__put(key)
+
+    # helper function to find the pods
+    def __discover(self):
+
+        """
+        Private method to start a reader for every container of the matching
+        pods that has none yet. Without follow, every container is read once.
+        Returns
+        -------
+        int
+            Integer with the number of started readers
+        """
+
+        # list the pods
+        pods = self.__client.list('pods', self.namespace, label_selector = self.selector).get('items') or []
+
+        # start the missing readers, pending pods have no logs yet
+        started = 0
+        for pod in pods:
+            phase = pod.get('status', {}).get('phase')
+            if phase == 'Pending' or pod['metadata'].get('deletionTimestamp'):
+                continue
+            for container in pod.get('spec', {}).get('containers') or []:
+                key = (pod['metadata']['name'], container['name'])
+                with self.__lock:
+                    if key in self.__readers or self.__stopped.is_set():
+                        continue
+
+                    # the log of a finished pod does not grow any more
+                    finished = phase in ('Succeeded', 'Failed')
+                    if finished and key in self.__finished:
+                        continue
+                    reader = threading.Thread(target = self.__read, args = key + (finished,), daemon = True)
+                    self.__readers[key] = reader
+                reader.start()
+                started = started + 1
+
+        # return the number of new readers
+        return started
+
+    # function to iterate over the lines
+    def __iter__(self):
+
+        # start the readers
+        running = self.__discover()
+        refresh_at = time.monotonic() + self.refresh
+
+        # hand out the lines until the logs end or the consumer stops
+        try:
+            while running or self.follow:
+
+                # look for new pods and broken streams now and then, a
+                # failed look is retried at the next refresh
+                if self.follow and time.monotonic() >= refresh_at:
+                    try:
+                        running = running + self.__discover()
+                    except Exception:
+                        pass
+                    refresh_at = time.monotonic() + self.refresh
+
+                # wait for the next line
+                try:
+                    item = self.__queue.get(timeout = max(refresh_at - time.monotonic(), 0) if self.follow else None)
+                except queue.Empty:
+                    continue
+
+                # a reader ended after its last line
+                if not isinstance(item, LogLine):
+                    running = running - 1
+                    continue
+
+                # hand out the line
+                yield item
+
+        # stop the readers with the consumer
+        finally:
+            self.stop()
+
+    # function to stop the readers
+    def stop(self):
+
+        """
+        Main method to stop all readers and close their connections.
+        """
+
+        # stop the readers
+        self.__stopped.set()
+
+        # shut the connections down, blocked reads return right away
+        with self.__lock:
+            connections = list(self.__connections.values())
+        for connection in connections:
+            try:
+                if connection.sock is not None:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,121 @@
+"""
+manifests.py contains the helper functions to render the Kubernetes objects
+of a kubipy deployment. deploy() applies them declaratively with server-side
+apply, so a redeploy rolls the pods over in place instead of deleting and
+recreating everything.
+"""
+
+# define the field manager kubipy applies with
+FIELD_MANAGER = 'kubipy'
+
+
+# function to render the labels of a deployment
+def labels(deployment_name):
+
+    """
+    Function to render the labels of all objects of a deployment.
+    Parameters
+    ----------
+    deployment_name : string
+        String with the name of the deployment
+    Returns
+    -------
+    dict
+        Dictionary with the labels
+    """
+
+    # return the labels
+    return {'app': deployment_name, 'app.kubernetes.io/managed-by': FIELD_MANAGER}
+
+
+# function to render a Deployment
+def render_deployment(deployment_name, image, port, replicas = 1, namespace = 'default'):
+
+    """
+    Function to render the Deployment of an API.
+    New pods have to be ready before old ones are taken down, so a redeploy
+    has no outage window.
+    Parameters
+    ----------
+    deployment_name : string
+        String with the name of the deployment
+    image : string
+        String with the image reference, e.g. 'kubipy-image:3f2a...'
+    port : string
+        String with the port the API listens on
+    replicas : int
+        Integer with the number of pods
+    namespace : string
+        String with the namespace
+    Returns
+    -------
+    dict
+        Dictionary with the Deployment
+    """
+
+    # the pods also carry the 'run' label, which services exposed by earlier
+    # kubipy versions select on
+    pod_labels = dict(labels(deployment_name), run = deployment_name)
+
+    # return the Deployment
+    return {'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'metadata': {'name': deployment_name, 'namespace': namespace, 'labels': labels(deployment_name)},
+            'spec': {'replicas': replicas,
+                     'selector': {'matchLabels': {'app': deployment_name}},
+                     'strategy': {'type': 'RollingUpdate',
+                                  'rollingUpdate': {'maxSurge': 1, 'maxUnavailable': 0}},
+                     'template': {'metadata': {'labels': pod_labels},
+                                  'spec': {'containers': [{'name': deployment_name,
+                                                           'image': image,
+                                                           'imagePullPolicy': 'Never',
+                                                           'ports': [{'containerPort': int(port)}],
+                                                           'readinessProbe': {'tcpSocket': {'port': int(port)},
+                                                                              'periodSeconds': 2}}]}}}}
+
+
+# function to render a Service
+def render_service(deployment_name, port, namespace = 'default'):
+
+    """
+    Function to render the NodePort Service of an API.
+    Parameters
+    ----------
+    deployment_name : string
+        String with the name of the deployment
+    port : string
+        String with the port the API listens on
+    namespace : string
+        String with the namespace
+    Returns
+    -------
+    dict
+        Dictionary with the Service
+    """
+
+    # return the Service
+    return {'apiVersion': 'v1',
+            'kind': 'Service',
+            'metadata': {'name': deployment_name, 'namespace': namespace, 'labels': labels(deployment_name)},
+            'spec': {'type': 'NodePort',
+                     'selector': {'app': deployment_name},
+                     'ports': [{'port': int(port), 'targetPort': int(port), 'protocol': 'TCP'}]}}
+
+
+# function to bundle objects
+def render_list(objects):
+
+    """
+    Function to bundle objects in a List, so they are applied in one call.
+    Parameters
+    ----------
+    objects : list
+        List with the objects
+    Returns
+    -------
+    dict
+        Dictionary with the List
+    """
+
+    # return the List
+    return {'apiVersion': 'v1', 'kind': 'List', 'items': list(objects)}
@@ -0,0 +1,498 @@
+"""
+metrics.py contains the classes RingSeries() and MetricsSampler(), which
+sample the CPU and memory usage of pods and nodes from the metrics API
+(metrics.k8s.io, served by the metrics-server addon) and keep them as time
+series of a fixed size.
+Every series is backed by three array('d') ring buffers, for the timestamps,
+the CPU cores and the memory bytes. Series of pods that are gone, e.g. after a
+rollout, are dropped once their newest sample is older than the window of
+capacity samples, and the number of series is capped, so a sampler running
+for days stays within max_series times capacity samples.
+Slots:
+--------
+interval : float
+    Stores how many seconds pass between two samples
+capacity : int
+    Stores how many samples are kept per pod and node
+max_series : int
+    Stores how many pods and nodes are kept at most
+namespace : str
+    Stores the namespace of the sampled pods
+samples : int
+    Stores how many samples were taken
+errors : int
+    Stores how many samples failed, e.g. before metrics-server was ready
+last_error : str
+    Stores the message of the last failed sample
+"""
+
+# import libs
+import collections
+import threading
+import datetime
+import array
+import json
+import time
+import csv
+import io
+
+# import modules
+from kubipy.runner import percentile
+
+# define the API of the metrics-server
+METRICS_API = '/apis/metrics.k8s.io/v1beta1'
+
+# define the factors of the quantity suffixes
+QUANTITY_SUFFIXES = {'n': 1e-9, 'u': 1e-6, 'm': 1e-3, 'k': 1e3, 'K': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12,
+                     'Ki': 2 ** 10, 'Mi': 2 ** 20, 'Gi': 2 ** 30, 'Ti': 2 ** 40}
+
+# define the columns of the exports
+COLUMNS = ('kind', 'name', 'timestamp', 'cpu', 'memory')
+
+
+# function to parse a quantity
+def parse_quantity(quantity):
+
+    """
+    Function to parse a Kubernetes quantity, e.g. '250m' or '128Mi'.
+    Parameters
+    ----------
+    quantity : string
+        String with the quantity
+    Returns
+    -------
+    float
+        Float with the value, in cores for CPU and bytes for memory
+    """
+
+    # try the two letter suffixes first
+    for length in (2, 1):
+        if quantity[-length:] in QUANTITY_SUFFIXES and len(quantity) > length:
+            return float(quantity[:-length]) * QUANTITY_SUFFIXES[quantity[-length:]]
+
+    # plain numbers, also with an exponent
+    return float(quantity)
+
+
+# helper function to parse a timestamp
+def parse_timestamp(timestamp):
+
+    """
+    Function to turn the RFC3339 timestamp of a sample into seconds since the
+    epoch.
+    """
+
+    # drop the fraction, metrics are at most per second
+    return datetime.datetime.strptime(timestamp[:19], '%Y-%m-%dT%H:%M:%S').replace(
+        tzinfo = datetime.timezone.utc).timestamp()
+
+
+# setup class
+class RingSeries:
+
+    # keep instances small, there is one per pod and node
+    __slots__ = ('capacity', 'times', 'cpu', 'memory', 'count', 'head')
+
+    # describe class
+    def __init__(self, capacity):
+
+        """
+        Class to hold a fixed number of samples, the oldest are overwritten.
+        Parameters
+        ----------
+        capacity : int
+            Integer with the number of samples kept
+        """
+
+        # define the slots, the arrays are allocated once
+        self.capacity = capacity
+        self.times = array.array('d', bytes(8 * capacity))
+        self.cpu = array.array('d', bytes(8 * capacity))
+        self.memory = array.array('d', bytes(8 * capacity))
+        self.count = 0
+        self.head = 0
+
+    # function to add a sample
+    def append(self, timestamp, cpu, memory):
+
+        """
+        Main method to add a sample, overwriting the oldest one if full.
+        """
+
+        # write at the head and move it on
+        self.times[self.head] = timestamp
+        self.cpu[self.head] = cpu
+        self.memory[self.head] = memory
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    # function to get the number of samples
+    def __len__(self):
+
+        # return the count
+        return self.count
+
+    # function to get the last timestamp
+    @property
+    def last(self):
+
+        # nothing sampled yet
+        if not self.count:
+            return None
+
+        # the sample before the head
+        return self.times[(self.head - 1) % self.capacity]
+
+    # function to read the samples
+    def window(self, since = None, until = None):
+
+        """
+        Main method to get the samples in a time range, oldest first.
+        Parameters
+        ----------
+        since : float
+            Float with the first timestamp in seconds since the epoch
+        until : float
+            Float with the last timestamp in seconds since the epoch
+        Returns
+        -------
+        tuple
+            Tuple with the lists of timestamps, cpu and memory
+        """
+
+        # walk from the oldest sample
+        start = (self.head - self.count) % self.capacity
+        times, cpu, memory = [], [], []
+        for offset in range(self.count):
+            index = (start + offset) % self.capacity
+            if (since is None or self.times[index] >= since) and (until is None or self.times[index] <= until):
+                times.append(self.times[index])
+                cpu.append(self.cpu[index])
+                memory.append(self.memory[index])
+
+        # return the columns
+        return times, cpu, memory
+
+
+# setup class
+class MetricsSampler:
+
+    # describe class
+    def __init__(self, fetch, interval = 15, capacity = 5760, namespace = 'default', nodes = True,
+                 max_series = 200):
+
+        """
+        Class to sample the usage of pods and nodes in the background.
+        Parameters
+        ----------
+        fetch : function
+            Function returning the decoded response of a GET on an API path
+        interval : float
+            Float with the number of seconds between two samples
+        capacity : int
+            Integer with the number of samples kept per pod and node, one day
+            at 15 seconds by default
+        namespace : string
+            String with the namespace of the pods
+        nodes : boolean
+            Boolean indicating whether the nodes are sampled as well
+        max_series : int
+            Integer with the maximum number of pods and nodes kept, those
+            sampled longest ago are dropped first
+        """
+
+        # define the slots
+        self.interval = interval
+        self.capacity = capacity
+        self.max_series = max_series
+        self.namespace = namespace
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+
+        # define the sources
+        self.__fetch = fetch
+        self.__paths = [('pod', METRICS_API + '/namespaces/' + namespace + '/pods')]
+        if nodes:
+            self.__paths.append(('node', METRICS_API + '/nodes'))
+
+        # define the series and the thread
+        self.__series = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    # function to take one sample
+    def sample(self):
+
+        """
+        Main method to sample all pods and nodes once.
+        metrics-server refreshes its numbers only every few seconds, so a
+        number that did not change its timestamp is not stored twice.
+        Returns
+        -------
+        int
+            Integer with the number of stored samples
+        """
+
+        # read every source
+        stored = 0
+        for kind, path in self.__paths:
+            for item in self.__fetch(path).get('items') or []:
+
+                # add up the containers of a pod
+                usages = [item.get('usage') or {}] if kind == 'node' else \
+                         [container.get('usage') or {} for container in item.get('containers') or []]
+                cpu = sum(parse_quantity(usage.get('cpu', '0')) for usage in usages)
+                memory = sum(parse_quantity(usage.get('memory', '0')) for usage in usages)
+
+                # take the time of the measurement
+                timestamp = parse_timestamp(item['timestamp']) if item.get('timestamp') else time.time()
+
+                # store it once
+                key = (kind, item['metadata']['name'])
+                with self.__lock:
+                    if key not in self.__series:
+                        self.__series[key] = RingSeries(self.capacity)
+                    series = self.__series[key]
+                    if series.last is None or timestamp > series.last:
+                        series.append(timestamp, cpu, memory)
+                        stored = stored + 1
+
+                    # keep the series in the order of their last sample
+                    self.__series.move_to_end(key)
+
+        # drop the series of objects that are gone
+        self.__evict(time.time() - self.capacity * self.interval)
+
+        # count the sample
+        self.samples = self.samples + 1
+
+        # return the number of stored samples
+        return stored
+
+    # helper function to drop old series
+    def __evict(self, cutoff):
+
+        """
+        Private method to drop the series whose newest sample is older than
+        the cutoff, and those sampled longest ago beyond max_series.
+        """
+
+        # the series are ordered by their last sample, the oldest first
+        with self.__lock:
+            while self.__series:
+                key, series = next(iter(self.__series.items()))
+                if len(self.__series) <= self.max_series and (series.last is None or series.last >= cutoff):
+                    break
+                del self.__series[key]
+
+    # helper function running in the thread
+    def __run(self):
+
+        """
+        Private method sampling until stop() is called. Failed samples are
+        counted and tried again at the next interval.
+        """
+
+        # sample at a steady pace
+        next_at = time.monotonic()
+        while not self.__stopped.is_set():
+
+            # try to sample
+            try:
+                self.sample()
+
+            # keep going, e.g. while metrics-server is starting
+            except Exception as error:
+                self.errors = self.errors + 1
+                self.last_error = str(error)
+
+            # wait for the next interval
+            next_at = max(next_at + self.interval, time.monotonic())
+            self.__stopped.wait(next_at - time.monotonic())
+
+    # function to start sampling
+    def start(self):
+
+        """
+        Main method to start sampling in a background thread.
+        """
+
+        # start the thread once
+        if self.__thread is None or not self.__thread.is_alive():
+            self.__stopped.clear()
+            self.__thread = threading.Thread(target = self.__run, name = 'kubipy-metrics', daemon = True)
+            self.__thread.start()
+
+    # function to stop sampling
+    def stop(self, timeout = 5):
+
+        """
+        Main method to stop sampling, the samples are kept.
+        """
+
+        # stop the thread
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    # function to list the series
+    def keys(self):
+
+        """
+        Main method to list the sampled objects.
+        Returns
+        -------
+        list
+            List with tuples of kind and name, e.g. ('pod', 'api-5d9c7b6f4-x0')
+        """
+
+        # copy the keys
+        with self.__lock:
+            return list(self.__series)
+
+    # helper function to select series
+    def __select(self, kind, name):
+
+        """
+        Private method to select the series of a kind and a name, a name
+        ending in '*' matches as prefix, e.g. 'my-deployment-*'.
+        """
+
+        # filter the keys
+        with self.__lock:
+            return [(key, series) for key, series in self.__series.items()
+                    if (kind is None or key[0] == kind)
+                    and (name is None or key[1] == name or (name.endswith('*') and key[1].startswith(name[:-1])))]
+
+    # function to query the samples
+    def query(self, kind = None, name = None, since = None, until = None):
+
+        """
+        Main method to get samples as rows.
+        Parameters
+        ----------
+        kind : string
+            String with 'pod' or 'node', None for both
+        name : string
+            String with the name, a trailing '*' matches as prefix, e.g. the
+            pods of a deployment with 'my-deployment-*'
+        since : float
+            Float with the first timestamp in seconds since the epoch
+        until : float
+            Float with the last timestamp in seconds since the epoch
+        Returns
+        -------
+        list
+            List with one dictionary per sample, holding kind, name,
+            timestamp, cpu (cores) and memory (bytes), sorted by time
+        """
+
+        # collect the rows of every series
+        rows = []
+        for (series_kind, series_name), series in self.__select(kind, name):
+            times, cpu, memory = series.window(since, until)
+            rows.extend({'kind': series_kind, 'name': series_name, 'timestamp': times[index],
+                         'cpu': cpu[index], 'memory': memory[index]} for index in range(len(times)))
+
+        # return them in time order
+        rows.sort(key = lambda row: row['timestamp'])
+        return rows
+
+    # function to summarize the samples
+    def summary(self, kind = None, name = None, since = None, until = None, percentiles = (50, 90, 95, 99)):
+
+        """
+        Main method to summarize the usage per object.
+        Parameters
+        ----------
+        kind : string
+            String with 'pod' or 'node', None for both
+        name : string
+            String with the name, a trailing '*' matches as prefix
+        since : float
+            Float with the first timestamp in seconds since the epoch
+        until : float
+            Float with the last timestamp in seconds since the epoch
+        percentiles : tuple
+            Tuple with the percentiles to compute
+        Returns
+        -------
+        dict
+            Dictionary with one entry per object, holding the number of
+            samples and for cpu and memory the mean, the max and the
+            percentiles, e.g. {'p95': 0.25}
+        """
+
+        # summarize every series
+        summary = {}
+        for key, series in self.__select(kind, name):
+            times, cpu, memory = series.window(since, until)
+            if not times:
+                continue
+            entry = {'samples': len(times)}
+            for metric, values in (('cpu', sorted(cpu)), ('memory', sorted(memory))):
+                entry[metric] = {'mean': sum(values) / len(values), 'max': values[-1]}
+                for value in percentiles:
+                    entry[metric]['p' + str(value)] = percentile(values, value / 100)
+            summary[key[0] + '/' + key[1]] = entry
+
+        # return the summary
+        return summary
+
+    # function to export as CSV
+    def to_csv(self, path = None, **query):
+
+        """
+        Main method to export samples as CSV with the columns kind, name,
+        timestamp, cpu and memory.
+        Parameters
+        ----------
+        path : string
+            String with the path of the file, None to return the text
+        query : dict
+            Further arguments of query(), e.g. kind or since
+        Returns
+        -------
+        string
+            String with the CSV, if no path is given
+        """
+
+        # write the rows
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames = COLUMNS)
+        writer.writeheader()
+        writer.writerows(self.query(**query))
+
+        # return the text or write the file
+        if path is None:
+            return buffer.getvalue()
+        with open(path, 'w', newline = '') as file:
+            file.write(buffer.getvalue())
+
+    # function to export as JSON
+    def to_json(self, path = None, **query):
+
+        """
+        Main method to export samples as JSON, a list of rows like query().
+        Parameters
+        ----------
+        path : string
+            String with the path of the file, None to return the text
+        query : dict
+            Further arguments of query(), e.g. kind or since
+        Returns
+        -------
+        string
+            String with the JSON, if no path is given
+        """
+
+        # encode the rows
+        content = json.dumps(self.query(**query), indent = 2)
+
+        # return the text or write the file
+        if path is None:
+            return content
+        with open(path, 'w') as file:
+            file.write(content)
@@ -0,0 +1,335 @@
+"""
+pool.py contains the class ClusterPool(), which runs several Minikube profiles
+side by side and leases them to workers, e.g. to shard an integration test
+suite over clusters instead of queueing on one.
+A returned cluster is reset, i.e. everything deploy() created is deleted, and
+can be leased again right away. A cluster whose reset fails is restarted, and
+if that fails as well it is lost until the next start() of the pool, just like
+a cluster that did not start. The clusters themselves are only stopped or
+deleted when the pool is.
+Slots:
+--------
+size : int
+    Stores the number of clusters
+profiles : list
+    Stores the names of the profiles, e.g. ['kubipy-0', 'kubipy-1']
+clusters : dict
+    Stores the minipy() object per profile
+cpus : str
+    Stores the number of cores per cluster
+memory : str
+    Stores the amount of memory per cluster
+start_reports : dict
+    Stores the report of start() per profile
+"""
+
+# import libs
+import concurrent.futures
+import contextlib
+import collections
+import threading
+import time
+
+# import modules
+from kubipy.utils import minipy
+
+
+# setup class
+class ClusterPool:
+
+    # describe class
+    def __init__(self, size = 2, prefix = 'kubipy', cpus = '2', memory = '2G', **kwargs):
+
+        """
+        Class to lease Minikube clusters to parallel workers.
+        Parameters
+        ----------
+        size : int
+            Integer with the number of clusters
+        prefix : string
+            String the profiles are named with, e.g. 'kubipy' for 'kubipy-0'
+        cpus : str
+            String to indicate the number of cores per cluster
+        memory : str
+            String to indicate the amount of memory per cluster
+        kwargs : dict
+            Further arguments of minipy(), e.g. backend or timeouts
+        """
+
+        # check the size
+        if size < 1:
+
+            # raise Exception
+            raise Exception('size should be at least 1')
+
+        # define the slots
+        self.size = size
+        self.profiles = [prefix + '-' + str(index) for index in range(size)]
+        self.clusters = {profile: minipy(greeting = False, lazy = True, profile = profile, **kwargs)
+                         for profile in self.profiles}
+        self.cpus = cpus
+        self.memory = memory
+        self.start_reports = {}
+
+        # define the idle, the leased and the lost clusters, lease() waits for changes
+        self.__idle = collections.deque()
+        self.__leased = set()
+        self.__lost = set()
+        self.__lock = threading.Lock()
+        self.__changed = threading.Condition(self.__lock)
+
+    # helper function to run a method on every cluster
+    def __each(self, method, profiles = None):
+
+        """
+        Private method to call a method of several clusters in parallel.
+        Returns
+        -------
+        tuple
+            Tuple with the results and the errors, both per profile
+        """
+
+        # call the method per cluster
+        profiles = self.profiles if profiles is None else profiles
+        results, errors = {}, {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers = max(len(profiles), 1)) as executor:
+            futures = {executor.submit(method, self.clusters[profile]): profile for profile in profiles}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as error:
+                    errors[futures[future]] = error
+
+        # return what happened
+        return results, errors
+
+    # function to start the clusters
+    def start(self):
+
+        """
+        Main method to start all clusters in parallel and make them
+        available for leasing. Clusters that already run are only checked.
+        Returns
+        -------
+        dict
+            Dictionary with the report of start() per profile
+        """
+
+        # clusters that are leased or idle already stay as they are
+        with self.__lock:
+            known = self.__leased | set(self.__idle)
+        profiles = [profile for profile in self.profiles if self.clusters[profile] not in known]
+
+        # start them
+        reports, errors = self.__each(lambda cluster: cluster.start(cpus = self.cpus, memory = self.memory),
+                                      profiles)
+        self.start_reports.update(reports)
+
+        # offer the running clusters, lost ones are back, failed ones are lost
+        with self.__changed:
+            for profile in profiles:
+                if profile in reports:
+                    self.__lost.discard(self.clusters[profile])
+                    self.__idle.append(self.clusters[profile])
+                else:
+                    self.__lost.add(self.clusters[profile])
+            self.__changed.notify_all()
+
+        # check if all of them run
+        if errors:
+
+            # raise Exception
+            raise Exception('Starting the profiles failed: '
+                            + ', '.join(profile + ' (' + str(error) + ')' for profile, error in sorted(errors.items())))
+
+        # return the reports
+        return reports
+
+    # function to lease a cluster
+    def lease(self, timeout = None):
+
+        """
+        Main method to take a cluster for exclusive use.
+        Waiting ends with an Exception once no cluster is idle or leased, e.g.
+        before start() or when the others are lost, i.e. did not start or
+        could neither be reset nor restarted by release().
+        Parameters
+        ----------
+        timeout : float
+            Float with the number of seconds to wait for a free cluster, by
+            default forever
+        Returns
+        -------
+        minipy
+            Cluster object of the leased profile
+        """
+
+        # wait for a free cluster
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__changed:
+            while not self.__idle:
+
+                # check if any cluster can come back
+                if not self.__leased:
+
+                    # raise Exception
+                    raise Exception('I could not lease a cluster, none of them runs, start() the pool again')
+
+                # wait for a change
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+
+                    # raise Exception
+                    raise Exception('No cluster was free after ' + str(timeout) + ' seconds')
+                self.__changed.wait(remaining)
+
+            # remember the lease
+            cluster = self.__idle.popleft()
+            self.__leased.add(cluster)
+
+        # return the cluster
+        return cluster
+
+    # function to return a cluster
+    def release(self, cluster, reset = True):
+
+        """
+        Main method to return a leased cluster to the pool.
+        If the reset fails, the cluster is restarted with start(force =
+        True) and offered again. If that fails too, the cluster is lost and
+        the error is raised; the pool is one cluster smaller until its next
+        start().
+        Parameters
+        ----------
+        cluster : minipy
+            Cluster object returned by lease()
+        reset : boolean
+            Boolean indicating whether everything deploy() created on the
+            cluster is deleted first
+        """
+
+        # check the lease
+        with self.__lock:
+            if cluster not in self.__leased:
+
+                # raise Exception
+                raise Exception('This cluster is not leased from the pool')
+
+        # clean up for the next worker
+        try:
+            if reset:
+                cluster.reset()
+
+        # a broken cluster is restarted, or lost
+        except Exception:
+            try:
+                self.start_reports[cluster.profile] = cluster.start(cpus = self.cpus, memory = self.memory,
+                                                                    force = True)
+            except Exception:
+                with self.__changed:
+                    self.__leased.discard(cluster)
+                    self.__lost.add(cluster)
+                    self.__changed.notify_all()
+                raise
+
+        # forget the lease and offer it again
+        with self.__changed:
+            self.__leased.discard(cluster)
+            self.__idle.append(cluster)
+            self.__changed.notify_all()
+
+    # function to lease a cluster for a block
+    @contextlib.contextmanager
+    def leased(self, timeout = None, reset = True):
+
+        """
+        Main method to lease a cluster for a with block, it is returned when
+        the block ends.
+        Parameters
+        ----------
+        timeout : float
+            Float with the number of seconds to wait for a free cluster
+        reset : boolean
+            Boolean indicating whether the cluster is reset when returned
+        Returns
+        -------
+        generator
+            Context manager yielding the cluster object
+        """
+
+        # lease the cluster
+        cluster = self.lease(timeout)
+
+        # hand it out and take it back
+        try:
+            yield cluster
+        finally:
+            self.release(cluster, reset)
+
+    # helper function to empty the pool
+    def __drain(self):
+
+        """
+        Private method to take all clusters out of the pool, leases end
+        with it.
+        """
+
+        # forget the clusters, waiting leases end
+        with self.__changed:
+            self.__idle.clear()
+            self.__leased.clear()
+            self.__lost.clear()
+            self.__changed.notify_all()
+
+    # function to stop the clusters
+    def stop(self):
+
+        """
+        Main method to stop all clusters in parallel, their profiles are kept
+        for a fast start() next time.
+        """
+
+        # nothing can be leased any more
+        self.__drain()
+
+        # stop them
+        _, errors = self.__each(lambda cluster: cluster.stop())
+
+        # check if it worked
+        if errors:
+
+            # raise Exception
+            raise Exception('Stopping the profiles failed: ' + ', '.join(sorted(errors)))
+
+    # function to delete the clusters
+    def delete(self):
+
+        """
+        Main method to delete all clusters in parallel, the components stay
+        installed.
+        """
+
+        # nothing can be leased any more
+        self.__drain()
+
+        # delete them
+        _, errors = self.__each(lambda cluster: cluster.delete_cluster())
+
+        # check if it worked
+        if errors:
+
+            # raise Exception
+            raise Exception('Deleting the profiles failed: ' + ', '.join(sorted(errors)))
+
+    # function to enter the pool
+    def __enter__(self):
+
+        # start the clusters
+        self.start()
+        return self
+
+    # function to leave the pool
+    def __exit__(self, *exc_info):
+
+        # stop the clusters
+        self.stop()
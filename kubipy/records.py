@@ -0,0 +1,317 @@
+"""
+records.py contains the class RecordTable(), which holds pods, services or
+deployments as compact, column-oriented records.
+Only the requested fields are extracted from the raw Kubernetes objects, the
+raw objects themselves are dropped right away. Rows are handed out as
+namedtuples, which are slotted and therefore small.
+Slots:
+--------
+kind : str
+    Stores the kind of the records, e.g. 'pods'
+fields : tuple
+    Stores the names of the extracted fields
+columns : dict
+    Stores one list of values per field
+"""
+
+# import libs
+import collections
+import datetime
+import functools
+
+
+# helper function to format the age of an object
+def _age(item):
+
+    """
+    Function to format the age of an object like kubectl does, e.g. '5m'.
+    """
+
+    # read the creation timestamp
+    created = item.get('metadata', {}).get('creationTimestamp')
+
+    # nothing to format
+    if not created:
+        return ''
+
+    # compute the age in seconds
+    created = datetime.datetime.strptime(created, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo = datetime.timezone.utc)
+    seconds = int((datetime.datetime.now(datetime.timezone.utc) - created).total_seconds())
+
+    # format it with the largest unit
+    if seconds < 120:
+        return str(seconds) + 's'
+    if seconds < 7200:
+        return str(seconds // 60) + 'm'
+    if seconds < 172800:
+        return str(seconds // 3600) + 'h'
+    return str(seconds // 86400) + 'd'
+
+
+# helper function to get the status of a pod
+def _pod_status(item):
+
+    """
+    Function to get the status of a pod like kubectl shows it.
+    """
+
+    # terminating pods have a deletion timestamp
+    if item.get('metadata', {}).get('deletionTimestamp'):
+        return 'Terminating'
+
+    # a waiting or terminated container explains more than the phase
+    for container in item.get('status', {}).get('containerStatuses', []):
+        state = container.get('state', {})
+        for key in ('waiting', 'terminated'):
+            if state.get(key, {}).get('reason'):
+                return state[key]['reason']
+
+    # fall back to the phase
+    return item.get('status', {}).get('phase', '')
+
+
+# helper function to get the ready containers of a pod
+def _pod_ready(item):
+
+    """
+    Function to count the ready containers of a pod, e.g. '1/1'.
+    """
+
+    # read the container statuses
+    containers = item.get('status', {}).get('containerStatuses', [])
+    ready = sum(1 for container in containers if container.get('ready'))
+
+    # return ready over all
+    return str(ready) + '/' + str(len(item.get('spec', {}).get('containers', [])))
+
+
+# helper function to get the ports of a service
+def _service_ports(item):
+
+    """
+    Function to format the ports of a service, e.g. '8000:31234/TCP'.
+    """
+
+    # format every port
+    ports = []
+    for port in item.get('spec', {}).get('ports', []):
+        text = str(port.get('port'))
+        if port.get('nodePort'):
+            text = text + ':' + str(port['nodePort'])
+        ports.append(text + '/' + port.get('protocol', 'TCP'))
+
+    # join them
+    return ','.join(ports)
+
+
+# define the fields that can be extracted per kind
+FIELDS = {
+    'pods': {
+        'name': lambda item: item['metadata']['name'],
+        'namespace': lambda item: item['metadata'].get('namespace', ''),
+        'ready': _pod_ready,
+        'status': _pod_status,
+        'restarts': lambda item: sum(container.get('restartCount', 0)
+                                     for container in item.get('status', {}).get('containerStatuses', [])),
+        'age': _age,
+        'ip': lambda item: item.get('status', {}).get('podIP', ''),
+        'node': lambda item: item.get('spec', {}).get('nodeName', ''),
+        'labels': lambda item: dict(item['metadata'].get('labels', {})),
+        'created': lambda item: item['metadata'].get('creationTimestamp', ''),
+    },
+    'services': {
+        'name': lambda item: item['metadata']['name'],
+        'namespace': lambda item: item['metadata'].get('namespace', ''),
+        'type': lambda item: item.get('spec', {}).get('type', ''),
+        'cluster_ip': lambda item: item.get('spec', {}).get('clusterIP', ''),
+        'external_ip': lambda item: ','.join(item.get('spec', {}).get('externalIPs', [])) or '<none>',
+        'ports': _service_ports,
+        'age': _age,
+        'selector': lambda item: dict(item.get('spec', {}).get('selector', {})),
+        'created': lambda item: item['metadata'].get('creationTimestamp', ''),
+    },
+    'deployments': {
+        'name': lambda item: item['metadata']['name'],
+        'namespace': lambda item: item['metadata'].get('namespace', ''),
+        'ready': lambda item: (str(item.get('status', {}).get('readyReplicas', 0)) + '/'
+                               + str(item.get('spec', {}).get('replicas', 0))),
+        'up_to_date': lambda item: item.get('status', {}).get('updatedReplicas', 0),
+        'available': lambda item: item.get('status', {}).get('availableReplicas', 0),
+        'age': _age,
+        'replicas': lambda item: item.get('spec', {}).get('replicas', 0),
+        'image': lambda item: ','.join(container.get('image', '') for container in
+                                       item.get('spec', {}).get('template', {}).get('spec', {}).get('containers', [])),
+        'created': lambda item: item['metadata'].get('creationTimestamp', ''),
+    },
+}
+
+# define the fields kubectl prints by default
+DEFAULT_FIELDS = {'pods': ('name', 'ready', 'status', 'restarts', 'age'),
+                  'services': ('name', 'type', 'cluster_ip', 'external_ip', 'ports', 'age'),
+                  'deployments': ('name', 'ready', 'up_to_date', 'available', 'age')}
+
+
+# helper function to create the row type of a projection
+@functools.lru_cache(maxsize = None)
+def _row_type(kind, fields):
+
+    """
+    Function to create (once) the namedtuple type of a projection.
+    """
+
+    # create the type
+    return collections.namedtuple(kind[:-1].capitalize(), fields)
+
+
+# setup class
+class RecordTable:
+
+    # keep instances small
+    __slots__ = ('kind', 'fields', 'columns')
+
+    # describe class
+    def __init__(self, kind, fields = None):
+
+        """
+        Class to hold Kubernetes objects as column-oriented records.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, 'pods', 'services' or 'deployments'
+        fields : tuple
+            Tuple with the fields to extract, by default the kubectl columns
+        """
+
+        # check the kind
+        if kind not in FIELDS:
+
+            # raise Exception
+            raise Exception('kind should be one of ' + ', '.join(FIELDS))
+
+        # default to the kubectl columns
+        fields = tuple(fields) if fields is not None else DEFAULT_FIELDS[kind]
+
+        # check the fields
+        unknown = [field for field in fields if field not in FIELDS[kind]]
+        if unknown:
+
+            # raise Exception
+            raise Exception('unknown fields for ' + kind + ': ' + ', '.join(unknown)
+                            + ' (available: ' + ', '.join(FIELDS[kind]) + ')')
+
+        # define the slots
+        self.kind = kind
+        self.fields = fields
+        self.columns = {field: [] for field in fields}
+
+    # function to add raw objects
+    def extend(self, items):
+
+        """
+        Main method to add raw Kubernetes objects.
+        Only the fields of the projection are extracted, the raw objects can
+        be dropped afterwards.
+        Parameters
+        ----------
+        items : list
+            List with the raw objects, e.g. the 'items' of a list response, or
+            any other iterable of them
+        """
+
+        # read generators once, every column walks the objects
+        items = list(items)
+
+        # extract column by column
+        for field in self.fields:
+
+            # look up the extractor once
+            extract = FIELDS[self.kind][field]
+
+            # extract the values
+            self.columns[field].extend(extract(item) for item in items)
+
+        # return self to allow chaining
+        return self
+
+    # function to get a single column
+    def column(self, field):
+
+        """
+        Main method to get all values of a field.
+        Parameters
+        ----------
+        field : string
+            String with the name of the field
+        Returns
+        -------
+        list
+            List with the values
+        """
+
+        # return the column
+        return self.columns[field]
+
+    # function to convert to dictionaries
+    def to_dicts(self):
+
+        """
+        Main method to convert the records to a list of dictionaries.
+        Returns
+        -------
+        list
+            List with one dictionary per record
+        """
+
+        # convert row by row
+        return [row._asdict() for row in self]
+
+    # function to render a kubectl-like table
+    def table(self):
+
+        """
+        Main method to render the records as a table like kubectl prints it.
+        Returns
+        -------
+        string
+            String with the table
+        """
+
+        # build the header and the text columns
+        header = [field.upper().replace('_', '-') for field in self.fields]
+        texts = [[str(value) for value in self.columns[field]] for field in self.fields]
+
+        # compute the widths
+        widths = [max([len(header[i])] + [len(text) for text in texts[i]]) + 3 for i in range(len(header))]
+
+        # render line by line
+        lines = [''.join(header[i].ljust(widths[i]) for i in range(len(header))).rstrip()]
+        for values in zip(*texts):
+            lines.append(''.join(values[i].ljust(widths[i]) for i in range(len(values))).rstrip())
+
+        # return the table
+        return '\n'.join(lines)
+
+    # function to get the number of records
+    def __len__(self):
+
+        # return the length of any column
+        return len(self.columns[self.fields[0]]) if self.fields else 0
+
+    # function to iterate over the records
+    def __iter__(self):
+
+        # create rows on the fly
+        row_type = _row_type(self.kind, self.fields)
+        return (row_type._make(values) for values in zip(*(self.columns[field] for field in self.fields)))
+
+    # function to get a single record
+    def __getitem__(self, index):
+
+        # create the row
+        return _row_type(self.kind, self.fields)._make(self.columns[field][index] for field in self.fields)
+
+    # function to describe the records
+    def __repr__(self):
+
+        # return the description
+        return '<RecordTable ' + self.kind + ': ' + str(len(self)) + ' records, fields ' + str(self.fields) + '>'
@@ -0,0 +1,1038 @@
+"""
+runner.py contains the class CommandRunner(), the single layer through which
+kubipy runs kubectl, minikube, docker and brew.
+Every command is timed and recorded with its exit code and the size of its
+output, so it is visible which calls dominate a pipeline.
+Commands run in a process group of their own. A timeout or cancel() kills
+the whole group, so a wedged shell chain does not leave its children behind.
+Commands known to fail transiently can be retried with jittered exponential
+backoff.
+Slots:
+--------
+hooks : list
+    Stores the functions called with every CommandResult
+history_size : int
+    Stores how many durations are kept per command for the percentiles
+kill_grace : float
+    Stores how many seconds a process group gets between SIGTERM and SIGKILL
+"""
+
+# import libs
+import subprocess
+import collections
+import threading
+import asyncio
+import random
+import signal
+import shlex
+import math
+import time
+import os
+
+# define the default timeouts in seconds per operation, None waits forever
+DEFAULT_TIMEOUTS = {'probe': 5,
+                    'fetch': 1800,
+                    'install': 1800,
+                    'start': 900,
+                    'status': 30,
+                    'ready': 10,
+                    'stop': 300,
+                    'pause': 120,
+                    'delete': 600,
+                    'dashboard': None,
+                    'docker-env': 60,
+                    'inspect': 60,
+                    'build': 1800,
+                    'apply': 120,
+                    'url': 30,
+                    'get': 60,
+                    'remove': 120,
+                    'metrics': 15,
+                    'config': 30,
+                    'addons': 300}
+
+# define the default retries per operation, for those known to be transient
+DEFAULT_RETRIES = {'fetch': 2,
+                   'docker-env': 2,
+                   'inspect': 2,
+                   'apply': 3,
+                   'url': 3,
+                   'get': 3}
+
+# define the error output of failures worth another try, e.g. while the API
+# server restarts; anything else, like a rejected manifest, fails right away
+TRANSIENT_ERRORS = (b'connection refused', b'connection reset', b'i/o timeout', b'tls handshake timeout',
+                    b'unable to connect to the server', b'the server is currently unable', b'too many requests',
+                    b'etcdserver: request timed out', b'unexpected eof')
+
+
+# helper function to detect transient failures
+def transient_failure(result):
+
+    """
+    Function to check if a failed command is worth another try, as retry_on
+    of CommandRunner.run(). It needs the error output to be captured.
+    Parameters
+    ----------
+    result : CommandResult
+        Result of the failed attempt
+    Returns
+    -------
+    boolean
+        Returns 'True' if the error output names a transient failure
+    """
+
+    # look for the known messages
+    stderr = (result.stderr or b'').lower()
+    return any(error in stderr for error in TRANSIENT_ERRORS)
+
+
+# define the retry filters per operation, the others retry every failure
+DEFAULT_RETRY_ON = {'apply': transient_failure}
+
+
+# define the result of a command
+class CommandResult:
+
+    # keep instances small, there is one per command
+    __slots__ = ('name', 'args', 'returncode', 'stdout', 'stderr', 'stdout_size', 'stderr_size', 'seconds')
+
+    # describe class
+    def __init__(self, name, args, returncode, stdout, stderr, seconds):
+
+        """
+        Class to hold the outcome of a command.
+        Parameters
+        ----------
+        name : string
+            String with the command name, e.g. 'kubectl get'
+        args : list
+            List with the arguments, or a string for shell commands
+        returncode : int
+            Integer with the exit code
+        stdout : bytes
+            Bytes with the output, None if it was not captured
+        stderr : bytes
+            Bytes with the error output, None if it was not captured
+        seconds : float
+            Float with the wall time in seconds
+        """
+
+        # define the slots
+        self.name = name
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.stdout_size = len(stdout) if stdout is not None else 0
+        self.stderr_size = len(stderr) if stderr is not None else 0
+        self.seconds = seconds
+
+    # function to check the exit code
+    @property
+    def ok(self):
+
+        # check the exit code
+        return self.returncode == 0
+
+    # function to describe the result
+    def __repr__(self):
+
+        # return the description
+        return ('<CommandResult ' + self.name + ': exit ' + str(self.returncode)
+                + ' in ' + format(self.seconds, '.3f') + 's>')
+
+
+# define the error of failed commands
+class CommandError(Exception):
+
+    """
+    Exception raised when a command that has to succeed exits non-zero.
+    Slots:
+    --------
+    result : CommandResult
+        Stores the result of the command
+    """
+
+    # describe class
+    def __init__(self, result):
+
+        # define the slots
+        self.result = result
+
+        # build the message
+        message = str(self.result.name + ' failed with exit code ' + str(self.result.returncode))
+        if self.result.stderr:
+            message = message + ': ' + self.result.stderr.decode('utf-8', 'replace').strip()[-500:]
+        super().__init__(message)
+
+
+# define the error of commands that ran out of time
+class CommandTimeout(CommandError):
+
+    """
+    Exception raised when a command did not finish within its timeout. The
+    process group of the command was killed.
+    Slots:
+    --------
+    result : CommandResult
+        Stores the result of the command, with exit code -9
+    timeout : float
+        Stores the timeout in seconds
+    """
+
+    # describe class
+    def __init__(self, result, timeout):
+
+        # define the slots
+        self.result = result
+        self.timeout = timeout
+
+        # build the message
+        Exception.__init__(self, result.name + ' timed out after ' + str(timeout) + ' seconds')
+
+
+# define the error of cancelled commands
+class CommandCancelled(CommandError):
+
+    """
+    Exception raised when a command was cancelled with CommandRunner.cancel().
+    Slots:
+    --------
+    result : CommandResult
+        Stores the result of the command
+    """
+
+    # describe class
+    def __init__(self, result):
+
+        # define the slots
+        self.result = result
+
+        # build the message
+        Exception.__init__(self, result.name + ' was cancelled')
+
+
+# helper function to name a command
+def command_name(args):
+
+    """
+    Function to derive a short name from a command for the statistics.
+    The name is the executable and its first subcommand, e.g. 'kubectl get'.
+    For shell commands the last command of an '&&' chain is used, the
+    environment setup in front of it is ignored.
+    Parameters
+    ----------
+    args : list
+        List with the arguments, or a string for shell commands
+    Returns
+    -------
+    string
+        String with the name
+    """
+
+    # split shell commands and keep the last part of a chain
+    if isinstance(args, str):
+        args = shlex.split(args.split('&&')[-1])
+
+    # skip environment assignments like DOCKER_BUILDKIT=1
+    args = [arg for arg in args if not ('=' in arg and not arg.startswith('-') and arg.split('=')[0].isupper())]
+
+    # nothing left
+    if not args:
+        return 'unknown'
+
+    # take the executable and the first subcommand, skipping options
+    name = os.path.basename(args[0])
+    index = 1
+    while index < len(args):
+        if not args[index].startswith('-'):
+            return name + ' ' + args[index]
+        if args[index] in ('-p', '--profile', '-n', '--namespace', '--context', '--kubeconfig'):
+            index = index + 1
+        index = index + 1
+
+    # return the executable only
+    return name
+
+
+# helper function to compute a percentile
+def percentile(values, fraction):
+
+    """
+    Function to compute a percentile with the nearest-rank method.
+    Parameters
+    ----------
+    values : list
+        List with sorted values
+    fraction : float
+        Float between 0 and 1, e.g. 0.95
+    Returns
+    -------
+    float
+        Float with the percentile, None for no values
+    """
+
+    # nothing to compute
+    if not values:
+        return None
+
+    # pick the nearest rank
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+# helper function to compute a backoff delay
+def backoff_delay(attempt, backoff = 0.5, max_backoff = 10):
+
+    """
+    Function to compute the delay before a retry with full jitter: a random
+    delay between 0 and the exponential backoff, so retries of many callers
+    do not arrive in lockstep.
+    Parameters
+    ----------
+    attempt : int
+        Integer with the number of the failed attempt, starting at 0
+    backoff : float
+        Float with the base delay in seconds
+    max_backoff : float
+        Float with the upper bound of the delay in seconds
+    Returns
+    -------
+    float
+        Float with the delay in seconds
+    """
+
+    # draw from the exponential window
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+# helper function to signal a process group
+def signal_group(pid, signum):
+
+    """
+    Function to send a signal to the process group led by a process.
+    Parameters
+    ----------
+    pid : int
+        Integer with the process id of the group leader
+    signum : int
+        Integer with the signal
+    """
+
+    # try to signal the group, it may be gone already
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(pid, signum)
+        else:
+            os.kill(pid, signum)
+    except OSError:
+        pass
+
+
+# setup class
+class CommandRunner:
+
+    # describe class
+    def __init__(self, hooks = None, history_size = 10000, kill_grace = 2):
+
+        """
+        Class to run, time and record external commands.
+        Parameters
+        ----------
+        hooks : list
+            List with functions that are called with every CommandResult
+        history_size : int
+            Integer with the number of durations kept per command
+        kill_grace : float
+            Float with the seconds between SIGTERM and SIGKILL
+        """
+
+        # define the slots
+        self.hooks = list(hooks or [])
+        self.history_size = history_size
+        self.kill_grace = kill_grace
+
+        # define the statistics, the lock is reentrant so cancel() can run in a
+        # signal handler that interrupts the main thread while it holds it
+        self.__lock = threading.RLock()
+        self.__durations = {}
+        self.__totals = {}
+
+        # define the running process groups and the cancellation
+        self.__active = set()
+        self.__cancelled = threading.Event()
+
+    # helper function to record a result
+    def __record(self, result):
+
+        """
+        Private method to add a result to the statistics and call the hooks.
+        """
+
+        # update the statistics
+        with self.__lock:
+
+            # keep the recent durations
+            if result.name not in self.__durations:
+                self.__durations[result.name] = collections.deque(maxlen = self.history_size)
+                self.__totals[result.name] = {'count': 0, 'failures': 0, 'seconds': 0.0, 'max': 0.0,
+                                              'stdout_bytes': 0, 'stderr_bytes': 0}
+            self.__durations[result.name].append(result.seconds)
+
+            # add up the totals
+            totals = self.__totals[result.name]
+            totals['count'] = totals['count'] + 1
+            totals['failures'] = totals['failures'] + (0 if result.returncode == 0 else 1)
+            totals['seconds'] = totals['seconds'] + result.seconds
+            totals['max'] = max(totals['max'], result.seconds)
+            totals['stdout_bytes'] = totals['stdout_bytes'] + result.stdout_size
+            totals['stderr_bytes'] = totals['stderr_bytes'] + result.stderr_size
+
+        # call the hooks, a broken hook must not break the command
+        for hook in list(self.hooks):
+            try:
+                hook(result)
+            except Exception:
+                pass
+
+    # helper function to prepare a command
+    @staticmethod
+    def __prepare(command, shell, output):
+
+        """
+        Private method to prepare the arguments and streams of a command.
+        Returns
+        -------
+        tuple
+            Tuple with the arguments and the stream of stdout and stderr
+        """
+
+        # split plain commands like the call sites always did
+        args = command if shell or not isinstance(command, str) else command.split()
+
+        # pick the streams
+        if output == 'inherit':
+            stream = None
+        elif output in ('capture', 'discard', 'echo'):
+            stream = subprocess.PIPE
+        else:
+            raise Exception("output should be 'capture', 'discard', 'echo' or 'inherit'")
+
+        # return the arguments and the stream
+        return args, stream
+
+    # helper function to finish a result
+    def __finish(self, args, returncode, stdout, stderr, seconds, output):
+
+        """
+        Private method to build and record the result of a command.
+        """
+
+        # show the output if asked for
+        if output == 'echo':
+            if stdout:
+                print (stdout.decode('utf-8', 'replace'), end = '')
+            if stderr:
+                print (stderr.decode('utf-8', 'replace'), end = '')
+
+        # build the result, discarded output is measured but not kept
+        result = CommandResult(command_name(args), args, returncode, stdout, stderr, seconds)
+        if output == 'discard':
+            result.stdout = None
+            result.stderr = None
+
+        # record it
+        self.__record(result)
+
+        # return the result
+        return result
+
+    # helper function to record a command that did not end by itself
+    def __abort(self, args, returncode, started):
+
+        """
+        Private method to record a command that timed out, was cancelled or
+        could not be started.
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
+
+        # build and record the result
+        result = CommandResult(command_name(args), args, returncode, None, None, time.perf_counter() - started)
+        self.__record(result)
+
+        # return the result
+        return result
+
+    # helper function to kill a process group
+    def __terminate(self, process):
+
+        """
+        Private method to kill the process group of a command: SIGTERM first,
+        SIGKILL for whatever is left after the grace period.
+        """
+
+        # ask politely
+        signal_group(process.pid, signal.SIGTERM)
+
+        # wait for the leader
+        try:
+            process.wait(self.kill_grace)
+        except subprocess.TimeoutExpired:
+            pass
+
+        # kill the rest of the group
+        signal_group(process.pid, signal.SIGKILL)
+        process.wait()
+
+        # close the pipes, an escaped child may still hold them open
+        for pipe in (process.stdin, process.stdout, process.stderr):
+            if pipe is not None:
+                pipe.close()
+
+    # helper function to decide about a retry
+    def __retry(self, attempt, retries, result, retry_on):
+
+        """
+        Private method to decide if a failed attempt is tried again.
+        """
+
+        # no attempts left, or cancelled
+        if attempt >= retries or self.__cancelled.is_set():
+            return False
+
+        # timeouts are always worth another try
+        if result is None:
+            return True
+
+        # ask the filter, by default every non-zero exit is retried
+        return retry_on is None or retry_on(result)
+
+    # helper function to wait for a process and hand on its lines
+    @staticmethod
+    def __communicate_lines(process, input, timeout, on_line):
+
+        """
+        Private method to wait for a process like communicate(), while every
+        line of stdout and stderr is handed to on_line as it arrives.
+        Returns
+        -------
+        tuple
+            Tuple with stdout and stderr
+        """
+
+        # compute the deadline
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # define helper to read a pipe line by line
+        def pump(pipe, chunks):
+            try:
+                for line in iter(pipe.readline, b''):
+                    chunks.append(line)
+                    try:
+                        on_line(line.decode('utf-8', 'replace').rstrip('\r\n'))
+                    except Exception:
+                        pass
+            except (OSError, ValueError):
+                pass
+
+        # read both pipes in the background
+        stdout, stderr = [], []
+        threads = [threading.Thread(target = pump, args = (process.stdout, stdout), daemon = True),
+                   threading.Thread(target = pump, args = (process.stderr, stderr), daemon = True)]
+        for thread in threads:
+            thread.start()
+
+        # send the input
+        if process.stdin is not None:
+            try:
+                process.stdin.write(input)
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+        # wait for the process and the end of its output
+        process.wait(timeout)
+        for thread in threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+            if thread.is_alive():
+                raise subprocess.TimeoutExpired(process.args, timeout)
+
+        # return the output
+        return b''.join(stdout), b''.join(stderr)
+
+    # helper function to run a command once
+    def __run_once(self, args, stream, input, output, shell, env, timeout, on_line = None):
+
+        """
+        Private method to run a command once in a process group of its own.
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
+
+        # start the clock
+        started = time.perf_counter()
+
+        # nothing starts after a cancel
+        if self.__cancelled.is_set():
+            raise CommandCancelled(self.__abort(args, -15, started))
+
+        # try to start the process in a session of its own
+        try:
+            process = subprocess.Popen(args, stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                                       stdout = stream, stderr = stream, shell = shell, env = env,
+                                       start_new_session = True)
+
+        # a missing executable is recorded as exit code 127 and raised
+        except OSError:
+            self.__abort(args, 127, started)
+            raise
+
+        # remember the process, so cancel() finds it
+        with self.__lock:
+            self.__active.add(process.pid)
+
+        # wait for the process
+        try:
+            if on_line is not None and stream is not None:
+                stdout, stderr = self.__communicate_lines(process, input, timeout, on_line)
+            else:
+                stdout, stderr = process.communicate(input, timeout = timeout)
+
+        # a timeout kills the group, is recorded as exit code -9 and raised
+        except subprocess.TimeoutExpired:
+            self.__terminate(process)
+            raise CommandTimeout(self.__abort(args, -9, started), timeout)
+
+        # an interrupt, e.g. Ctrl-C, takes the group down as well
+        except BaseException:
+            self.__terminate(process)
+            raise
+
+        # forget the process
+        finally:
+            with self.__lock:
+                self.__active.discard(process.pid)
+
+        # a cancelled command does not count as a result
+        if self.__cancelled.is_set() and process.returncode != 0:
+            raise CommandCancelled(self.__abort(args, process.returncode, started))
+
+        # finish the result
+        return self.__finish(args, process.returncode, stdout, stderr, time.perf_counter() - started, output)
+
+    # function to run a command
+    def run(self, command, input = None, output = 'capture', shell = False, env = None, timeout = None,
+            check = False, retries = 0, backoff = 0.5, max_backoff = 10, retry_on = None, on_line = None):
+
+        """
+        Main method to run a command and record it.
+        Parameters
+        ----------
+        command : string
+            String with the command, split on whitespace, or a list with the
+            arguments. With shell=True the string runs in /bin/sh.
+        input : bytes
+            Bytes sent to stdin
+        output : string
+            String with what happens to stdout and stderr: 'capture' keeps
+            them in the result, 'discard' only measures them, 'echo' prints
+            them once the command ended, 'inherit' lets the command write to
+            the terminal directly
+        shell : boolean
+            Boolean indicating whether the command runs in a shell
+        env : dict
+            Dictionary with the environment, by default the current one
+        timeout : float
+            Float with the number of seconds a single attempt may take, the
+            process group is killed and CommandTimeout raised afterwards
+        check : boolean
+            Boolean indicating whether a non-zero exit raises CommandError
+        retries : int
+            Integer with the number of retries after a non-zero exit or a
+            timeout
+        backoff : float
+            Float with the base delay before a retry, it doubles per attempt
+            and is jittered
+        max_backoff : float
+            Float with the upper bound of the delay before a retry
+        retry_on : function
+            Function deciding with the CommandResult of a failed attempt if
+            it is retried, by default every failure is
+        on_line : function
+            Function called with every line of stdout and stderr as a string
+            while the command runs, e.g. to time its progress. It needs an
+            output other than 'inherit'.
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
+
+        # prepare the command
+        args, stream = self.__prepare(command, shell, output)
+
+        # try until it worked or no retries are left
+        attempt = 0
+        while True:
+
+            # run the command once
+            try:
+                result = self.__run_once(args, stream, input, output, shell, env, timeout, on_line)
+                if result.returncode == 0 or not self.__retry(attempt, retries, result, retry_on):
+                    break
+
+            # timeouts are retried as well
+            except CommandTimeout:
+                if not self.__retry(attempt, retries, None, retry_on):
+                    raise
+
+            # wait before the next attempt, a cancel ends the wait
+            if self.__cancelled.wait(backoff_delay(attempt, backoff, max_backoff)):
+                raise CommandCancelled(self.__abort(args, -15, time.perf_counter()))
+            attempt = attempt + 1
+
+        # raise if it has to succeed
+        if check and result.returncode != 0:
+            raise CommandError(result)
+
+        # return the result
+        return result
+
+    # helper function to run a command once in asyncio code
+    async def __run_once_async(self, args, stream, input, output, shell, env, timeout, on_line = None):
+
+        """
+        Private method to run a command once as an asyncio subprocess in a
+        process group of its own.
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
+
+        # start the clock
+        started = time.perf_counter()
+
+        # nothing starts after a cancel
+        if self.__cancelled.is_set():
+            raise CommandCancelled(self.__abort(args, -15, started))
+
+        # try to start the process in a session of its own
+        try:
+            if shell:
+                process = await asyncio.create_subprocess_shell(args, stdin = asyncio.subprocess.PIPE,
+                                                                stdout = stream, stderr = stream, env = env,
+                                                                start_new_session = True)
+            else:
+                process = await asyncio.create_subprocess_exec(*args, stdin = asyncio.subprocess.PIPE,
+                                                               stdout = stream, stderr = stream, env = env,
+                                                               start_new_session = True)
+
+        # a missing executable is recorded as exit code 127 and raised
+        except OSError:
+            self.__abort(args, 127, started)
+            raise
+
+        # define helper to kill the group without blocking the loop
+        async def terminate():
+            signal_group(process.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), self.kill_grace)
+            except asyncio.TimeoutError:
+                pass
+            signal_group(process.pid, signal.SIGKILL)
+            await process.wait()
+
+        # define helper to hand on a line
+        def emit(line):
+            try:
+                on_line(line.decode('utf-8', 'replace').rstrip('\r'))
+            except Exception:
+                pass
+
+        # define helper to read a stream and hand on its lines
+        async def pump(reader):
+            chunks, pending = [], b''
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    emit(line)
+            if pending:
+                emit(pending)
+            return b''.join(chunks)
+
+        # define helper to wait for the process while the lines are handed on
+        async def communicate_lines():
+            if input is not None:
+                process.stdin.write(input)
+                try:
+                    await process.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            process.stdin.close()
+            output = await asyncio.gather(pump(process.stdout), pump(process.stderr))
+            await process.wait()
+            return output
+
+        # remember the process, so cancel() finds it
+        with self.__lock:
+            self.__active.add(process.pid)
+
+        # wait for the process
+        try:
+            if on_line is not None and stream is not None:
+                stdout, stderr = await asyncio.wait_for(communicate_lines(), timeout)
+            else:
+                stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout)
+
+        # a timeout kills the group, is recorded as exit code -9 and raised
+        except asyncio.TimeoutError:
+            await terminate()
+            raise CommandTimeout(self.__abort(args, -9, started), timeout)
+
+        # a cancelled task takes the group down as well
+        except BaseException:
+            await asyncio.shield(terminate())
+            raise
+
+        # forget the process
+        finally:
+            with self.__lock:
+                self.__active.discard(process.pid)
+
+        # a cancelled command does not count as a result
+        if self.__cancelled.is_set() and process.returncode != 0:
+            raise CommandCancelled(self.__abort(args, process.returncode, started))
+
+        # finish the result
+        return self.__finish(args, process.returncode, stdout, stderr, time.perf_counter() - started, output)
+
+    # function to run a command in asyncio code
+    async def run_async(self, command, input = None, output = 'capture', shell = False, env = None, timeout = None,
+                        check = False, retries = 0, backoff = 0.5, max_backoff = 10, retry_on = None,
+                        on_line = None):
+
+        """
+        Main method to run a command as an asyncio subprocess and record it.
+        The parameters are the same as for run(). Cancelling the task kills
+        the process group of the command.
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
+
+        # prepare the command
+        args, stream = self.__prepare(command, shell, output)
+
+        # try until it worked or no retries are left
+        attempt = 0
+        while True:
+
+            # run the command once
+            try:
+                result = await self.__run_once_async(args, stream, input, output, shell, env, timeout, on_line)
+                if result.returncode == 0 or not self.__retry(attempt, retries, result, retry_on):
+                    break
+
+            # timeouts are retried as well
+            except CommandTimeout:
+                if not self.__retry(attempt, retries, None, retry_on):
+                    raise
+
+            # wait before the next attempt
+            await asyncio.sleep(backoff_delay(attempt, backoff, max_backoff))
+            attempt = attempt + 1
+
+        # raise if it has to succeed
+        if check and result.returncode != 0:
+            raise CommandError(result)
+
+        # return the result
+        return result
+
+    # function to stream the output of a command
+    def stream(self, command, env = None, check = False, stderr_lines = 100):
+
+        """
+        Main method to run a command and yield its stdout line by line while
+        it runs, e.g. to follow logs.
+        The consumer sets the pace: lines that are not taken yet stay in the
+        pipe, which blocks the command once it is full, so nothing piles up
+        in memory. Closing the generator kills the process group of the
+        command, and cancel() ends it like any other command. The command is
+        recorded when it ends, with the last lines of stderr.
+        Parameters
+        ----------
+        command : string
+            String with the command, split on whitespace, or a list with the
+            arguments
+        env : dict
+            Dictionary with the environment, by default the current one
+        check : boolean
+            Boolean indicating whether a non-zero exit raises CommandError
+        stderr_lines : int
+            Integer with the number of stderr lines kept for the result
+        Returns
+        -------
+        generator
+            Generator yielding the lines of stdout as bytes
+        """
+
+        # prepare the command
+        args, _ = self.__prepare(command, False, 'capture')
+        started = time.perf_counter()
+
+        # nothing starts after a cancel
+        if self.__cancelled.is_set():
+            raise CommandCancelled(self.__abort(args, -15, started))
+
+        # try to start the process in a session of its own
+        try:
+            process = subprocess.Popen(args, stdin = subprocess.DEVNULL, stdout = subprocess.PIPE,
+                                       stderr = subprocess.PIPE, env = env, start_new_session = True)
+
+        # a missing executable is recorded as exit code 127 and raised
+        except OSError:
+            self.__abort(args, 127, started)
+            raise
+
+        # remember the process, so cancel() finds it
+        with self.__lock:
+            self.__active.add(process.pid)
+
+        # keep the tail of stderr in the background
+        errors = collections.deque(maxlen = stderr_lines)
+        def drain():
+            try:
+                for line in iter(process.stderr.readline, b''):
+                    errors.append(line)
+            except (OSError, ValueError):
+                pass
+        reader = threading.Thread(target = drain, daemon = True)
+        reader.start()
+
+        # hand out the lines
+        stdout_size = 0
+        try:
+            for line in iter(process.stdout.readline, b''):
+                stdout_size = stdout_size + len(line)
+                yield line
+            process.wait()
+
+        # a closed generator or an error takes the group down
+        finally:
+            if process.returncode is None:
+                self.__terminate(process)
+            reader.join(self.kill_grace)
+            with self.__lock:
+                self.__active.discard(process.pid)
+
+            # record the command
+            result = CommandResult(command_name(args), args, process.returncode, None, b''.join(errors),
+                                   time.perf_counter() - started)
+            result.stdout_size = stdout_size
+            self.__record(result)
+
+        # a cancelled command does not count as a result
+        if self.__cancelled.is_set() and result.returncode != 0:
+            raise CommandCancelled(result)
+
+        # raise if it has to succeed
+        if check and result.returncode != 0:
+            raise CommandError(result)
+
+    # function to cancel all commands
+    def cancel(self):
+
+        """
+        Main method to cancel all running commands and refuse new ones.
+        The process groups of the running commands get SIGTERM right away and
+        SIGKILL after the grace period, their callers get CommandCancelled.
+        It is safe to call from another thread or a signal handler. Call
+        reset_cancel() to run commands again.
+        """
+
+        # refuse new commands and end the waits between retries
+        self.__cancelled.set()
+
+        # signal the running groups
+        with self.__lock:
+            pids = list(self.__active)
+        for pid in pids:
+            signal_group(pid, signal.SIGTERM)
+
+        # kill what is left after the grace period
+        if pids:
+            timer = threading.Timer(self.kill_grace, lambda: [signal_group(pid, signal.SIGKILL) for pid in pids])
+            timer.daemon = True
+            timer.start()
+
+    # function to check the cancellation
+    @property
+    def cancelled(self):
+
+        # check the event
+        return self.__cancelled.is_set()
+
+    # function to accept commands again
+    def reset_cancel(self):
+
+        """
+        Main method to accept commands again after cancel().
+        """
+
+        # clear the event
+        self.__cancelled.clear()
+
+    # function to get the statistics
+    def stats(self):
+
+        """
+        Main method to get the statistics per command.
+        Count, failures, total and max seconds and the output bytes cover
+        every run, p50 and p95 only the last history_size durations.
+        Returns
+        -------
+        dict
+            Dictionary with one entry per command name, holding count,
+            failures, total/p50/p95/max seconds and the output bytes
+        """
+
+        # copy the data under the lock
+        with self.__lock:
+            durations = {name: sorted(values) for name, values in self.__durations.items()}
+            totals = {name: dict(values) for name, values in self.__totals.items()}
+
+        # compute the statistics
+        stats = {}
+        for name, values in durations.items():
+            stats[name] = dict(totals[name],
+                               p50 = percentile(values, 0.50),
+                               p95 = percentile(values, 0.95))
+
+        # return them, slowest in total first
+        return dict(sorted(stats.items(), key = lambda item: -item[1]['seconds']))
+
+    # function to reset the statistics
+    def reset_stats(self):
+
+        """
+        Main method to reset the statistics.
+        """
+
+        # clear everything
+        with self.__lock:
+            self.__durations = {}
+            self.__totals = {}
@@ -17,22 +17,96 @@ kc_installed : boolean
     Stores if kubectl is already installed
 mk_installed : boolean
     Stores if minikube is already installed
+dk_installed : boolean
+    Stores if docker is already installed
+tool_paths : dict
+    Stores the resolved paths of the components
+tool_versions : dict
+    Stores the versions of the components
+probe_timings : dict
+    Stores how many seconds each component probe took
+cache_dir : str
+    Stores the directory of the kubipy caches (KUBIPY_HOME, default ~/.kubipy)
+tool_cache_path : str
+    Stores the path of the component detection cache
+install_state_path : str
+    Stores the path of the installation checkpoints
+artifact_cache_dir : str
+    Stores the directory of the downloaded installers (KUBIPY_ARTIFACT_CACHE,
+    default ~/.kubipy/artifacts), which can live on a file share
+cache_ttl : float
+    Stores how many seconds a component detection stays valid
+lazy : boolean
+    Stores if component checks are deferred until a method needs them
+profile : str
+    Stores the name of the minikube profile, which is also the kubectl
+    context, so several clusters can run side by side
+backend : str
+    Stores how the cluster is queried: 'kubectl' or 'api' (in-process client)
+client : KubeClient
+    Stores the client of the API server, created on first use
+informers : InformerCache
+    Stores the watch-backed in-memory copy of the cluster objects, if started
+metrics : MetricsSampler
+    Stores the sampled CPU and memory usage of pods and nodes, if started
+runner : CommandRunner
+    Stores the layer all external commands run through, with their timings
+timeouts : dict
+    Stores the seconds each operation may take, e.g. 'build' or 'url'
+retries : dict
+    Stores how often each transiently failing operation is retried
 py_version : string
     Stores the version of Python in use
+dk_file_path : string
+    Stores the path of the last Dockerfile (one directory per deployment)
+docker_env : dict
+    Stores the docker-env variables of the cluster, resolved once per session
+image_tag : string
+    Stores the content-addressed tag of the last deployed image
+image_cached : boolean
+    Stores if the last deploy reused an existing image instead of building
 service_url : string
     Stores the service url
+deploy_timings : dict
+    Stores the seconds the last deploy spent per phase
+install_timings : dict
+    Stores the seconds the last install spent per component and step
+boot_report : dict
+    Stores what the last start did and the seconds it spent per boot phase
 """
 
 # import libs
-import subprocess
+import concurrent.futures
+import asyncio
+import shutil
+import threading
+import json
+import time
 import os
 import sys
 
+# import modules
+from kubipy.client import KubeClient
+from kubipy.runner import CommandRunner, CommandError, CommandTimeout, DEFAULT_TIMEOUTS, DEFAULT_RETRIES, backoff_delay
+from kubipy.runner import DEFAULT_RETRY_ON
+from kubipy.records import RecordTable
+from kubipy.informer import InformerCache
+from kubipy.logs import LogStreams, parse_prefixed, since_seconds
+from kubipy.metrics import MetricsSampler
+from kubipy.loadtest import run_load
+from kubipy.cluster import parse_status, cluster_state, BootTimer
+from kubipy.install import plan_steps, run_steps, InstallError, InstallState
+from kubipy.artifacts import ArtifactCache
+from kubipy.build import image_digest, image_tag, render_dockerfile, build_context, parse_docker_env
+from kubipy.build import DOCKER_CONNECTION_ERRORS
+from kubipy.manifests import render_deployment, render_service, render_list, FIELD_MANAGER
+
 # setup class
 class minipy:
 
     # describe class
-    def __init__(self, greeting = True):
+    def __init__(self, greeting = True, cache_ttl = 86400, lazy = False, backend = 'kubectl', runner = None,
+                 timeouts = None, retries = None, profile = 'minikube'):
         
         # define the slots
         self.description = 'local kubernetes cluster'
@@ -42,9 +116,32 @@ class minipy:
         self.kc_installed = None
         self.mk_installed = None
         self.dk_installed = None
+        self.tool_paths = {}
+        self.tool_versions = {}
+        self.probe_timings = {}
+        self.cache_dir = os.environ.get('KUBIPY_HOME', os.path.expanduser('~/.kubipy'))
+        self.tool_cache_path = os.path.join(self.cache_dir, 'tools.json')
+        self.install_state_path = os.path.join(self.cache_dir, 'install-state.json')
+        self.artifact_cache_dir = os.environ.get('KUBIPY_ARTIFACT_CACHE', os.path.join(self.cache_dir, 'artifacts'))
+        self.cache_ttl = cache_ttl
+        self.lazy = lazy
+        self.profile = profile
+        self.backend = backend
+        self.client = None
+        self.informers = None
+        self.metrics = None
+        self.runner = runner if runner is not None else CommandRunner()
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = dict(DEFAULT_RETRIES, **(retries or {}))
         self.py_version = None
         self.dk_file_path = None
+        self.docker_env = None
+        self.image_tag = None
+        self.image_cached = None
         self.service_url = None
+        self.deploy_timings = None
+        self.install_timings = None
+        self.boot_report = None
 
         # welcome message
         welcome_message = """
@@ -70,12 +167,24 @@ class minipy:
     
         """
 
-        # check if greeting
-        if greeting:
+        # check if greeting (lazy objects stay quiet)
+        if greeting and not lazy:
 
             # print welcome message
             print(welcome_message)
 
+        # check the backend
+        if backend not in ('kubectl', 'api'):
+
+            # raise Exception
+            raise Exception("backend should be either 'kubectl' or 'api'")
+
+        # check the profile, it names a VM, a kubectl context and files
+        if not profile or not all(char.isalnum() or char in '-_' for char in profile):
+
+            # raise Exception
+            raise Exception('profile should only contain letters, digits, - and _')
+
         # check python version
         major_v = str(sys.version_info[0])
         minor_v = str(sys.version_info[1])
@@ -84,214 +193,454 @@ class minipy:
         # write to slot
         self.py_version = str(major_v + '.' + minor_v + '.' + micro_v)
 
-        # screen for already installed components
-        self.__check_installed()
+        # screen for already installed components, unless this is deferred
+        if not lazy:
+
+            # check all components
+            self.__check_installed()
     
-    # define pivate method to check if components already exists
-    def __check_installed(self):
+    # define private method to run the command of an operation
+    def __run(self, operation, command, **kwargs):
 
+        """
+        Private method to run a command through the runner with the timeout
+        and the retries configured for its operation. minikube and kubectl
+        commands are pointed to the profile.
+        Parameters
+        ----------
+        operation : string
+            String with the operation, a key of self.timeouts, e.g. 'build'
+        command : string
+            String with the command
+        kwargs : dict
+            Further arguments of CommandRunner.run()
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
 
-        # check if virtualbox is installed
-        try: 
+        # run the command with the settings of the operation
+        kwargs.setdefault('retry_on', DEFAULT_RETRY_ON.get(operation))
+        return self.runner.run(self.__scope(command), timeout = self.timeouts.get(operation),
+                               retries = self.retries.get(operation, 0), **kwargs)
 
-            # check if cli is recognized
-            command = str('virtualbox --help')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    # define private method to point a command to the profile
+    def __scope(self, command):
 
-            # installed if not crashed
-            vb_installed = True
-        
-        # handle exception
-        except:
+        """
+        Private method to point minikube and kubectl commands to the profile
+        of this object, with '-p <profile>' and '--context <profile>'. Other
+        commands are returned unchanged.
+        Parameters
+        ----------
+        command : string
+            String with the command, or a list with the arguments
+        Returns
+        -------
+        list
+            List with the arguments, or the unchanged command
+        """
 
-            # not installed
-            vb_installed = False
-        
-        # check if kubectl is already installed
-        try:
+        # split the command like the runner does
+        args = command.split() if isinstance(command, str) else list(command)
 
-            # check if cli is recognized
-            command = str('kubectl config view')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        # minikube selects the profile
+        if args[:1] == ['minikube']:
+            return args[:1] + ['-p', self.profile] + args[1:]
 
-            # installed if not crashed
-            kc_installed = True
-        
-        # handle exception
-        except:
+        # kubectl selects the context minikube created for it
+        if args[:1] == ['kubectl']:
+            return args[:1] + ['--context', self.profile] + args[1:]
 
-            # not installed
-            kc_installed = False
+        # return anything else as it is
+        return command
 
-        # check if minikube is installed
-        try: 
+    # define private method to probe a single component
+    def __probe_tool(self, path, version_args, timeout):
 
-            # check if cli is recognized
-            command = str('minikube version')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        """
+        Private method to probe a single component.
+        This function runs the version command of an executable, that was
+        already found on the PATH, with a timeout. A component only counts as
+        installed, if the version command exits with 0.
+        Parameters
+        ----------
+        path : string
+            String with the resolved path of the executable
+        version_args : list
+            List with the arguments of the version command
+        timeout : float
+            Float with the number of seconds the version command may take
+        Returns
+        -------
+        dict
+            Dictionary with the keys installed, version and seconds
+        """
 
-            # installed if not crashed
-            mk_installed = True
-        
-        # handle exception
-        except:
+        # start the clock
+        started = time.perf_counter()
 
-            # not installed
-            mk_installed = False
+        # default to not installed
+        installed = False
+        version = None
 
-        # check if docker is installed
+        # try to run the version check
         try:
 
-            # check if cli is recognized
-            command = str('docker ps -a')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # run the version check
+            result = self.runner.run([path] + version_args, timeout=timeout)
 
-            # installed if not crashed
-            dk_installed = True
+            # installed only if the check exited cleanly
+            installed = result.returncode == 0
 
-        # handle exception
-        except:
+            # keep the first line of the output as version
+            lines = result.stdout.decode('utf-8', 'replace').strip().splitlines()
+            if installed and lines:
+                version = lines[0].strip()
+
+        # handle timeouts and broken executables
+        except (CommandTimeout, OSError):
 
             # not installed
-            dk_installed = False
+            installed = False
 
-        # store info in object
-        self.vb_installed = vb_installed
-        self.kc_installed = kc_installed
-        self.mk_installed = mk_installed
-        self.dk_installed = dk_installed
+        # return the probe result
+        return {'installed': installed,
+                'version': version,
+                'seconds': time.perf_counter() - started}
 
-    # function to install driver
-    def __install_driver(self):
+    # define private method to fingerprint an executable
+    def __fingerprint_tool(self, executable):
 
         """
-        Private Method to install VirtualBox driver.
-        This function downloads the binary using homebrew.
+        Private method to fingerprint an executable.
+        This function looks the executable up on the PATH and reads its mtime
+        and size. Neither of this spawns a process.
+        Parameters
+        ----------
+        executable : string
+            String with the name of the executable
         Returns
         -------
-        boolean
-            Returns 'True' if successfully installed, otherwise 'False'
+        dict
+            Dictionary with the keys path, mtime and size, or None if the
+            executable is not on the PATH
         """
 
-        # try to install driver
-        try: 
+        # look the executable up on the PATH
+        path = shutil.which(executable)
 
-            # mount the dmg
-            command = str('brew cask install virtualbox')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        # not on the PATH
+        if path is None:
 
-            # return
-            return True
+            # return None
+            return None
 
-        # return if it doesn't work
-        except:
+        # try to stat the executable (this follows symlinks)
+        try:
 
-            # return
-            return False
+            # stat the file
+            stat = os.stat(path)
+
+        # handle broken links
+        except OSError:
+
+            # return None
+            return None
 
-    # function to install docker
-    def __install_docker(self):
+        # return the fingerprint
+        return {'path': path, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+    # define private method to read the tool cache
+    def __load_tool_cache(self):
 
         """
-        Private Method to install docker.
-        This function downloads and installs docker on the host machine.
+        Private method to read the tool detection cache from disk.
         Returns
         -------
-        boolean
-            Returns 'True' if successfully installed, otherwise 'False'
+        dict
+            Dictionary with the cached entries per component
         """
-        
-        # try to install docker
+
+        # try to read the cache
         try:
 
-            # install docker
-            command = str('brew cask install docker')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # read the file
+            with open(self.tool_cache_path) as file:
+                cache = json.load(file)
 
-            # start docker deamon
-            command = str('open /Applications/Docker.app')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # return the entries
+            return cache.get('tools', {})
 
-            # return True
-            return True
-        
-        # return False if it did not work
-        except:
+        # handle missing or broken cache files
+        except (OSError, ValueError, AttributeError):
 
-            # return False
-            return False
+            # return an empty cache
+            return {}
 
-    # function to install kubectl
-    def __install_kubectl(self):
+    # define private method to write the tool cache
+    def __save_tool_cache(self, entries):
 
         """
-        Private Method to install kubernetes-cli.
-        This function downloads and installs kubectl as a kubernetes cli. The 
-        cli is installed using the macOS package manager Homebrew.
-        Returns
-        -------
-        boolean
-            Returns 'True' if successfully installed, otherwise 'False'
+        Private method to write the tool detection cache to disk.
+        The file is written to a temporary file first and then moved into
+        place, so concurrent processes never read a half written cache.
+        Parameters
+        ----------
+        entries : dict
+            Dictionary with the entries per component
         """
 
-        # try to install kubectl
+        # try to write the cache
         try:
 
-            # install kubectl
-            command = str('brew install kubectl')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # make sure the cache directory exists
+            os.makedirs(self.cache_dir, exist_ok=True)
 
-            # link to the version
-            command = str('brew link --overwrite kubernetes-cli')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # write to a temporary file next to the cache
+            tmp_path = str(self.tool_cache_path + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp')
+            with open(tmp_path, 'w') as file:
+                json.dump({'tools': entries}, file, indent=2)
 
-            # return
-            return True
+            # move the file into place
+            os.replace(tmp_path, self.tool_cache_path)
 
-        # return false if it didn't work
-        except:
+        # a cache that cannot be written is not fatal
+        except OSError:
 
-            # return
-            return False
+            # skip
+            pass
 
-    # function to install minikube
-    def __install_minikube(self):
+    # define private method to invalidate the tool cache
+    def __invalidate_tool_cache(self):
 
         """
-        Private Method to install minikube.
-        This function downloads and installs minikube as a local kubernetes
-        cluster. Minikube is installed using the macOS package manager Homebrew.
-        Returns
-        -------
-        boolean
-            Returns 'True' if successfully installed, otherwise 'False'
+        Private method to invalidate the tool detection cache.
+        This function removes the cache file, so the next check probes all
+        components again.
         """
 
-        # try to install minikube
+        # try to remove the cache
         try:
 
-            # install minikube
-            command = str('brew install minikube')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # remove the file
+            os.remove(self.tool_cache_path)
 
-            # return 
-            return True
-        
-        # return false if it didn't work
-        except:
+        # nothing to remove
+        except OSError:
 
-            # return 
-            return False
+            # skip
+            pass
+
+    # define pivate method to check if components already exists
+    def __check_installed(self, tools = None, timeout = None, refresh = False):
+
+        """
+        Private method to check which components are already installed.
+        This function fingerprints VirtualBox, kubectl, Minikube and Docker by
+        their path, mtime and size. Components with a matching, not expired
+        entry in the on-disk cache are taken from the cache without spawning
+        a process. All other components are probed concurrently, each with its
+        own timeout. The results, paths, versions and timings are stored in
+        the object.
+        Parameters
+        ----------
+        tools : list
+            List with the components to check, by default all of them
+        timeout : float
+            Float with the number of seconds a single probe may take, by
+            default self.timeouts['probe']
+        refresh : boolean
+            Boolean indicating whether the cache should be ignored
+        """
+
+        # define the probes: slot, executable and version command
+        probes = {'virtualbox': ('vb_installed', 'VBoxManage', ['--version']),
+                  'kubectl': ('kc_installed', 'kubectl', ['version', '--client']),
+                  'minikube': ('mk_installed', 'minikube', ['version', '--short']),
+                  'docker': ('dk_installed', 'docker', ['--version'])}
+
+        # default to the configured timeout
+        if timeout is None:
+
+            # take the probe timeout
+            timeout = self.timeouts['probe']
+
+        # default to all components
+        if tools is None:
+
+            # check all
+            tools = list(probes)
+
+        # read the cache
+        cache = {} if refresh else self.__load_tool_cache()
+
+        # collect results and the probes that still need to run
+        results = {}
+        pending = {}
+
+        # check every requested component
+        for name in tools:
+
+            # look up the executable
+            executable = probes[name][1]
+
+            # start the clock
+            started = time.perf_counter()
+
+            # fingerprint the executable
+            fingerprint = self.__fingerprint_tool(executable)
+
+            # not on the PATH, so not installed
+            if fingerprint is None:
+
+                # store result
+                results[name] = {'installed': False, 'path': None, 'mtime': None, 'size': None,
+                                 'version': None, 'checked_at': time.time(),
+                                 'seconds': time.perf_counter() - started}
+
+                # next component
+                continue
+
+            # check if the cache entry is still valid
+            entry = cache.get(name)
+            if (entry is not None
+                    and entry.get('path') == fingerprint['path']
+                    and entry.get('mtime') == fingerprint['mtime']
+                    and entry.get('size') == fingerprint['size']
+                    and time.time() - entry.get('checked_at', 0) < self.cache_ttl):
+
+                # take the result from the cache
+                results[name] = dict(entry, seconds = time.perf_counter() - started)
+
+            # otherwise the component needs to be probed
+            else:
+
+                # remember the fingerprint
+                pending[name] = fingerprint
+
+        # run the remaining probes concurrently
+        if pending:
+
+            # start a thread per probe
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending)) as executor:
+
+                # submit the probes
+                futures = {name: executor.submit(self.__probe_tool, fingerprint['path'], probes[name][2], timeout)
+                           for name, fingerprint in pending.items()}
+
+                # collect the results
+                for name, future in futures.items():
+                    results[name] = dict(pending[name], checked_at = time.time(), **future.result())
+
+            # merge what we know now into the cache on disk
+            entries = self.__load_tool_cache()
+            for name, result in results.items():
+
+                # keep only components that exist
+                if result['path'] is None:
+                    entries.pop(name, None)
+                else:
+                    entries[name] = {key: value for key, value in result.items() if key != 'seconds'}
+
+            # write the cache
+            self.__save_tool_cache(entries)
+
+        # store info in object
+        for name, result in results.items():
+
+            # store the installed flag in its slot
+            setattr(self, probes[name][0], result['installed'])
+
+            # store path, version and timing
+            self.tool_paths[name] = result['path']
+            self.tool_versions[name] = result['version']
+            self.probe_timings[name] = result['seconds']
+
+    # define private method to check components on demand
+    def __require(self, *tools):
+
+        """
+        Private method to make sure components have been checked.
+        In lazy mode nothing is checked when the object is created. This 
+        function checks only the given components, and only if they have not
+        been checked before, so every method pays just for its own 
+        dependencies.
+        Parameters
+        ----------
+        tools : string
+            Strings with the names of the components a method relies on
+        """
+
+        # find the components that have not been checked yet
+        missing = [name for name in tools if name not in self.tool_paths]
+
+        # check them
+        if missing:
+
+            # check only the missing ones
+            self.__check_installed(tools = missing)
+
+    # function to refresh the component detection
+    def refresh_tools(self):
+
+        """
+        Main method to refresh the component detection.
+        This function ignores the on-disk cache, probes all components again
+        and writes the fresh results to the cache.
+        """
+
+        # probe again without the cache
+        self.__check_installed(refresh = True)
+
+    # helper function to show the progress of the installation
+    def __show_progress(self, step, event, result):
+
+        """
+        Private method to print one line per event of an installation step.
+        """
+
+        # build the line
+        line = str('    [' + step.component + '] ' + step.name.split(':')[1] + ' ' + event)
+
+        # add the timing and the error
+        if result is not None and event in ('done', 'failed'):
+            line = line + ' after ' + format(result['seconds'], '.1f') + 's'
+        if result is not None and result['error'] is not None:
+            line = line + ': ' + str(result['error'])
+
+        # print the line in one write, the steps run in several threads
+        sys.stdout.write(line + '\n')
 
     # function to install minikube
-    def install(self):
+    def install(self, max_workers = 4, use_artifacts = True):
 
         """
         Main method to install Minikube with all dependencies.
-        This function calls the previous private functions one after another to
-        download and install all necessary components to setup Minikube.
+        This function installs the missing components as a dependency graph:
+        all downloads run at the same time, the installs run one after 
+        another as soon as their download is done, and minikube waits for
+        kubectl. The seconds per component and step are stored in 
+        self.install_timings.
+        Every finished step and component is checkpointed in 
+        self.install_state_path. A rerun after a failure skips the steps
+        that finished before, and components recorded with an unchanged 
+        executable are not checked any further.
+        Downloads are served from the artifact cache in 
+        self.artifact_cache_dir, verified by checksum, and new downloads are
+        added to it, so identical machines download every installer once.
+        Parameters
+        ----------
+        max_workers : int
+            Integer with the maximum number of steps running at once
+        use_artifacts : boolean
+            Boolean indicating whether the artifact cache is used
         """
 
+        # make sure the components this method relies on were checked
+        self.__require('virtualbox', 'kubectl', 'minikube', 'docker')
+
         # print message
         info_message = """
                                 ___________________________________________
@@ -305,48 +654,101 @@ class minipy:
         # print info message
         print (info_message)
 
-        # test if Docker needs to be installed
-        if self.dk_installed:
+        # read the checkpoints
+        state = InstallState(self.install_state_path)
 
-            # build info message
-            info_message = """
-                                   ___________________________________________
-                                  | Docker is already installed               |
-                                   -------------------------------------------
-                                                                            
-            """
+        # find the missing components
+        slots = {'docker': 'dk_installed', 'virtualbox': 'vb_installed', 'kubectl': 'kc_installed',
+                 'minikube': 'mk_installed'}
+        missing = []
+        for name, slot in slots.items():
 
-            # print info about graphical interface
-            print (info_message)
+            # a recorded component with an unchanged executable is done
+            if state.verify_component(name):
+                print ('    [' + name + '] verified')
 
-        # if it is not installed
-        else:
+            # an installed component only needs to be recorded
+            elif getattr(self, slot):
+                print ('    [' + name + '] already installed')
+
+            # everything else has to be installed
+            else:
+                missing.append(name)
+
+        # resume from the steps that finished before
+        completed = set()
+        for name in missing:
+
+            # look up the finished steps
+            steps = state.completed_steps(name, max_age = self.cache_ttl)
+
+            # all steps finished but the component does not work, so start over
+            if {step.name for step in plan_steps([name], None)} <= steps:
+                state.forget(name)
+                steps = set()
+
+            # keep them
+            completed.update(steps)
+
+        # define helper to checkpoint and show the steps
+        def progress(step, event, result):
+            if event == 'done':
+                state.mark_step(step.name)
+            self.__show_progress(step, event, result)
+
+        # warn about the password prompt of VirtualBox
+        if 'virtualbox' in missing:
 
             # build info message
             info_message = """
                   ____________________________________________________________
-                 | For just a couple of seconds you will leave Python. Docker |
-                 | comes with a handy UI. You will need Docker to build and   |
-                 | deploy containers to Minikube. If you want to know more    |
-                 | about Docker visit https://www.docker.com/.                |
+                 | ATTENTION: you might be asked to provide your sudo pass in |
+                 | just a second.                                             |
                   ------------------------------------------------------------
-                                                                            
             """
 
             # print info about graphical interface
             print (info_message)
 
-            # install docker
-            installed_dk = self.__install_docker()
+        # plan the steps, every command has to succeed
+        artifacts = ArtifactCache(self.artifact_cache_dir) if use_artifacts else None
+        steps = plan_steps(missing, lambda operation, command: self.__run(operation, command, check=True),
+                           artifacts = artifacts)
 
-            # check if it worked
-            if installed_dk:
+        # run the steps
+        started = time.perf_counter()
+        results = run_steps(steps, max_workers = max_workers, on_event = progress, completed = completed)
 
-                # build info message
-                info_message = """
-                                   ___________________________________________
-                                  | Successfully installed Docker             |
-                                   -------------------------------------------
+        # store the timings per component and step
+        timings = {}
+        for step in steps:
+            timings.setdefault(step.component, {})[step.name.split(':')[1]] = results[step.name]['seconds']
+        timings['total'] = time.perf_counter() - started
+        self.install_timings = timings
+
+        # the installed components changed, so drop the cache and probe again
+        self.__invalidate_tool_cache()
+        self.__check_installed()
+
+        # record the installed components with their checksums
+        for name, slot in slots.items():
+            if getattr(self, slot) and self.tool_paths.get(name) and not state.verify_component(name):
+                try:
+                    state.record_component(name, self.tool_paths[name], self.tool_versions.get(name))
+                except OSError:
+                    pass
+
+        # check if it worked
+        if any(result['status'] != 'done' for result in results.values()):
+
+            # raise Exception
+            raise InstallError(results)
+
+        # tell about the docker account
+        if 'docker' in missing:
+
+            # build info message
+            info_message = """
                   ____________________________________________________________
                  | To use Docker you need to create a user account. You can   | 
                  | do this on Dockerhub: https://hub.docker.com/. If you have |
@@ -355,225 +757,285 @@ class minipy:
                  | https://docs.docker.com/docker-for-mac/install/            |
                   -----------------------------------------------------------
                                                                                 
-                """
+            """
 
-                # print info about graphical interface
-                print (info_message)
+            # print info about graphical interface
+            print (info_message)
 
-            # break the function if it didn't work
-            else:
+        # update current_status
+        self.current_status = 'installed'
+    
+    # helper function to read the state of the cluster
+    def __cluster_state(self):
 
-                # raise Exception
-                raise Exception('I could not install Docker')
+        """
+        Private method to read the state of the cluster with a single
+        'minikube status' call, without starting anything.
+        Returns
+        -------
+        tuple
+            Tuple with the state ('running', 'paused', 'stopped', 'missing'
+            or 'degraded') and the parsed status
+        """
 
-        # test if VirtualBox needs to be installed
-        if self.vb_installed:
+        # read the status, it exits non-zero for anything but a running cluster
+        try:
+            result = self.__run('status', 'minikube status -o json')
 
-            # build info message
-            info_message = """
-                                   ___________________________________________
-                                  | VirtualBox is already installed           |
-                                   -------------------------------------------
-                                                                            
-            """
+        # a hanging status tells nothing
+        except CommandTimeout:
+            return 'degraded', {}
 
-            # print info about graphical interface
-            print (info_message)
+        # name the state
+        status = parse_status(result.stdout)
+        return cluster_state(status), status
 
-        # if it is not installed
-        else:
+    # helper function to probe the API server once
+    def __probe_ready(self):
 
-            # build info message
-            info_message = """
-                  ____________________________________________________________
-                 | VirtualBox will be installed now. I am downloading the     |
-                 | binary from: https://www.virtualbox.org/wiki/Downloads.    |
-                  ------------------------------------------------------------
-                                                                            
-            """
+        """
+        Private method to ask the API server once if it serves, through its
+        /readyz endpoint.
+        Returns
+        -------
+        boolean
+            Returns 'True' if the API server is ready, otherwise 'False'
+        """
 
-            # print info about graphical interface
-            print (info_message)
+        # ask the API server directly
+        if self.backend == 'api':
+            try:
+                self.__get_client().request('GET', '/readyz', timeout = self.timeouts['ready'])
+                return True
+            except Exception:
+                return False
 
-             # build info message
-            info_message = """
-                  ____________________________________________________________
-                 | ATTENTION: you might be asked to provide your sudo pass in |
-                 | just a second.                                             |
-                  ------------------------------------------------------------
-            """
-            
-            # print info about graphical interface
-            print (info_message)           
+        # or through kubectl
+        try:
+            result = self.__run('ready', 'kubectl get --raw /readyz')
+        except CommandTimeout:
+            return False
 
-            # install virtualbox driver
-            installed_vb = self.__install_driver()
+        # the endpoint answers 'ok'
+        return result.returncode == 0 and result.stdout.strip() == b'ok'
 
-            # check if it worked
-            if installed_vb:
+    # helper function to wait for the API server
+    def __wait_api(self, timeout):
 
-                # build info message
-                info_message = """
-                                   ___________________________________________
-                                  | Successfully installed VirtualBox         |
-                                   -------------------------------------------
-                                                                                
-                """
+        """
+        Private method to probe the API server with jittered exponential
+        backoff until it is ready.
+        Parameters
+        ----------
+        timeout : float
+            Float with the number of seconds to wait at most
+        Returns
+        -------
+        tuple
+            Tuple with the time.perf_counter() at which the API server was
+            ready, or None, and the number of probes
+        """
 
-                # print info about graphical interface
-                print (info_message)
+        # compute the deadline
+        deadline = time.monotonic() + timeout
 
-            # break the function if it didn't work
-            else:
+        # probe until it is ready or the time is up
+        probes = 0
+        while True:
 
-                # raise error
-                raise Exception('I could not install VirtualBox')
+            # probe once
+            probes = probes + 1
+            if self.__probe_ready():
+                return time.perf_counter(), probes
 
-        # check if kubectl is already installed
-        if self.kc_installed:
+            # give up at the deadline or after a cancel
+            if time.monotonic() >= deadline or self.runner.cancelled:
+                return None, probes
 
-            # build info message
-            info_message = """
-                                   ___________________________________________
-                                  | Kubectl is already installed              |
-                                   -------------------------------------------
-                                                                                
-            """
+            # wait before the next probe
+            time.sleep(min(backoff_delay(probes - 1, 0.25, 5), max(deadline - time.monotonic(), 0)))
 
-            # print info about graphical interface
-            print (info_message)
+    # function to start minikube
+    def start(self, cpus = '2', memory = '2G', log_trace = False, force = False, ready_timeout = 300):
 
-        # if it is not installed
-        else:
+        """
+        Main method to start the Minikube cluster.
+        This function is a python wrapper around the 'minikube start' shell 
+        command. The cluster is sporned and set to run. A cluster that
+        already runs healthy is left as it is and a paused one is resumed,
+        both without booting anything. In every case the method only returns
+        once the API server answers on /readyz.
+        Parameters
+        ----------
+        cpus : str
+            String to indicate the number of cores used for the cluster
+        memory: str
+            String to indicate the amount of memory allocated to the cluster
+        log_trace : boolean
+            Boolean indicating whether the output of minikube is shown
+        force : boolean
+            Boolean indicating whether 'minikube start' runs in any case
+        ready_timeout : float
+            Float with the number of seconds to wait for the API server
+        Returns
+        -------
+        dict
+            Dictionary with the state found ('state'), what was done
+            ('action': 'none', 'resume' or 'start'), the seconds per boot
+            phase ('phases'), whether the API server is ready ('ready'), the
+            number of readiness probes, the total seconds and the timed
+            output of minikube ('log'), also kept in self.boot_report
+        """
 
-             # build info message
-            info_message = """
-                  ____________________________________________________________
-                 | I will download kubectl as your kubernetes cli. If you     |
-                 | want to learn more about kubectl, you can visit:           |                 
-                 | https://kubernetes.io/docs/reference/kubectl/overview/     |                                   
-                  ------------------------------------------------------------
-                                                                            
-            """
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
 
-            # print info about graphical interface
-            print (info_message)
+        # start the clock
+        started = time.perf_counter()
+        report = {'state': None, 'action': 'start', 'phases': {}, 'ready': False, 'probes': 0,
+                  'seconds': None, 'log': []}
 
-            # install kubectl
-            install_kc = self.__install_kubectl()
+        # check if the cluster is up already
+        if not force:
 
-            # check if it worked
-            if install_kc:
+            # read the state
+            report['state'], _ = self.__cluster_state()
 
-                # build info message
-                info_message = """
-                                   ___________________________________________
-                                  | Successfully installed Kubectl            |
-                                   -------------------------------------------
-                                                                                
-                """
+            # nothing to do for a running cluster
+            if report['state'] == 'running':
+                report['action'] = 'none'
 
-                # print info about graphical interface
-                print (info_message)
+            # a paused cluster only needs to be resumed
+            elif report['state'] == 'paused':
+                report['action'] = 'resume'
+                self.resume()
+                report['phases']['resume'] = time.perf_counter() - started
 
-            # break function if it didn't work
-            else:
+        # boot the cluster
+        if report['action'] == 'start':
 
-                # raise error
-                raise Exception('I could not install kubectl, check if you have Homebrew installed')
+            # a (re)started cluster may serve docker and the API on a new address
+            self.__invalidate_docker_env()
+            if self.client is not None:
+                self.client.close()
+                self.client = None
 
-        # check if minikube is already installed
-        if self.mk_installed:
+            # time the phases from the output of minikube
+            timer = BootTimer()
+            def on_line(line):
+                timer(line)
+                if log_trace:
+                    print (line)
 
-            # build info message
-            info_message = """
-                                   ___________________________________________
-                                  | Minikube already installed                |
-                                   -------------------------------------------
-                                                                                
-            """
+            # try to start minikube
+            try:
 
-            # print info about graphical interface
-            print (info_message)
+                # start minikube
+                command = str('minikube start --driver=virtualbox --cpus=' + cpus + ' --memory=' + memory)
+                self.__run('start', command, output='discard', on_line=on_line, check=True)
+                timer.exit()
 
-        # if it is not installed
+            # return error if it doesn't work
+            except:
+
+                # update current_status
+                self.current_status = 'crashed'
+
+                # raise error
+                raise Exception('Starting Minikube failed')
+
+            # keep the output
+            report['log'] = timer.log
+
+        # wait for the API server
+        api_started = time.perf_counter()
+        ready_at, report['probes'] = self.__wait_api(ready_timeout)
+        report['ready'] = ready_at is not None
+
+        # time the phases
+        if report['action'] == 'start':
+            report['phases'] = timer.phases(ready_at)
         else:
+            report['phases']['api'] = None if ready_at is None else ready_at - api_started
+        report['seconds'] = time.perf_counter() - started
 
-            # build info message
-            info_message = """
-                  ____________________________________________________________
-                 | I will install Minikube now using brew. If you want to     |
-                 | learn more about Minikube, you can visit:                  |
-                 | https://minikube.sigs.k8s.io/docs/                         |
-                  ------------------------------------------------------------
-                                                                            
-            """
+        # keep the report
+        self.boot_report = report
 
-            # print info about graphical interface
-            print (info_message)
+        # check if the API server serves
+        if not report['ready']:
+
+            # update current_status
+            self.current_status = 'not ready'
+
+            # raise error
+            raise Exception('The Minikube API server was not ready after ' + str(ready_timeout) + ' seconds')
+
+        # update current_status
+        self.current_status = 'running'
 
-            # install minikube
-            install_mk = self.__install_minikube()
+        # return the report
+        return report
+
+    # function to pause minikube
+    def pause(self):
+
+        """
+        Main method to pause the Minikube cluster.
+        This function is a wrapper around the 'minikube pause' shell command.
+        The Kubernetes containers are frozen, so an idle cluster frees its
+        CPU, but the VM keeps running and resume() brings it back in seconds
+        instead of a full boot.
+        Returns
+        -------
+        boolean
+            Returns 'True' if successfully paused, otherwise 'False'
+        """
+
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
+
+        # try to pause minikube, the docker daemon keeps its address
+        try:
 
-            # check if it worked
-            if install_mk:
+            # pause minikube
+            command = str('minikube pause')
+            self.__run('pause', command, output='discard', check=True)
 
-                # build info message
-                info_message = """
-                                   ___________________________________________
-                                  | Successfully installed Minikube           |
-                                   -------------------------------------------
-                                                                                
-                """
+            # update current_status
+            self.current_status = 'paused'
 
-                # print info about graphical interface
-                print (info_message)
+        # return error if it doesn't work
+        except:
 
-            # break function if it didn't work
-            else:
+            # raise error
+            raise Exception('I could not pause minikube')
 
-                # raise error
-                raise Exception('I could not install minikube')
+        # return success
+        return True
 
-        # update current_status
-        self.current_status = 'installed'
-    
-    # function to start minikube
-    def start(self, cpus = '2', memory = '2G', log_trace = False):
+    # function to resume minikube
+    def resume(self):
 
         """
-        Main method to start the Minikube cluster.
-        This function is a python wrapper around the 'minikube start' shell 
-        command. The cluster is sporned and set to run.
-        Parameters
-        ----------
-        cpus : str
-            String to indicate the number of cores used for the cluster
-        memory: str
-            String to indicate the amount of memory allocated to the cluster
+        Main method to resume a paused Minikube cluster.
+        This function is a wrapper around the 'minikube unpause' shell
+        command.
         Returns
         -------
         boolean
-            Returns 'True' if successfully installed, otherwise 'False'
+            Returns 'True' if successfully resumed, otherwise 'False'
         """
 
-        # try to start minikube
-        try:
-
-            # start minikube
-            command = str('minikube start --driver=virtualbox --cpus=' + cpus + ' --memory=' + memory)
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
 
-            # if log_trace is asked for
-            if log_trace:
-
-                # run command with trace
-                subprocess.call(command.split())
-            
-            # if log_trace is not asked for
-            else:
+        # try to unpause minikube
+        try:
 
-                # run command without trace
-                subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # unpause minikube
+            command = str('minikube unpause')
+            self.__run('pause', command, output='discard', check=True)
 
             # update current_status
             self.current_status = 'running'
@@ -581,27 +1043,56 @@ class minipy:
         # return error if it doesn't work
         except:
 
-            # update current_status
-            self.current_status = 'crashed'
-
             # raise error
-            raise Exception('Starting Minikube failed')
+            raise Exception('I could not resume minikube')
+
+        # return success
+        return True
 
     # function to check the status
-    def status(self):
+    def status(self, print_status = True):
 
         """
         Main method to check the status of the cluster.
         This function calls the standard minikube status check. Unlike the 
         self.current_status, this function shows the system output.
+        Parameters
+        ----------
+        print_status : boolean
+            Boolean indicating whether the output of minikube is printed,
+            otherwise the status is returned as a dictionary
+        Returns
+        -------
+        dict
+            Dictionary with the state, the state of host, kubelet, apiserver
+            and kubeconfig, whether the API server answers on /readyz and the
+            report of the last start, if print_status is 'False'
         """
 
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
+
+        # return the status as data
+        if not print_status:
+
+            # read the state
+            state, status = self.__cluster_state()
+
+            # build the report, only a running cluster is worth a probe
+            return {'state': state,
+                    'host': status.get('Host'),
+                    'kubelet': status.get('Kubelet'),
+                    'apiserver': status.get('APIServer'),
+                    'kubeconfig': status.get('Kubeconfig'),
+                    'ready': state == 'running' and self.__probe_ready(),
+                    'boot': self.boot_report}
+
         # try to call status
         try:
 
             # check minikube status
             command = str('minikube status')
-            subprocess.call(command.split())
+            self.__run('status', command, output='echo')
 
         # except
         except:
@@ -610,58 +1101,50 @@ class minipy:
             print ('Minikube cluster is not responding')
 
     # helper function to build dockerfile
-    def __build_dockerfile(self, script_file, requirements_file, port):
+    def __build_dockerfile(self, deployment_name, port, base_image, buildkit):
 
         """
         Private method to build a Dockerfile.
-        This function first builds a Docker file from a python script and 
-        a requirements.txt.
+        This function builds a Docker file for a python script and a 
+        requirements.txt. The files are copied from a minimal build context,
+        so the Dockerfile refers to them by fixed names. It is written to a
+        directory of its own per deployment, never into the working
+        directory.
         Parameters
         ----------
-        script_file : string
-            String with the path to the python script file
-        requirements_file : string
-            String with the path to the requirements file
+        deployment_name : string
+            String with the name of the deployment
         port : string
             String with the port number to expose
+        base_image : string
+            String with the base image, 'full', 'slim' or any image
+        buildkit : boolean
+            Boolean indicating whether BuildKit cache mounts are used
         """
 
         # try to write Dockerfile
         try:
 
-            # Dockerfile path
-            dk_file_path = str(self.wd + '/Dockerfile')
+            # Dockerfile path, one directory per profile and deployment
+            build_dir = os.path.join(self.cache_dir, 'builds', self.profile, deployment_name)
+            dk_file_path = os.path.join(build_dir, 'Dockerfile')
 
-            # open empty Dockerfile
-            command = str('touch ' + dk_file_path)
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            # make sure the directory exists
+            os.makedirs(build_dir, exist_ok=True)
 
-            # ensure that there is no tilde (Docker does not like it)
-            script_file = script_file.replace('~','')
-            requirements_file = requirements_file.replace('~', '')
-            
-            # write content
-            content = """\
-            FROM python:{version}
-            RUN mkdir -p /api
-            COPY {script_file} /api/api.py
-            COPY {requirements_file} /api/requirements.txt
-            RUN python -m pip install -r /api/requirements.txt
-            EXPOSE {port}
-            ENTRYPOINT ["python", "api/api.py"]\
-            """.format(version=self.py_version,
-                    script_file = script_file,
-                    requirements_file = requirements_file,
-                    port = int(port))
-
-            # open Dockerfile
-            file = open(dk_file_path, "w")
-
-            # write content to Dockerfile
-            file.write(content)
-
-            # close connection
-            file.close()
+            # render the content, the files have fixed names in the context
+            content = render_dockerfile(py_version = self.py_version,
+                                        script_file = 'api.py',
+                                        requirements_file = 'requirements.txt',
+                                        port = port,
+                                        base_image = base_image,
+                                        buildkit = buildkit)
+
+            # write to a temporary file and move it into place
+            tmp_path = str(dk_file_path + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp')
+            with open(tmp_path, 'w') as file:
+                file.write(content)
+            os.replace(tmp_path, dk_file_path)
 
             # write file path to self
             self.dk_file_path = dk_file_path
@@ -675,69 +1158,217 @@ class minipy:
             # return False
             return False
 
-    # helper function to build Docker image from Dockerfile
-    def __build_image(self):
+    # helper function to resolve the docker-env of the cluster
+    def __resolve_docker_env(self, refresh = False):
 
         """
-        Private method to build a Docker image from a Dockefile.
-        This function builds a Docker image from a Dockerfile.
+        Private method to resolve the variables that point docker to the
+        daemon inside Minikube.
+        The variables only change when the cluster is restarted, so they are
+        resolved once with 'minikube docker-env' and then kept in memory and
+        on disk, instead of spawning a shell and minikube for every docker
+        call.
+        Parameters
+        ----------
+        refresh : boolean
+            Boolean indicating whether the cached variables should be ignored
+        Returns
+        -------
+        dict
+            Dictionary with the variables, e.g. DOCKER_HOST
         """
 
-        # try to build a Docker image
+        # answer from memory
+        if self.docker_env is not None and not refresh:
+            return self.docker_env
+
+        # define the cache file
+        path = os.path.join(self.cache_dir, 'docker-env', self.profile + '.json')
+
+        # try to read the cache from disk
+        if not refresh:
+            try:
+
+                # read the file
+                with open(path) as file:
+                    entry = json.load(file)
+
+                # take the variables if they are not expired
+                if time.time() - entry.get('resolved_at', 0) < self.cache_ttl and entry.get('env'):
+                    self.docker_env = entry['env']
+                    return self.docker_env
+
+            # handle missing or broken cache files
+            except (OSError, ValueError, AttributeError):
+                pass
+
+        # resolve the variables
+        command = ['minikube', 'docker-env', '--shell', 'none']
+        self.docker_env = parse_docker_env(self.__run('docker-env', command, check=True).stdout.decode('utf-8'))
+
+        # try to write the cache
         try:
 
-            # make sure this is executed in the wd
-            os.chdir(self.wd)
+            # make sure the directory exists
+            os.makedirs(os.path.dirname(path), exist_ok=True)
 
-            # build docker image from file
-            command = str('eval $(minikube -p minikube docker-env) && docker build -t kubipy-image:latest .')
-            os.system(command)
+            # write to a temporary file and move it into place
+            tmp_path = str(path + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp')
+            with open(tmp_path, 'w') as file:
+                json.dump({'env': self.docker_env, 'resolved_at': time.time()}, file, indent=2)
+            os.replace(tmp_path, path)
 
-            # return True
-            return True
+        # a cache that cannot be written is not fatal
+        except OSError:
+            pass
 
-        # handle exceptiom
-        except:
+        # return the variables
+        return self.docker_env
 
-            # return False
-            return False
-        
-    # helper function to create a new deployment
-    def __create_deployment(self, deployment_name):
+    # helper function to forget the docker-env
+    def __invalidate_docker_env(self):
+
+        """
+        Private method to forget the docker-env variables, e.g. because the
+        cluster was restarted.
+        """
+
+        # forget them in memory
+        self.docker_env = None
+
+        # try to remove the cache
+        try:
+            os.remove(os.path.join(self.cache_dir, 'docker-env', self.profile + '.json'))
+        except OSError:
+            pass
+
+    # helper function to run docker against the minikube daemon
+    def __docker(self, operation, args, variables = None, **kwargs):
 
         """
-        Private method to create a deployment.
-        This function creates a deployment on Minikube based on the previously
-        built Docker image.
+        Private method to run a docker command against the docker daemon in
+        Minikube, without a shell.
+        If the daemon cannot be reached with cached variables, they are
+        resolved again and the command is run once more.
         Parameters
         ----------
-        deployment_name : string
-            String with the name of the deployment
+        operation : string
+            String with the operation, a key of self.timeouts
+        args : list
+            List with the arguments, e.g. ['docker', 'image', 'inspect', tag]
+        variables : dict
+            Dictionary with additional environment variables
+        kwargs : dict
+            Further arguments of CommandRunner.run()
+        Returns
+        -------
+        CommandResult
+            Result of the command
+        """
+
+        # define helper to detect an unreachable daemon
+        def unreachable(result):
+            return (result.returncode != 0 and result.stderr is not None
+                    and any(error in result.stderr for error in DOCKER_CONNECTION_ERRORS))
+
+        # retrying with the same variables does not help an unreachable daemon
+        retry_on = kwargs.pop('retry_on', None)
+        kwargs['retry_on'] = lambda result: not unreachable(result) and (retry_on is None or retry_on(result))
+
+        # run with the cached variables
+        env = dict(os.environ, **self.__resolve_docker_env(), **(variables or {}))
+        result = self.__run(operation, args, env=env, **kwargs)
+
+        # a daemon that cannot be reached means the variables are stale
+        if unreachable(result):
+
+            # resolve them again and retry once
+            env = dict(os.environ, **self.__resolve_docker_env(refresh=True), **(variables or {}))
+            result = self.__run(operation, args, env=env, **kwargs)
+
+        # return the result
+        return result
+
+    # helper function to build Docker image from Dockerfile
+    def __build_image(self, script_file, requirements_file, buildkit):
+
+        """
+        Private method to build a Docker image from a Dockefile.
+        This function tags the image with the content digest of the 
+        Dockerfile, the script, the requirements and the Python version. If 
+        an image with that tag already exists in the Minikube docker daemon, 
+        the build is skipped. Otherwise a build context with only the 
+        Dockerfile, the script and the requirements is streamed to the 
+        builder, whatever else sits in the working directory.
+        Parameters
+        ----------
+        script_file : string
+            String with the path to the python script file
+        requirements_file : string
+            String with the path to the requirements file
+        buildkit : boolean
+            Boolean indicating whether the image is built with BuildKit
         """
 
-        # try to create a new deployment
+        # try to build a Docker image
         try:
 
-            # create a new deployment
-            command = str('kubectl run ' + deployment_name + " --image=kubipy-image:latest --image-pull-policy='Never'")
-            os.system(command)
+            # read the Dockerfile
+            with open(self.dk_file_path) as file:
+                dockerfile = file.read()
+
+            # derive the immutable tag from the content
+            digest = image_digest(dockerfile, [script_file, requirements_file], self.py_version)
+            tag = image_tag(digest)
+
+            # check if the image already exists in the minikube docker daemon
+            exists = self.__docker('inspect', ['docker', 'image', 'inspect', tag],
+                                   retry_on=lambda result: b'No such' not in (result.stderr or b'')).returncode
+
+            # build only if it does not exist
+            if exists == 0:
+
+                # remember that the build was skipped
+                self.image_cached = True
+
+            # build it
+            else:
+
+                # assemble the minimal build context
+                context = build_context(dockerfile, {'api.py': script_file,
+                                                     'requirements.txt': requirements_file})
+
+                # build docker image, the context is streamed via stdin
+                variables = {'DOCKER_BUILDKIT': '1' if buildkit else '0'}
+                if self.__docker('build', ['docker', 'build', '-t', tag, '-'], variables=variables,
+                                 input=context, output='inherit').returncode != 0:
+
+                    # return False
+                    return False
+
+                # remember that the image was built
+                self.image_cached = False
+
+            # write the tag to self
+            self.image_tag = tag
 
             # return True
             return True
-        
-        # handle exception
+
+        # handle exceptiom
         except:
 
             # return False
             return False
-
-    # helper function to expose service
-    def __expose_service(self, port, deployment_name):
+        
+    # helper function to apply the deployment and the service
+    def __apply_objects(self, port, deployment_name):
 
         """
-        Private method to expose a deployment.
-        This function exposes the deployment in Minikube to make it accessible
-        from outside the Minikube cluster.
+        Private method to apply the deployment and the service.
+        This function renders both objects and applies them with server-side
+        apply in one call. Existing objects are updated in place, so the pods
+        are rolled over to the new image without an outage.
         Parameters
         ----------
         port : string
@@ -746,21 +1377,35 @@ class minipy:
             String with the name of the deployment
         """
 
-        # try to expose service
-        try:
+        # render the objects
+        objects = [render_deployment(deployment_name, image = self.image_tag, port = port),
+                   render_service(deployment_name, port = port)]
 
-            # expose the service
-            command = str('kubectl expose pod ' + deployment_name + ' --port=' + port + ' --type=NodePort')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+        # apply via the API server
+        if self.backend == 'api':
 
-            # return True
-            return True
-        
-        # handle exception
-        except:
+            # try to apply, both requests share a pooled connection
+            try:
 
-            # return False
-            return False
+                # apply the objects
+                for manifest in objects:
+                    self.__get_client().apply(manifest, field_manager = FIELD_MANAGER)
+
+                # return True
+                return True
+
+            # handle exception
+            except:
+
+                # return False
+                return False
+
+        # apply via kubectl, in a single process
+        command = str('kubectl apply --server-side --force-conflicts --field-manager=' + FIELD_MANAGER + ' -f -')
+        result = self.__run('apply', command, input=json.dumps(render_list(objects)).encode('utf-8'))
+
+        # return if it worked
+        return result.returncode == 0
 
     # helper function to build the url
     def __get_url(self, deployment_name):
@@ -780,7 +1425,7 @@ class minipy:
 
             # expose the service on minikube
             command = str('minikube service ' + deployment_name + ' --url')
-            service_url = subprocess.check_output(command.split())
+            service_url = self.__run('url', command, check=True).stdout
 
             # decode url
             service_url = str(service_url.decode("utf-8")).replace("\n", "")
@@ -800,89 +1445,101 @@ class minipy:
             # return False
             return False
     
-    # helper function to check if service exists
-    def __check_service(self, deployment_name):
+    # helper function to wait until the deployment is ready
+    def __wait_ready(self, deployment_name, timeout):
 
         """
-        Private method to check if service exists.
-        This function checks, if a service already exists on Minikube.
+        Private method to wait until a deployment serves traffic.
+        This function reacts to watch events of the API server instead of 
+        polling. It waits until the rollout of the deployment is complete,
+        i.e. all pods run the new image and are ready, and then until the 
+        service has endpoints. The kubectl backend follows the rollout with
+        'kubectl rollout status' and polls the endpoints with kubectl.
         Parameters
         ----------
         deployment_name : string
             String with the name of the deployment
+        timeout : float
+            Float with the number of seconds to wait at most
         """
 
-        # try to check if service exists
-        try:
-
-            # check for service
-            command = str('kubectl get service ' + deployment_name)
-            exists = subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-
-            # check result
-            if exists == 0:
+        # compute the deadline
+        deadline = time.monotonic() + timeout
 
-                # return True
-                return True
-
-            # if not 0, then False
-            else:
+        # define the condition of a complete rollout
+        def rolled_out(deployment):
+            status = deployment.get('status', {})
+            replicas = deployment.get('spec', {}).get('replicas', 1)
+            return (status.get('observedGeneration', 0) >= deployment['metadata'].get('generation', 0)
+                    and status.get('updatedReplicas', 0) == replicas
+                    and status.get('availableReplicas', 0) == replicas
+                    and status.get('replicas', 0) == replicas)
 
-                # return False
-                return False
-        
-        # if it breaks, it doesn't exist
-        except:
+        # define the condition of a service with endpoints
+        def has_endpoints(endpoints):
+            return any(subset.get('addresses') for subset in endpoints.get('subsets') or [])
 
-            # return False
-            return False
+        # wait through kubectl
+        if self.backend == 'kubectl':
 
-    # helper function to check if deployment exists
-    def __check_deployment(self, deployment_name):
+            # kubectl follows the rollout with a watch and ends the wait itself
+            command = ['kubectl', 'rollout', 'status', 'deployment/' + deployment_name,
+                       '--timeout=' + str(max(int(deadline - time.monotonic()), 1)) + 's']
+            try:
+                result = self.runner.run(self.__scope(command), timeout = max(deadline - time.monotonic(), 1) + 30)
+            except CommandTimeout:
+                result = None
 
-        """
-        Private method to check if deployment exists.
-        This function checks, if a deployment already exists on Minikube.
-        Parameters
-        ----------
-        deployment_name : string
-            String with the name of the deployment
-        """
+            # check if it worked
+            if result is None or result.returncode != 0:
 
-        # try to check if service exists
+                # raise Exception
+                raise Exception('The deployment was not ready after ' + str(timeout) + ' seconds')
+
+            # poll the endpoints of the service with backoff
+            command = ['kubectl', 'get', 'endpoints', deployment_name, '-o', 'json']
+            attempt = 0
+            while True:
+                result = self.__run('get', command)
+                if result.returncode == 0 and has_endpoints(json.loads(result.stdout)):
+                    return
+                delay = backoff_delay(attempt, 0.25, 2)
+                if time.monotonic() + delay > deadline:
+
+                    # raise Exception
+                    raise Exception('The deployment was not ready after ' + str(timeout) + ' seconds')
+                time.sleep(delay)
+                attempt = attempt + 1
+
+        # try to wait
         try:
 
-            # check for service
-            command = str('kubectl get deployment ' + deployment_name)
-            exists = subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
-
-            # check result
-            if exists == 0:
-
-                # return False
-                return True
-            
-            # if not 0, then False
-            else:
+            # wait for the rollout
+            self.__get_client().wait_for('deployments', rolled_out,
+                                         field_selector = 'metadata.name=' + deployment_name,
+                                         timeout = deadline - time.monotonic())
 
-                # return False
-                return False
-        
-        # if it breaks, it doesn't exist
-        except:
+            # wait for the endpoints of the service
+            self.__get_client().wait_for('endpoints', has_endpoints,
+                                         field_selector = 'metadata.name=' + deployment_name,
+                                         timeout = max(deadline - time.monotonic(), 1))
 
-            # return False
-            return False
+        # handle timeouts
+        except TimeoutError:
 
+            # raise Exception
+            raise Exception('The deployment was not ready after ' + str(timeout) + ' seconds')
 
     # function to deploy app
-    def deploy(self, script_file, requirements_file, port, deployment_name = None):
+    def deploy(self, script_file, requirements_file, port, deployment_name = None, base_image = None, buildkit = True,
+               wait = False, timeout = 300):
 
         """
         Main method to deploy APIs to minikube.
         This function first builds a Docker image from a python script and 
         a requirements.txt. This image is then deployed on the minikube
-        cluster.
+        cluster: the deployment and its service are applied declaratively in
+        one call, so redeploying rolls the pods over in place.
         Parameters
         ----------
         script_file : string
@@ -891,8 +1548,29 @@ class minipy:
             String with the path to the requirements file
         port : string
             String with the port number to expose
+        deployment_name : string
+            String with the name of the deployment
+        base_image : string
+            String with the base image: 'full' (default), 'slim' for the 
+            smaller python:<version>-slim, or any other image
+        buildkit : boolean
+            Boolean indicating whether the image is built with BuildKit, which
+            keeps the pip cache between builds
+        wait : boolean
+            Boolean indicating whether to block until the rollout is complete
+            and the service has endpoints
+        timeout : float
+            Float with the number of seconds to wait for readiness
+        Returns
+        -------
+        dict
+            Dictionary with the seconds spent per phase: dockerfile, build,
+            apply, ready, url and total
         """
 
+        # make sure the components this method relies on were checked
+        self.__require('docker', 'kubectl', 'minikube')
+
         # check if deployment name was given
         if deployment_name is None:
 
@@ -921,6 +1599,9 @@ class minipy:
         # check script_file input
         if isinstance(script_file, str):
 
+            # resolve the home directory (Docker does not know the tilde)
+            script_file = os.path.expanduser(script_file)
+
             # try to read in the first line
             try:
 
@@ -959,6 +1640,9 @@ class minipy:
         # check requirements_file input
         if isinstance(requirements_file, str):
 
+            # resolve the home directory (Docker does not know the tilde)
+            requirements_file = os.path.expanduser(requirements_file)
+
             # try to read in the first line
             try:
 
@@ -1014,10 +1698,16 @@ class minipy:
             # raise Exception
             raise Exception('port should be just a string such as "8000"')
 
+        # time every phase
+        timings = {}
+        started = time.perf_counter()
+        phase_started = started
+
         # build Dockerfile
-        built_dk = self.__build_dockerfile(script_file = script_file,
-                                           requirements_file = requirements_file,
-                                           port = port)
+        built_dk = self.__build_dockerfile(deployment_name = deployment_name,
+                                           port = port,
+                                           base_image = base_image,
+                                           buildkit = buildkit)
 
         # check if it worked
         if built_dk:
@@ -1037,12 +1727,31 @@ class minipy:
 
             # raise Exception
             raise Exception('I could not built a Dockerfile')
+
+        # stop the clock of the phase
+        timings['dockerfile'] = time.perf_counter() - phase_started
+        phase_started = time.perf_counter()
         
         # built docker image
-        built_di = self.__build_image()
+        built_di = self.__build_image(script_file = script_file,
+                                      requirements_file = requirements_file,
+                                      buildkit = buildkit)
+
+        # check if the build was skipped
+        if built_di and self.image_cached:
+
+            # build info message
+            info_message = """
+                                   ___________________________________________
+                                  | Docker image unchanged, build skipped     |
+                                   -------------------------------------------
+            """
+
+            # print info message
+            print (info_message)
 
         # check if it worked
-        if built_di:
+        elif built_di:
 
             # build info message
             info_message = """
@@ -1060,25 +1769,20 @@ class minipy:
             # raise Exception
             raise Exception('I could not built a Docker image')
 
-        # check if deployment already exists
-        exists_dp = self.__check_deployment(deployment_name = deployment_name)
+        # stop the clock of the phase
+        timings['build'] = time.perf_counter() - phase_started
+        phase_started = time.perf_counter()
 
-        # delete if exists
-        if exists_dp:
-
-            # delete deployment
-            self.delete_object(deployment = deployment_name)
-
-        # create deployment
-        created_dp = self.__create_deployment(deployment_name = deployment_name)
+        # apply the deployment and the service
+        applied = self.__apply_objects(port, deployment_name = deployment_name)
 
         # check if it worked
-        if created_dp:
+        if applied:
 
             # build info message
             info_message = """
                                    ___________________________________________
-                                  | Successfully created deployment           |
+                                  | Successfully applied deployment & service |
                                    -------------------------------------------
             """
 
@@ -1088,77 +1792,208 @@ class minipy:
         # break the function if it didn't work
         else:
 
-            # raise Exception
-            raise Exception('I could not create a deployment')
+            # raise Exception
+            raise Exception('I could not apply the deployment and the service')
+
+        # stop the clock of the phase
+        timings['apply'] = time.perf_counter() - phase_started
+        phase_started = time.perf_counter()
+
+        # wait until the deployment serves traffic if asked for
+        if wait:
+
+            # wait
+            self.__wait_ready(deployment_name = deployment_name, timeout = timeout)
+
+            # build info message
+            info_message = """
+                                   ___________________________________________
+                                  | Deployment is ready                       |
+                                   -------------------------------------------
+            """
+
+            # print info message
+            print (info_message)
+
+        # stop the clock of the phase
+        timings['ready'] = time.perf_counter() - phase_started
+        phase_started = time.perf_counter()
+
+        # get the service url
+        url_exposed = self.__get_url(deployment_name = deployment_name)
+
+        # check if it worked
+        if url_exposed:
+
+            # info message
+            info_message = """
+                    ____________________________________________________________
+                    | Your deployment is ready and you can access the API via:   |
+                    | {url}                                                      |
+                    ------------------------------------------------------------
+            """.format(url = self.service_url)
+
+            # print message
+            print (info_message)
+
+        # if it didn't work
+        else:
+
+            # raise Exception
+            raise Exception('I could not get the url of the service')
+
+        # stop the clock of the phase and the total
+        timings['url'] = time.perf_counter() - phase_started
+        timings['total'] = time.perf_counter() - started
+
+        # write the timings to self
+        self.deploy_timings = timings
+
+        # return the timings
+        return timings
+
+    # helper function to connect to the API server
+    def __get_client(self):
+
+        """
+        Private method to get the client of the Kubernetes API server.
+        The client is created on first use from the Minikube context of the
+        kubeconfig and then reused, so its pooled connections stay open.
+        Returns
+        -------
+        KubeClient
+            Client of the Minikube API server
+        """
+
+        # create the client once
+        if self.client is None:
+
+            # try to read the kubeconfig
+            try:
+
+                # create the client, a YAML kubeconfig without PyYAML is converted by kubectl through the runner
+                self.client = KubeClient.from_kubeconfig(
+                    context = self.profile, run = lambda command: self.__run('config', command, check=True).stdout)
+
+            # handle exception
+            except Exception as error:
+
+                # raise Exception
+                raise Exception('I could not connect to the Minikube API server: ' + str(error))
+
+        # return the client
+        return self.client
 
-        # check if service already exists
-        exists_sv = self.__check_service(deployment_name = deployment_name)
+    # helper function to list objects as records
+    def __list_records(self, records, namespace):
 
-        # delete if exists
-        if exists_sv:
+        """
+        Private method to fill records with the objects on Minikube.
+        With the 'api' backend the objects are fetched in pages, otherwise
+        with a single 'kubectl get -o json'. Only the fields of the records 
+        are kept.
+        Parameters
+        ----------
+        records : RecordTable
+            Empty records of the kind to list
+        namespace : string
+            String with the namespace
+        Returns
+        -------
+        RecordTable
+            The filled records
+        """
 
-            # delete service
-            self.delete_object(service = deployment_name)
+        # look up the kind
+        kind = records.kind
 
-        # expose service
-        exposed_sv = self.__expose_service(port, deployment_name = deployment_name)
+        # answer from memory if an informer keeps the kind
+        if self.informers is not None and self.informers.serves(kind, namespace):
 
-                # check if it worked
-        if exposed_sv:
+            # add the objects
+            records.extend(self.informers.list(kind))
 
-            # build info message
-            info_message = """
-                                   ___________________________________________
-                                  | Successfully expose                       |
-                                   -------------------------------------------
-            """
+        # list via the API server
+        elif self.backend == 'api':
 
-            # print info message
-            print (info_message)
+            # add page by page
+            for items in self.__get_client().list_pages(kind, namespace = namespace):
+                records.extend(items)
 
-        # break the function if it didn't work
+        # list via kubectl
         else:
 
-            # raise Exception
-            raise Exception('I could not expose the service')
+            # make sure the components this method relies on were checked
+            self.__require('kubectl')
 
-        # get the service url
-        url_exposed = self.__get_url(deployment_name = deployment_name)
+            # get the objects as JSON
+            command = str('kubectl get ' + kind + ' -o json -n ' + namespace)
+            output = self.__run('get', command, check=True).stdout
 
-        # check if it worked
-        if url_exposed:
+            # add the objects
+            records.extend(json.loads(output).get('items', []))
 
-            # info message
-            info_message = """
-                    ____________________________________________________________
-                    | Your deployment is ready and you can access the API via:   |
-                    | {url}                                                      |
-                    ------------------------------------------------------------
-            """.format(url = self.service_url)
+        # return the records
+        return records
 
-            # print message
-            print (info_message)
+    # helper function to delete a single object
+    def __delete_one(self, kind, name):
 
-        # if it didn't work
+        """
+        Private method to delete a single object with the selected backend.
+        Parameters
+        ----------
+        kind : string
+            String with the kind, e.g. 'pod'
+        name : string
+            String with the name of the object
+        """
+
+        # delete via the API server
+        if self.backend == 'api':
+
+            # delete the object
+            self.__get_client().delete(kind, name)
+
+            # print the same message as kubectl
+            print (kind + ' "' + name + '" deleted')
+
+        # delete via kubectl
         else:
 
-            # raise Exception
-            raise Exception('I could not get the url of the service')
+            # delete the object
+            command = str('kubectl delete ' + kind + ' ' + name)
+            self.__run('remove', command, output='echo')
 
     # function to list all deployments
-    def get_deployments(self):
+    def get_deployments(self, fields = None, namespace = 'default', print_table = False):
 
         """
         Main method to get deployments on Minikube
-        This function calls the standard kubectl get deployments command.
+        This function returns the deployments as compact records. Only the given
+        fields are extracted, by default the columns of 'kubectl get deployments'.
+        Parameters
+        ----------
+        fields : list
+            List with the fields to extract, e.g. ['name', 'ready', 'image']
+        namespace : string
+            String with the namespace
+        print_table : boolean
+            Boolean indicating whether the table should be printed as well
+        Returns
+        -------
+        RecordTable
+            Records of the deployments, iterating yields one namedtuple per deployment
         """
 
+        # create the empty records (this also checks the fields)
+        records = RecordTable('deployments', fields)
+
         # try to get deployments
         try:
 
             # get deployments
-            command = str('kubectl get deployments')
-            subprocess.call(command.split())
+            self.__list_records(records, namespace = namespace)
 
         # handle exception
         except:
@@ -1166,20 +2001,44 @@ class minipy:
             # raise Exception
             raise Exception('I could not get the list of deployments')
 
+        # print the table if asked for
+        if print_table:
+
+            # print table
+            print (records.table())
+
+        # return the records
+        return records
+
     # function to list all services
-    def get_services(self):
+    def get_services(self, fields = None, namespace = 'default', print_table = False):
 
         """
         Main method to get services on Minikube
-        This function calls the standard kubectl get services command.
+        This function returns the services as compact records. Only the given
+        fields are extracted, by default the columns of 'kubectl get services'.
+        Parameters
+        ----------
+        fields : list
+            List with the fields to extract, e.g. ['name', 'ports']
+        namespace : string
+            String with the namespace
+        print_table : boolean
+            Boolean indicating whether the table should be printed as well
+        Returns
+        -------
+        RecordTable
+            Records of the services, iterating yields one namedtuple per service
         """
 
+        # create the empty records (this also checks the fields)
+        records = RecordTable('services', fields)
+
         # try to get services
         try:
 
             # get services
-            command = str('kubectl get services')
-            subprocess.call(command.split())
+            self.__list_records(records, namespace = namespace)
 
         # handle exception
         except:
@@ -1187,21 +2046,44 @@ class minipy:
             # raise Exception
             raise Exception('I could not get the list of services')
 
+        # print the table if asked for
+        if print_table:
 
-    # function to list all services
-    def get_pods(self):
+            # print table
+            print (records.table())
+
+        # return the records
+        return records
+
+    # function to list all pods
+    def get_pods(self, fields = None, namespace = 'default', print_table = False):
 
         """
         Main method to get pods on Minikube
-        This function calls the standard kubectl get pods command.
+        This function returns the pods as compact records. Only the given
+        fields are extracted, by default the columns of 'kubectl get pods'.
+        Parameters
+        ----------
+        fields : list
+            List with the fields to extract, e.g. ['name', 'status', 'node']
+        namespace : string
+            String with the namespace
+        print_table : boolean
+            Boolean indicating whether the table should be printed as well
+        Returns
+        -------
+        RecordTable
+            Records of the pods, iterating yields one namedtuple per pod
         """
 
-        # try to get services
+        # create the empty records (this also checks the fields)
+        records = RecordTable('pods', fields)
+
+        # try to get pods
         try:
 
-            # get services
-            command = str('kubectl get pods')
-            subprocess.call(command.split())
+            # get pods
+            self.__list_records(records, namespace = namespace)
 
         # handle exception
         except:
@@ -1209,6 +2091,14 @@ class minipy:
             # raise Exception
             raise Exception('I could not get the list of pods')
 
+        # print the table if asked for
+        if print_table:
+
+            # print table
+            print (records.table())
+
+        # return the records
+        return records
 
     # function to delete pods, services
     def delete_object(self, pod = None, service = None, deployment = None):
@@ -1218,6 +2108,10 @@ class minipy:
         This function calls the standard kubectl delete command.
         """
 
+        # make sure the components this method relies on were checked
+        if self.backend == 'kubectl':
+            self.__require('kubectl')
+
         # check if pod is specified
         if pod is not None:
 
@@ -1225,8 +2119,7 @@ class minipy:
             try:
 
                 # delete pod
-                command = str('kubectl delete pod ' + pod)
-                subprocess.call(command.split())
+                self.__delete_one('pod', pod)
 
             # handle exception
             except:
@@ -1241,8 +2134,7 @@ class minipy:
             try:
 
                 # delete service
-                command = str('kubectl delete service ' + service)
-                subprocess.call(command.split())
+                self.__delete_one('service', service)
 
             # handle excpetion
             except:
@@ -1257,8 +2149,7 @@ class minipy:
             try:
 
                 # delete pod
-                command = str('kubectl delete deployment ' + deployment)
-                subprocess.call(command.split())
+                self.__delete_one('deployment', deployment)
 
             # handle exception
             except:
@@ -1266,6 +2157,475 @@ class minipy:
                 # raise Exception
                 raise Exception('I could not delete your deployment')
 
+    # function to remove everything kubipy deployed
+    def reset(self, namespace = 'default'):
+
+        """
+        Main method to remove every deployment and service deploy() created,
+        found by the label app.kubernetes.io/managed-by=kubipy. Their pods
+        are removed in the background. The cluster and the built images are
+        kept, so it is ready for the next tests within seconds instead of a
+        new cluster.
+        Parameters
+        ----------
+        namespace : string
+            String with the namespace
+        Returns
+        -------
+        int
+            Integer with the number of deleted objects
+        """
+
+        # select the objects of kubipy
+        selector = 'app.kubernetes.io/managed-by=' + FIELD_MANAGER
+
+        # try to delete them
+        try:
+
+            # delete via the API server
+            if self.backend == 'api':
+
+                # delete every labelled object
+                deleted = 0
+                for kind in ('deployments', 'services'):
+                    for item in self.__get_client().list(kind, namespace, label_selector = selector).get('items') or []:
+                        self.__get_client().delete(kind, item['metadata']['name'], namespace)
+                        deleted = deleted + 1
+
+            # delete via kubectl
+            else:
+
+                # make sure the components this method relies on were checked
+                self.__require('kubectl')
+
+                # delete both kinds with a single call
+                command = str('kubectl delete deployments,services -l ' + selector + ' -n ' + namespace + ' -o name')
+                result = self.__run('remove', command, check=True)
+                deleted = len(result.stdout.split())
+
+        # handle exception
+        except Exception as error:
+
+            # raise Exception
+            raise Exception('I could not reset the cluster: ' + str(error))
+
+        # forget the last deployment
+        self.service_url = None
+
+        # return the number of objects
+        return deleted
+
+    # function to stream the logs of a deployment
+    def stream_logs(self, deployment_name, follow = True, since = None, namespace = 'default', buffer_size = 1000,
+                    max_streams = 50):
+
+        """
+        Main method to follow the logs of all pods of a deployment at once.
+        The lines of all pods are merged as they arrive, each one tagged with
+        its pod, container and timestamp. Lines that are not taken yet are
+        not read any further, so memory stays bounded. With the 'api'
+        backend every container is streamed over a connection of its own
+        into a buffer of buffer_size lines, and new pods, e.g. of a rollout,
+        are picked up. Otherwise a single 'kubectl logs' process follows all
+        pods and its pipe is the buffer.
+        Parameters
+        ----------
+        deployment_name : string
+            String with the name of the deployment
+        follow : boolean
+            Boolean indicating whether new lines are followed until the
+            generator is closed, otherwise the logs so far are returned
+        since : int or string
+            Seconds or a duration like '5m' of past logs, None for all
+        namespace : string
+            String with the namespace
+        buffer_size : int
+            Integer with the maximum number of buffered lines
+        max_streams : int
+            Integer with the maximum number of pods kubectl follows at once
+        Returns
+        -------
+        generator
+            Generator yielding LogLine records with pod, container,
+            timestamp and message
+        """
+
+        # take care of special characters, like deploy() does
+        deployment_name = deployment_name.replace('_', '-').replace('/', '-')
+
+        # convert the duration
+        seconds = since_seconds(since)
+
+        # stream via the API server
+        if self.backend == 'api':
+
+            # merge the streams of all pods
+            yield from LogStreams(self.__get_client(), namespace, 'app=' + deployment_name, follow = follow,
+                                  since = seconds, buffer_size = buffer_size)
+            return
+
+        # make sure the components this method relies on were checked
+        self.__require('kubectl')
+
+        # follow all pods with one process
+        command = ['kubectl', 'logs', '-l', 'app=' + deployment_name, '-n', namespace, '--prefix', '--timestamps',
+                   '--max-log-requests=' + str(max_streams)]
+        if follow:
+            command.append('-f')
+        if seconds is not None:
+            command.append('--since=' + str(seconds) + 's')
+
+        # try to stream
+        try:
+
+            # parse line by line
+            for line in self.runner.stream(self.__scope(command), check = True):
+                yield parse_prefixed(line.decode('utf-8', 'replace').rstrip('\r\n'))
+
+        # handle failed commands
+        except CommandError as error:
+
+            # raise Exception
+            raise Exception('I could not stream the logs of ' + deployment_name + ': ' + str(error))
+
+    # function to start the informers
+    def start_informers(self, kinds = ('pods', 'services', 'deployments'), namespace = 'default', timeout = 30):
+
+        """
+        Main method to keep cluster objects current in memory.
+        This function lists the given kinds once and then follows their
+        changes through watch streams. Afterwards get_pods(), get_services(),
+        and get_deployments() are answered from memory. Expired watches
+        recover by listing again. The informers always use the API server
+        directly, whatever the backend is.
+        Parameters
+        ----------
+        kinds : tuple
+            Tuple with the kinds to keep in memory
+        namespace : string
+            String with the namespace
+        timeout : float
+            Float with the number of seconds to wait for the first lists
+        Returns
+        -------
+        InformerCache
+            The running informers, e.g. for informers.pods_for_deployment()
+        """
+
+        # stop informers that are already running
+        self.stop_informers()
+
+        # create the informers
+        informers = InformerCache(self.__get_client(), kinds = kinds, namespace = namespace)
+
+        # start them and wait for the first lists
+        if not informers.start(timeout = timeout):
+
+            # stop them again
+            informers.stop()
+
+            # raise Exception
+            raise Exception('I could not sync the informers with the API server')
+
+        # write the informers to self
+        self.informers = informers
+
+        # return the informers
+        return informers
+
+    # function to stop the informers
+    def stop_informers(self):
+
+        """
+        Main method to stop the informers.
+        Afterwards all queries go to the cluster again.
+        """
+
+        # check if informers are running
+        if self.informers is not None:
+
+            # stop them
+            self.informers.stop()
+
+            # forget them
+            self.informers = None
+
+    # helper function to read the metrics API
+    def __fetch_metrics(self, path):
+
+        """
+        Private method to GET a path of the metrics API, through the API
+        server or through 'kubectl get --raw', which reads the same numbers
+        as 'kubectl top'.
+        Parameters
+        ----------
+        path : string
+            String with the path, e.g. '/apis/metrics.k8s.io/v1beta1/nodes'
+        Returns
+        -------
+        dict
+            Dictionary with the decoded response
+        """
+
+        # ask the API server directly
+        if self.backend == 'api':
+            return self.__get_client().request('GET', path, timeout = self.timeouts['metrics'])
+
+        # or through kubectl
+        return json.loads(self.__run('metrics', ['kubectl', 'get', '--raw', path], check=True).stdout)
+
+    # function to start sampling the metrics
+    def start_metrics(self, interval = 15, capacity = 5760, namespace = 'default', nodes = True, enable = True,
+                      max_series = 200):
+
+        """
+        Main method to sample the CPU and memory usage of pods and nodes.
+        This function reads the metrics API every interval in a background
+        thread and keeps a fixed number of samples per pod and node, the
+        oldest are overwritten. The samples can be queried, summarized with
+        percentiles and exported as CSV or JSON through self.metrics.
+        Parameters
+        ----------
+        interval : float
+            Float with the number of seconds between two samples
+        capacity : int
+            Integer with the number of samples kept per pod and node, one day
+            at 15 seconds by default
+        namespace : string
+            String with the namespace of the pods
+        nodes : boolean
+            Boolean indicating whether the nodes are sampled as well
+        enable : boolean
+            Boolean indicating whether the metrics-server addon is enabled
+            if the metrics API does not answer
+        max_series : int
+            Integer with the maximum number of pods and nodes kept, pods that
+            are gone are dropped after capacity samples anyway
+        Returns
+        -------
+        MetricsSampler
+            The running sampler, e.g. for metrics.summary(kind = 'pod')
+        """
+
+        # make sure the components this method relies on were checked
+        self.__require('kubectl', 'minikube')
+
+        # stop a sampler that is already running
+        self.stop_metrics()
+
+        # check if the metrics API answers
+        try:
+            self.__fetch_metrics('/apis/metrics.k8s.io/v1beta1/nodes')
+
+        # otherwise enable metrics-server, its first numbers follow within a minute
+        except Exception:
+
+            # check if it may be enabled
+            if not enable:
+
+                # raise Exception
+                raise Exception('I could not reach the metrics API, is the metrics-server addon enabled?')
+
+            # try to enable the addon
+            try:
+                self.__run('addons', 'minikube addons enable metrics-server', output='discard', check=True)
+
+            # handle failed commands
+            except CommandError as error:
+
+                # raise Exception
+                raise Exception('I could not enable the metrics-server addon: ' + str(error))
+
+        # create the sampler and start it
+        sampler = MetricsSampler(self.__fetch_metrics, interval = interval, capacity = capacity,
+                                 namespace = namespace, nodes = nodes, max_series = max_series)
+        sampler.start()
+
+        # write the sampler to self
+        self.metrics = sampler
+
+        # return the sampler
+        return sampler
+
+    # function to stop sampling the metrics
+    def stop_metrics(self):
+
+        """
+        Main method to stop sampling the metrics.
+        The samples taken so far stay available in the returned sampler.
+        Returns
+        -------
+        MetricsSampler
+            The stopped sampler, None if none was running
+        """
+
+        # check if a sampler is running
+        sampler = self.metrics
+        if sampler is not None:
+
+            # stop it
+            sampler.stop()
+
+            # forget it
+            self.metrics = None
+
+        # return it
+        return sampler
+
+    # function to load test a deployment
+    def load_test(self, deployment_name, rps = None, concurrency = 10, duration = 10, path = '/', method = 'GET',
+                  body = None, headers = None, timeout = 10, url = None, print_report = False, histogram = False):
+
+        """
+        Main method to put load on a deployed service and measure it.
+        This function sends requests to the service of the deployment over a
+        pool of keep-alive connections and counts every latency in an
+        HdrHistogram-style histogram, exact to three significant digits.
+        With rps the requests are due on a fixed schedule and a slow service
+        shows up in the latencies, without rps every connection sends as
+        fast as it is answered.
+        Parameters
+        ----------
+        deployment_name : string
+            String with the name of the deployment
+        rps : float
+            Float with the requests per second, None for as many as possible
+        concurrency : int
+            Integer with the number of requests in flight at most
+        duration : float
+            Float with the number of seconds requests are started
+        path : string
+            String with the route, e.g. '/predict'
+        method : string
+            String with the HTTP method
+        body : bytes
+            Bytes with the request body, e.g. a JSON document
+        headers : dict
+            Dictionary with further headers, e.g. {'Content-Type':
+            'application/json'}
+        timeout : float
+            Float with the number of seconds a request may take
+        url : string
+            String with the base url, by default the url minikube exposes
+            the service on
+        print_report : boolean
+            Boolean indicating whether the report is printed
+        histogram : boolean
+            Boolean indicating whether the LatencyHistogram of the latencies
+            is added to the report, which then is no plain data any more
+        Returns
+        -------
+        dict
+            Dictionary with requests, errors, error_rate, error_kinds,
+            status_codes, seconds, throughput (successful requests per
+            second), connections, latency and service_time (summaries with
+            p50, p90, p99, p999 in seconds)
+        """
+
+        # take care of special characters, like deploy() does
+        deployment_name = deployment_name.replace('_', '-').replace('/', '-')
+
+        # resolve the url of the service
+        if url is None:
+
+            # make sure the components this method relies on were checked
+            self.__require('minikube')
+
+            # expose the service
+            if not self.__get_url(deployment_name):
+
+                # raise Exception
+                raise Exception('I could not get the url of ' + deployment_name)
+
+            # drop the route placeholder
+            url = self.service_url.replace('/<your_route>', '')
+
+        # define the load
+        target = url.rstrip('/') + '/' + path.lstrip('/')
+        load = lambda: asyncio.run(run_load(target, rps = rps, concurrency = concurrency, duration = duration,
+                                            method = method, body = body, headers = headers, timeout = timeout,
+                                            histogram = histogram))
+
+        # check if an event loop runs here, e.g. in a notebook
+        try:
+            asyncio.get_running_loop()
+            in_loop = True
+        except RuntimeError:
+            in_loop = False
+
+        # run it, in a thread of its own next to a running loop
+        if in_loop:
+            with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as executor:
+                report = executor.submit(load).result()
+        else:
+            report = load()
+
+        # print the report
+        if print_report:
+
+            # define the report
+            latency = report['latency']
+            info_message = """
+            Load test of {url}
+            requests: {requests} in {seconds:.1f}s, {throughput:.1f}/s, {error_rate:.2%} errors
+            latency:  p50 {p50:.1f}ms, p99 {p99:.1f}ms, p999 {p999:.1f}ms, max {max:.1f}ms
+            """.format(url = target, requests = report['requests'], seconds = report['seconds'],
+                       throughput = report['throughput'], error_rate = report['error_rate'],
+                       **{name: (latency[name] or 0) * 1000 for name in ('p50', 'p99', 'p999', 'max')})
+
+            # print report
+            print (info_message)
+
+        # return the report
+        return report
+
+    # function to get the command statistics
+    def stats(self):
+
+        """
+        Main method to get the statistics of all external commands.
+        Every kubectl, minikube, docker and brew call runs through 
+        self.runner, which records its wall time, exit code and output size.
+        Returns
+        -------
+        dict
+            Dictionary with one entry per command, e.g. 'kubectl get', 
+            holding count, failures, total/p50/p95/max seconds and the output
+            bytes, slowest in total first
+        """
+
+        # return the statistics
+        return self.runner.stats()
+
+    # function to add a command hook
+    def add_command_hook(self, hook):
+
+        """
+        Main method to register a function that sees every external command.
+        Parameters
+        ----------
+        hook : function
+            Function called with the CommandResult of every command, e.g. to
+            forward the timings to a metrics system
+        """
+
+        # add the hook
+        self.runner.hooks.append(hook)
+
+    # function to cancel running commands
+    def cancel(self):
+
+        """
+        Main method to cancel every running external command.
+        This function kills the process groups of all running kubectl, 
+        minikube, docker and brew calls, e.g. from a signal handler or another
+        thread, so a wedged call fails right away instead of blocking. New
+        commands are refused until self.runner.reset_cancel() is called.
+        """
+
+        # cancel the commands
+        self.runner.cancel()
+
     # function to start minikube dashboard
     def dashboard(self):
 
@@ -1276,12 +2636,15 @@ class minipy:
         log.
         """
 
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
+
         # try to start minikube dashboard
         try:
 
             # start dashboard
             command = str('minikube dashboard')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            self.__run('dashboard', command, output='discard')
 
         # return error if it doesn't work
         except:
@@ -1301,13 +2664,19 @@ class minipy:
         boolean
             Returns 'True' if successfully installed, otherwise 'False'
         """
+
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
+
+        # the docker-env of this session ends with the cluster
+        self.__invalidate_docker_env()
         
         # try to stop minikube
         try:
 
             # stop minikube
             command = str('minikube stop')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            self.__run('stop', command, output='discard')
 
             # update current_status
             self.current_status = 'stopped'
@@ -1321,6 +2690,46 @@ class minipy:
             # raise error
             raise Exception('I could not stop minikube')
 
+    # function to delete the cluster only
+    def delete_cluster(self):
+
+        """
+        Main method to delete the cluster of this profile.
+        Unlike delete(), all components stay installed.
+        Returns
+        -------
+        boolean
+            Returns 'True' if successfully deleted, otherwise 'False'
+        """
+
+        # make sure the components this method relies on were checked
+        self.__require('minikube')
+
+        # the docker-env and the client end with the cluster
+        self.__invalidate_docker_env()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+        # try to delete the cluster
+        try:
+
+            # delete the profile
+            command = str('minikube delete')
+            self.__run('delete', command, output='discard', check=True)
+
+            # update current_status
+            self.current_status = 'deleted'
+
+        # return error if it doesn't work
+        except:
+
+            # raise error
+            raise Exception('I could not delete the cluster ' + self.profile)
+
+        # return success
+        return True
+
     # function to delete minikube
     def delete(self, docker = None, kubectl = None, virtualbox = None):
 
@@ -1337,6 +2746,9 @@ class minipy:
             
         """
 
+        # make sure the components this method relies on were checked
+        self.__require('virtualbox', 'kubectl', 'minikube', 'docker')
+
         # check if user provided input
         if docker is None:
 
@@ -1405,11 +2817,11 @@ class minipy:
 
             # stop minikube
             command = str('minikube stop')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            self.__run('delete', command, output='discard')
 
             # delete minikube
             command = str('minikube delete')
-            subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            self.__run('delete', command, output='discard')
 
             # check if docker should also be deleted
             if docker:
@@ -1419,7 +2831,7 @@ class minipy:
                 
                     # delete docker
                     command = str('/Applications/Docker.app/Contents/MacOS/Docker --uninstall')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
 
                     # build info message
                     info_message = """
@@ -1460,21 +2872,21 @@ class minipy:
                 
                     # delete all remittant files
                     command = str('rm -rf ~/.kube ~/.minikube')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str('rm -rf /usr/local/bin/localkube /usr/local/bin/minikube')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str('rm -rf /usr/local/bin/kubectl')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str("launchctl stop '*kubelet*.mount'")
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str('launchctl stop localkube.service')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str('rm -rf /etc/kubernetes/')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str('rm -rf /usr/local/Cellar/minikube')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
                     command = str('rm -rf /usr/local/Cellar/kubernetes-cli')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    self.__run('delete', command, output='discard')
 
                     # build info message
                     info_message = """
@@ -1514,8 +2926,8 @@ class minipy:
                 try:
 
                     # uninstall VirtualBox
-                    command = str('brew cask uninstall virtualbox --force')
-                    subprocess.call(command.split(), stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+                    command = str('brew uninstall --cask --force virtualbox')
+                    self.__run('delete', command, output='discard')
 
                     # build info message
                     info_message = """
@@ -1556,6 +2968,18 @@ class minipy:
                 # print info about graphical interface
                 print (info_message)
 
+            # the installed components changed, so drop the cache
+            self.__invalidate_tool_cache()
+
+            # the checkpoints of the installation do not hold anymore
+            try:
+                os.remove(self.install_state_path)
+            except OSError:
+                pass
+
+            # the cluster is gone and with it its docker daemon
+            self.__invalidate_docker_env()
+
             # update current_status
             self.current_status = 'deleted'
 
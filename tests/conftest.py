@@ -0,0 +1,90 @@
+"""
+conftest.py contains the local HTTP stand-ins the tests run against, so
+neither a cluster nor a deployed service is needed.
+"""
+
+# import libs
+import http.server
+import threading
+import pytest
+import sys
+import os
+
+# make the package importable from a checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# setup class
+class StubServer:
+
+    # describe class
+    def __init__(self, handle, protocol_version = 'HTTP/1.1'):
+
+        """
+        Class to serve a handle function on a free local port in a thread.
+        Parameters
+        ----------
+        handle : function
+            Function called with the request handler of every request
+        protocol_version : string
+            String with the HTTP version the server answers with
+        """
+
+        # define the handler, it counts the connections it serves
+        stub = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def setup(self):
+                super().setup()
+                stub.connections = stub.connections + 1
+            def do_GET(self):
+                stub.requests.append(self.path)
+                handle(self)
+            do_PATCH = do_DELETE = do_GET
+            def log_message(self, *args):
+                pass
+        Handler.protocol_version = protocol_version
+
+        # define the slots
+        self.connections = 0
+        self.requests = []
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:' + str(self.server.server_port)
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    # function to stop the server
+    def close(self):
+
+        # stop serving
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# helper function to answer a request
+def respond(handler, body, status = 200, headers = None):
+
+    """
+    Function to answer a request in one write, so Nagle's algorithm does not
+    delay the body.
+    """
+
+    # build the response
+    lines = ['HTTP/1.1 ' + str(status) + ' OK' if handler.protocol_version == 'HTTP/1.1' else
+             'HTTP/1.0 ' + str(status) + ' OK', 'Content-Length: ' + str(len(body))]
+    lines.extend(name + ': ' + value for name, value in (headers or {}).items())
+    handler.wfile.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+    handler.wfile.flush()
+
+
+# fixture to start stand-ins
+@pytest.fixture
+def stub_server():
+
+    # start servers on demand and stop them after the test
+    servers = []
+    def start(handle, protocol_version = 'HTTP/1.1'):
+        servers.append(StubServer(handle, protocol_version))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
@@ -0,0 +1,103 @@
+"""
+test_artifacts.py checks ArtifactCache and the cached fetch of components in
+a temporary directory.
+"""
+
+# import libs
+import hashlib
+import types
+import os
+
+# import modules
+from kubipy.artifacts import ArtifactCache
+from kubipy.install import fetch_cached
+
+
+# helper function to write a file
+def write(path, content):
+
+    # write the bytes and return the path
+    path.write_bytes(content)
+    return str(path)
+
+
+# test storing and restoring
+def test_store_and_restore_by_digest(tmp_path):
+
+    # store the same content under two names
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    content = b'installer' * 1000
+    digest = cache.store('docker/Docker.dmg', write(tmp_path / 'a', content))
+    assert cache.store('docker/Docker-copy.dmg', write(tmp_path / 'b', content)) == digest
+
+    # it is kept once under its digest
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert os.listdir(str(tmp_path / 'cache' / 'sha256')) == [digest]
+    assert 'docker/Docker.dmg' in cache
+    assert 'kubectl/kubectl' not in cache
+    assert [entry['size'] for entry in cache.entries()] == [len(content), len(content)]
+
+    # it is restored with the same content
+    assert cache.restore('docker/Docker.dmg', str(tmp_path / 'restored'))
+    assert (tmp_path / 'restored').read_bytes() == content
+    assert not cache.restore('kubectl/kubectl', str(tmp_path / 'missing'))
+
+
+# test the verification of blobs
+def test_restore_drops_corrupt_blobs(tmp_path):
+
+    # store a file and corrupt its blob
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    digest = cache.store('minikube/minikube', write(tmp_path / 'a', b'minikube'))
+    with open(cache.blob_path(digest), 'wb') as file:
+        file.write(b'minikubf')
+
+    # the restore fails, leaves nothing behind and forgets the blob
+    assert not cache.restore('minikube/minikube', str(tmp_path / 'restored'))
+    assert not (tmp_path / 'restored').exists()
+    assert not os.path.exists(cache.blob_path(digest))
+    assert cache.lookup('minikube/minikube') is None
+
+
+# test pruning
+def test_prune_removes_unreferenced_blobs(tmp_path):
+
+    # store two files and drop the index entry of one
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    kept = cache.store('kubectl/kubectl', write(tmp_path / 'a', b'kubectl'))
+    dropped = cache.store('helm/helm', write(tmp_path / 'b', b'helm 3'))
+    os.remove(str(tmp_path / 'cache' / 'index' / 'helm_helm.json'))
+
+    # only the unreferenced blob goes
+    assert cache.prune() == len(b'helm 3')
+    assert os.path.exists(cache.blob_path(kept))
+    assert not os.path.exists(cache.blob_path(dropped))
+    assert cache.prune() == 0
+    assert ArtifactCache(str(tmp_path / 'empty')).prune() == 0
+
+
+# test the cached fetch of a component
+def test_fetch_cached_downloads_once(tmp_path):
+
+    # stand in for Homebrew, the fetch writes the download into its cache
+    download = tmp_path / 'brew' / 'kubernetes-cli--1.30.0.tar.gz'
+    download.parent.mkdir()
+    commands = []
+    def run(operation, command):
+        commands.append(operation)
+        if operation == 'fetch' and 'brew --cache' not in command:
+            download.write_bytes(b'kubectl 1.30.0')
+        return types.SimpleNamespace(stdout = str(download).encode('utf-8') + b'\n')
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+
+    # the first fetch downloads and stores it
+    assert not fetch_cached('kubectl', run, cache)
+    assert 'kubectl/kubernetes-cli--1.30.0.tar.gz' in cache
+    assert len(commands) == 2
+
+    # the next one seeds the Homebrew cache without a download
+    download.unlink()
+    commands.clear()
+    assert fetch_cached('kubectl', run, cache)
+    assert download.read_bytes() == b'kubectl 1.30.0'
+    assert len(commands) == 1
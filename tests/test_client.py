@@ -0,0 +1,146 @@
+"""
+test_client.py checks KubeClient against a local stand-in of the API server.
+"""
+
+# import libs
+import urllib.parse
+import json
+import time
+import pytest
+
+# import modules
+from kubipy.client import KubeClient
+from conftest import respond
+
+
+# helper function to read the query of a request
+def query(handler):
+
+    # parse the query string
+    return dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(handler.path).query))
+
+
+# test the connection reuse
+def test_request_reuses_connections(stub_server):
+
+    # answer every request on the same connection
+    server = stub_server(lambda handler: respond(handler, b'{"kind": "PodList", "items": []}'))
+    client = KubeClient(server.url)
+
+    # send several requests one after another
+    for _ in range(5):
+        assert client.request('GET', '/api/v1/namespaces/default/pods') == {'kind': 'PodList', 'items': []}
+
+    # one connection served all of them
+    assert server.connections == 1
+    assert len(server.requests) == 5
+
+
+# test the reconnect after the server closed an idle connection
+def test_request_reconnects_after_server_close(stub_server):
+
+    # close the connection after every answer, without telling the client
+    def handle(handler):
+        respond(handler, b'{}')
+        handler.close_connection = True
+    server = stub_server(handle)
+    client = KubeClient(server.url)
+
+    # the stale pooled connection is replaced transparently
+    for _ in range(3):
+        assert client.request('GET', '/readyz') == {}
+        time.sleep(0.05)
+
+    # every request got a connection of its own
+    assert server.connections == 3
+
+
+# test the restored timeout of pooled connections
+def test_request_timeout_does_not_stick(stub_server):
+
+    # answer right away
+    server = stub_server(lambda handler: respond(handler, b'{}'))
+    client = KubeClient(server.url, timeout = 30)
+
+    # a short timeout for one request
+    client.request('GET', '/readyz', timeout = 0.5)
+
+    # the pooled connection is back to the timeout of the client
+    connection = client._KubeClient__idle.get_nowait()
+    assert connection.sock.gettimeout() == 30
+
+
+# test the continue tokens of paged lists
+def test_list_pages_follows_continue_tokens(stub_server):
+
+    # serve three pages of two pods
+    def handle(handler):
+        token = int(query(handler).get('continue') or 0)
+        page = {'items': [{'metadata': {'name': 'pod-' + str(token * 2 + index)}} for index in range(2)],
+                'metadata': {'continue': str(token + 1) if token < 2 else ''}}
+        respond(handler, json.dumps(page).encode('utf-8'))
+    server = stub_server(handle)
+    client = KubeClient(server.url)
+
+    # read the pages
+    pages = list(client.list_pages('pods', limit = 2))
+
+    # all pages arrived in order, with the limit and the tokens
+    assert [[pod['metadata']['name'] for pod in page] for page in pages] == \
+           [['pod-0', 'pod-1'], ['pod-2', 'pod-3'], ['pod-4', 'pod-5']]
+    queries = [dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(path).query)) for path in server.requests]
+    assert [params.get('continue') for params in queries] == [None, '1', '2']
+    assert all(params['limit'] == '2' for params in queries)
+
+
+# helper function to answer a watch
+def watch(events, hold):
+
+    """
+    Function to build a handler that streams watch events and then holds the
+    connection open for a while.
+    """
+
+    # stream the events until the connection is closed
+    def handle(handler):
+        handler.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n\r\n')
+        for event in events:
+            handler.wfile.write(json.dumps(event).encode('utf-8') + b'\n')
+        handler.wfile.flush()
+        time.sleep(min(hold, float(query(handler).get('timeoutSeconds', hold))))
+        handler.close_connection = True
+    return handle
+
+
+# test the watch of wait_for
+def test_wait_for_returns_matching_object(stub_server):
+
+    # stream a change that makes the deployment ready
+    events = [{'type': 'ADDED', 'object': {'metadata': {'name': 'api'}, 'status': {'readyReplicas': 0}}},
+              {'type': 'MODIFIED', 'object': {'metadata': {'name': 'api'}, 'status': {'readyReplicas': 1}}}]
+    server = stub_server(watch(events, 5))
+    client = KubeClient(server.url)
+
+    # wait for the ready deployment
+    deployment = client.wait_for('deployments', lambda item: item['status']['readyReplicas'] > 0, timeout = 5)
+
+    # the second event matched
+    assert deployment['status']['readyReplicas'] == 1
+    assert 'watch=1' in server.requests[0]
+
+
+# test the timeout of wait_for
+def test_wait_for_times_out(stub_server):
+
+    # stream an object that never becomes ready
+    events = [{'type': 'ADDED', 'object': {'metadata': {'name': 'api'}, 'status': {'readyReplicas': 0}}}]
+    server = stub_server(watch(events, 10))
+    client = KubeClient(server.url)
+
+    # wait longer than the timeout allows
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        client.wait_for('deployments', lambda item: item['status']['readyReplicas'] > 0, timeout = 1.5)
+
+    # it gave up around the deadline
+    assert 1.4 <= time.monotonic() - started < 4
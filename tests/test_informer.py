@@ -0,0 +1,67 @@
+"""
+test_informer.py checks InformerCache against a local stand-in of the API
+server whose watch can be made to fail.
+"""
+
+# import libs
+import json
+import time
+
+# import modules
+from kubipy.client import KubeClient
+from kubipy.informer import InformerCache
+from conftest import respond
+
+
+# helper function to wait for a condition
+def eventually(condition, timeout = 5):
+
+    # poll until the condition holds or the time is up
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+# test the fallback while the watch fails
+def test_serves_only_while_the_watch_runs(stub_server):
+
+    # list one pod, hold every watch briefly or fail it
+    state = {'fail': False}
+    def handle(handler):
+        if 'watch=1' not in handler.path:
+            pods = {'items': [{'metadata': {'name': 'api-1'}}], 'metadata': {'resourceVersion': '1'}}
+            respond(handler, json.dumps(pods).encode('utf-8'))
+        elif state['fail']:
+            respond(handler, b'{"reason": "InternalError"}', status = 500)
+        else:
+            handler.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n')
+            handler.wfile.flush()
+            time.sleep(0.1)
+            handler.close_connection = True
+    server = stub_server(handle)
+    cache = InformerCache(KubeClient(server.url), kinds = ('pods',))
+
+    # try to follow the pods
+    try:
+
+        # the synced informer answers from memory
+        assert cache.start(timeout = 5)
+        assert cache.serves('pods')
+        assert [pod['metadata']['name'] for pod in cache.list('pods')] == ['api-1']
+
+        # a failing watch makes the kind fall back to live lists
+        state['fail'] = True
+        assert eventually(lambda: not cache.serves('pods'))
+        assert cache.informers['pods'].is_synced()
+
+        # a running watch makes it current again, without a second list
+        state['fail'] = False
+        assert eventually(lambda: cache.serves('pods'))
+        assert cache.informers['pods'].relists == 1
+
+    # stop the informer
+    finally:
+        cache.stop()
@@ -0,0 +1,145 @@
+"""
+test_install.py checks the install steps and their checkpoints without
+running Homebrew.
+"""
+
+# import libs
+import threading
+import time
+import os
+import pytest
+
+# import modules
+from kubipy.install import Step, InstallState, check_steps, run_steps
+
+
+# helper function to build steps that record their runs
+def recording_steps(runs, fail = ()):
+
+    """
+    Function to build the steps of two components, kubectl depending on
+    docker, whose actions record their names and fail if asked to.
+    """
+
+    # define the action of a step
+    def action(name):
+        def execute():
+            runs.append(name)
+            if name in fail:
+                raise Exception(name + ' failed')
+        return execute
+
+    # build the graph
+    return [Step('docker:fetch', action('docker:fetch')),
+            Step('docker:install', action('docker:install'), requires = ['docker:fetch'], lock = 'brew'),
+            Step('kubectl:fetch', action('kubectl:fetch')),
+            Step('kubectl:install', action('kubectl:install'), requires = ['kubectl:fetch', 'docker:install'],
+                 lock = 'brew')]
+
+
+# test the check of the graph
+def test_check_steps_finds_cycles_and_unknown_requirements():
+
+    # a cycle over two steps
+    steps = [Step('a:fetch', None, requires = ['b:fetch']), Step('b:fetch', None, requires = ['a:fetch']),
+             Step('c:fetch', None)]
+    with pytest.raises(Exception, match = 'cycle: a:fetch, b:fetch'):
+        check_steps(steps)
+
+    # a requirement that is not planned
+    with pytest.raises(Exception, match = 'unknown steps: b:install'):
+        check_steps([Step('a:install', None, requires = ['b:install'])])
+
+    # a graph without cycles passes
+    check_steps(recording_steps([]))
+
+
+# test the order and the failures
+def test_run_steps_skips_the_dependents_of_failed_steps():
+
+    # fail the install of docker
+    runs = []
+    results = run_steps(recording_steps(runs, fail = ('docker:install',)))
+
+    # the independent fetch ran, the dependent install did not
+    assert results['docker:install']['status'] == 'failed'
+    assert str(results['docker:install']['error']) == 'docker:install failed'
+    assert results['kubectl:fetch']['status'] == 'done'
+    assert results['kubectl:install']['status'] == 'skipped'
+    assert 'kubectl:install' not in runs
+    assert runs.index('docker:fetch') < runs.index('docker:install')
+
+
+# test the checkpoint and the resume
+def test_run_steps_resumes_from_the_checkpoint(tmp_path):
+
+    # checkpoint every finished step, the install of kubectl fails
+    path = str(tmp_path / 'state' / 'install-state.json')
+    state = InstallState(path)
+    def checkpoint(step, event, result):
+        if event == 'done':
+            state.mark_step(step.name)
+    runs = []
+    run_steps(recording_steps(runs, fail = ('kubectl:install',)), on_event = checkpoint)
+
+    # the checkpoint survives a new process
+    state = InstallState(path)
+    completed = state.completed_steps('docker') | state.completed_steps('kubectl')
+    assert completed == {'docker:fetch', 'docker:install', 'kubectl:fetch'}
+
+    # the next run only does the failed step
+    runs, events = [], []
+    results = run_steps(recording_steps(runs), completed = completed,
+                        on_event = lambda step, event, result: events.append((step.name, event)))
+    assert runs == ['kubectl:install']
+    assert all(result['status'] == 'done' for result in results.values())
+    assert ('docker:install', 'resumed') in events
+
+    # old checkpoints are not trusted, forgotten ones are gone
+    assert state.completed_steps('docker', max_age = 0) == set()
+    state.forget('docker')
+    assert InstallState(path).completed_steps('docker') == set()
+    assert InstallState(path).completed_steps('kubectl') == {'kubectl:fetch'}
+
+
+# test the lock of the installs
+def test_run_steps_serializes_steps_with_a_lock():
+
+    # count the steps holding the lock at once
+    holding, most = [0], [0]
+    guard = threading.Lock()
+    def action():
+        with guard:
+            holding[0] = holding[0] + 1
+            most[0] = max(most[0], holding[0])
+        time.sleep(0.05)
+        with guard:
+            holding[0] = holding[0] - 1
+
+    # run four installs that could all run at once
+    run_steps([Step(name + ':install', action, lock = 'brew') for name in 'abcd'], max_workers = 4)
+
+    # only one held the lock at a time
+    assert most[0] == 1
+
+
+# test the verification of components
+def test_verify_component_checks_the_executable(tmp_path):
+
+    # record an executable
+    executable = tmp_path / 'kubectl'
+    executable.write_bytes(b'#!/bin/sh\necho v1\n')
+    state = InstallState(str(tmp_path / 'install-state.json'))
+    state.record_component('kubectl', str(executable), 'v1')
+    assert state.verify_component('kubectl')
+
+    # a touched but unchanged executable is still trusted
+    os.utime(executable, ns = (0, 0))
+    assert state.verify_component('kubectl')
+
+    # a changed or missing one is not
+    executable.write_bytes(b'#!/bin/sh\necho v2\n')
+    assert not state.verify_component('kubectl')
+    executable.unlink()
+    assert not state.verify_component('kubectl')
+    assert not state.verify_component('minikube')
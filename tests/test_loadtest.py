@@ -0,0 +1,129 @@
+"""
+test_loadtest.py checks the load generator and its histogram against local
+HTTP stand-ins.
+"""
+
+# import libs
+import asyncio
+import random
+import json
+import math
+
+# import modules
+from kubipy.loadtest import LatencyHistogram, run_load
+from conftest import respond
+
+
+# helper function to compute an exact percentile
+def exact_percentile(values, percent):
+
+    # nearest rank on the sorted values
+    return values[max(int(math.ceil(percent / 100 * len(values))), 1) - 1]
+
+
+# test the percentiles of the histogram
+def test_histogram_percentiles_match_exact_values():
+
+    # record latencies from a microsecond to seconds
+    generator = random.Random(7)
+    values = sorted(generator.lognormvariate(math.log(0.02), 1.5) for _ in range(50000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    # every percentile is exact to three significant digits
+    for percent in (50, 90, 99, 99.9):
+        exact = exact_percentile(values, percent)
+        assert abs(histogram.percentile(percent) - exact) <= exact * 1e-3 + 1e-6
+
+    # the extremes and the mean are exact
+    assert histogram.count == len(values)
+    assert histogram.min == values[0]
+    assert histogram.max == values[-1]
+    assert math.isclose(histogram.mean, sum(values) / len(values))
+
+
+# test merging histograms
+def test_histogram_merge_adds_counts():
+
+    # split the values over two histograms
+    first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for index in range(1, 1001):
+        (first if index % 2 else second).record(index / 1000)
+        both.record(index / 1000)
+    first.merge(second)
+
+    # the merged histogram equals the one that saw all values
+    assert first.count == both.count
+    for name, value in both.summary().items():
+        assert math.isclose(first.summary()[name], value)
+
+
+# test a keep-alive server
+def test_run_load_reuses_keep_alive_connections(stub_server):
+
+    # answer every request on a persistent connection
+    server = stub_server(lambda handler: respond(handler, b'{"ok": true}'))
+
+    # put a fixed rate on it
+    report = asyncio.run(run_load(server.url + '/predict', rps = 100, concurrency = 4, duration = 1))
+
+    # every request succeeded over at most one connection per worker
+    assert report['requests'] == 100
+    assert report['errors'] == 0
+    assert report['status_codes'] == {200: 100}
+    assert report['connections'] <= 4
+    assert server.connections == report['connections']
+    assert set(server.requests) == {'/predict'}
+    assert report['latency']['count'] == 100
+    assert report['latency']['p50'] <= report['latency']['p999'] <= report['latency']['max']
+    assert 'histogram' not in report
+    json.dumps(report)
+
+
+# test an HTTP/1.0 server
+def test_run_load_handles_http10_server(stub_server):
+
+    # answer with HTTP/1.0, which closes the connection after every response
+    server = stub_server(lambda handler: respond(handler, b'ok'), protocol_version = 'HTTP/1.0')
+
+    # put a fixed rate on it
+    report = asyncio.run(run_load(server.url, rps = 50, concurrency = 2, duration = 1))
+
+    # no connection was reused, so no request failed
+    assert report['requests'] == 50
+    assert report['errors'] == 0
+    assert report['connections'] == 50
+
+
+# test a server that closes idle connections
+def test_run_load_replaces_connections_closed_by_server(stub_server):
+
+    # close the connection after every response without telling the client
+    def handle(handler):
+        respond(handler, b'ok')
+        handler.close_connection = True
+    server = stub_server(handle)
+
+    # put a fixed rate on it
+    report = asyncio.run(run_load(server.url, rps = 50, concurrency = 2, duration = 1))
+
+    # stale connections were replaced instead of counted as errors
+    assert report['requests'] == 50
+    assert report['errors'] == 0
+
+
+# test the error accounting
+def test_run_load_counts_errors(stub_server):
+
+    # fail every request
+    server = stub_server(lambda handler: respond(handler, b'no', status = 500))
+
+    # put a fixed rate on it
+    report = asyncio.run(run_load(server.url, rps = 20, concurrency = 2, duration = 0.5))
+
+    # every request counts as an error
+    assert report['requests'] == 10
+    assert report['error_rate'] == 1.0
+    assert report['error_kinds'] == {'HTTP 500': 10}
+    assert report['throughput'] == 0.0
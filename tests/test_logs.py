@@ -0,0 +1,64 @@
+"""
+test_logs.py checks LogStreams against a local stand-in of the API server
+whose log streams break off.
+"""
+
+# import libs
+import urllib.parse
+import threading
+import json
+
+# import modules
+from kubipy.client import KubeClient
+from kubipy.logs import LogStreams
+from conftest import respond
+
+# define the pod whose logs are followed
+POD = {'metadata': {'name': 'api-1'}, 'status': {'phase': 'Running'}, 'spec': {'containers': [{'name': 'api'}]}}
+
+# define the log of the pod, the stream breaks off after the second line
+LOG = ['2024-01-01T00:00:01.5Z first', '2024-01-01T00:00:02.25Z second',
+       '2024-01-01T00:00:02.25Z same time', '2024-01-01T00:00:03Z third']
+
+
+# test the resume of broken streams and failed looks for pods
+def test_streams_resume_without_losing_or_repeating_lines(stub_server):
+
+    # answer the lists, the second one fails, and the logs since the asked time
+    lists, logs = [], []
+    def handle(handler):
+        if '/log' not in handler.path:
+            lists.append(handler.path)
+            if len(lists) == 2:
+                respond(handler, b'{"reason": "InternalError"}', status = 500)
+            else:
+                respond(handler, json.dumps({'items': [POD]}).encode('utf-8'))
+            return
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(handler.path).query))
+        logs.append(params)
+        since = params.get('sinceTime', '')[:19]
+        lines = LOG[:2] if len(logs) == 1 else [line for line in LOG if line[:19] >= since]
+        handler.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nConnection: close\r\n\r\n')
+        handler.wfile.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+        handler.wfile.flush()
+        handler.close_connection = True
+    server = stub_server(handle)
+    streams = LogStreams(KubeClient(server.url), 'default', 'app=api', refresh = 0.1)
+
+    # read four lines in a thread, so a bug cannot hang the test
+    lines = []
+    def consume():
+        for line in streams:
+            lines.append(line)
+            if len(lines) == 4:
+                break
+    consumer = threading.Thread(target = consume, daemon = True)
+    consumer.start()
+    consumer.join(10)
+    streams.stop()
+
+    # the failed list did not end the stream, it resumed at the last line
+    assert len(lists) >= 3
+    assert logs[1]['sinceTime'] == '2024-01-01T00:00:02.25Z'
+    assert [line.message for line in lines] == ['first', 'second', 'same time', 'third']
+    assert {(line.pod, line.container) for line in lines} == {('api-1', 'api')}
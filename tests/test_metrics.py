@@ -0,0 +1,153 @@
+"""
+test_metrics.py checks RingSeries and MetricsSampler with a stand-in of the
+metrics-server.
+"""
+
+# import libs
+import datetime
+import types
+import json
+import time
+import csv
+import io
+
+# import modules
+from kubipy import metrics
+from kubipy.metrics import RingSeries, MetricsSampler, parse_quantity
+
+
+# helper function to format a timestamp
+def rfc3339(seconds):
+
+    # format like metrics-server
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+# helper function to build a stand-in of the metrics-server
+def metrics_server(pods, nodes = ()):
+
+    """
+    Function to build a fetch function answering the pod and node metrics
+    from dictionaries of name to (seconds, cpu, memory), which the test can
+    change between samples.
+    """
+
+    # answer by path
+    def fetch(path):
+        if path.endswith('/nodes'):
+            return {'items': [{'metadata': {'name': name}, 'timestamp': rfc3339(seconds),
+                               'usage': {'cpu': cpu, 'memory': memory}}
+                              for name, (seconds, cpu, memory) in dict(nodes).items()]}
+        return {'items': [{'metadata': {'name': name}, 'timestamp': rfc3339(seconds),
+                           'containers': [{'usage': {'cpu': cpu, 'memory': memory}},
+                                          {'usage': {'cpu': '0', 'memory': '1Mi'}}]}
+                          for name, (seconds, cpu, memory) in pods.items()]}
+    return fetch
+
+
+# test the quantities
+def test_parse_quantity():
+
+    # cores, bytes and exponents
+    assert parse_quantity('250m') == 0.25
+    assert parse_quantity('1500000n') == 0.0015
+    assert parse_quantity('128Mi') == 128 * 2 ** 20
+    assert parse_quantity('2G') == 2e9
+    assert parse_quantity('1e3') == 1000.0
+    assert parse_quantity('3') == 3.0
+
+
+# test the ring buffer
+def test_ring_series_overwrites_the_oldest_samples():
+
+    # add more samples than fit
+    series = RingSeries(3)
+    assert series.last is None
+    for second in range(1, 6):
+        series.append(float(second), second / 10, second * 100)
+
+    # the last three are kept, oldest first
+    assert len(series) == 3
+    assert series.last == 5.0
+    assert series.window() == ([3.0, 4.0, 5.0], [0.3, 0.4, 0.5], [300.0, 400.0, 500.0])
+    assert series.window(since = 4) == ([4.0, 5.0], [0.4, 0.5], [400.0, 500.0])
+    assert series.window(until = 3.5)[0] == [3.0]
+
+
+# test the sampling
+def test_sample_stores_new_measurements_once():
+
+    # sample a pod and a node twice without a new measurement
+    now = time.time()
+    pods = {'api-1': (now, '250m', '100Mi')}
+    sampler = MetricsSampler(metrics_server(pods, {'minikube': (now, '1', '2Gi')}))
+    assert sampler.sample() == 2
+    assert sampler.sample() == 0
+
+    # a new measurement is stored, the containers are added up
+    pods['api-1'] = (now + 15, '500m', '200Mi')
+    assert sampler.sample() == 1
+    rows = sampler.query(kind = 'pod')
+    assert [row['cpu'] for row in rows] == [0.25, 0.5]
+    assert rows[-1]['memory'] == 201 * 2 ** 20
+    assert sampler.keys() == [('pod', 'api-1'), ('node', 'minikube')]
+
+    # the summary has the mean, the max and the percentiles
+    summary = sampler.summary(name = 'api-*')
+    assert list(summary) == ['pod/api-1']
+    assert summary['pod/api-1']['samples'] == 2
+    assert summary['pod/api-1']['cpu']['mean'] == 0.375
+    assert summary['pod/api-1']['cpu']['max'] == 0.5
+    assert summary['pod/api-1']['cpu']['p50'] == 0.25
+
+
+# test the eviction
+def test_sample_evicts_the_series_of_gone_objects(monkeypatch):
+
+    # keep 10 seconds of samples, at most two series, on a clock of the test
+    now = time.time()
+    clock = [now]
+    monkeypatch.setattr(metrics, 'time', types.SimpleNamespace(time = lambda: clock[0]))
+    pods = {'old-1': (now, '1m', '1Mi')}
+    sampler = MetricsSampler(metrics_server(pods), interval = 1, capacity = 10, nodes = False, max_series = 2)
+    sampler.sample()
+    assert sampler.keys() == [('pod', 'old-1')]
+
+    # a pod that is gone for longer than the samples are kept is dropped
+    clock[0] = now + 60
+    pods.clear()
+    pods['api-1'] = (now + 60, '1m', '1Mi')
+    sampler.sample()
+    assert sampler.keys() == [('pod', 'api-1')]
+
+    # beyond max_series, the series sampled longest ago go first
+    clock[0] = now + 61
+    pods.clear()
+    pods.update({'api-2': (now + 61, '1m', '1Mi'), 'api-3': (now + 61, '1m', '1Mi')})
+    sampler.sample()
+    assert sampler.keys() == [('pod', 'api-2'), ('pod', 'api-3')]
+
+
+# test the exports
+def test_exports_write_rows_as_csv_and_json(tmp_path):
+
+    # sample two pods
+    now = time.time()
+    sampler = MetricsSampler(metrics_server({'api-1': (now, '100m', '1Ki'), 'db-1': (now + 1, '200m', '2Ki')}),
+                             nodes = False)
+    sampler.sample()
+
+    # the CSV has a header and one row per sample, in time order
+    rows = list(csv.DictReader(io.StringIO(sampler.to_csv())))
+    assert [row['name'] for row in rows] == ['api-1', 'db-1']
+    assert list(rows[0]) == ['kind', 'name', 'timestamp', 'cpu', 'memory']
+    assert float(rows[1]['cpu']) == 0.2
+
+    # the JSON holds the rows of query(), filtered like it
+    assert json.loads(sampler.to_json(name = 'db-1')) == sampler.query(name = 'db-1')
+
+    # both are written to files
+    sampler.to_csv(str(tmp_path / 'usage.csv'))
+    sampler.to_json(str(tmp_path / 'usage.json'), kind = 'pod')
+    assert (tmp_path / 'usage.csv').read_bytes().decode('utf-8') == sampler.to_csv()
+    assert len(json.loads((tmp_path / 'usage.json').read_text())) == 2
@@ -0,0 +1,96 @@
+"""
+test_pool.py checks the leasing of ClusterPool with stand-ins of the clusters.
+"""
+
+# import libs
+import threading
+import pytest
+
+# import modules
+from kubipy.pool import ClusterPool
+
+
+# setup class
+class FakeCluster:
+
+    # describe class
+    def __init__(self, profile, starts = True):
+
+        # define the slots
+        self.profile = profile
+        self.starts = starts
+        self.resets = 0
+
+    # function to start the cluster
+    def start(self, cpus = None, memory = None, force = False):
+
+        # fail if asked to
+        if not self.starts:
+            raise Exception('minikube start failed')
+        return {'profile': self.profile}
+
+    # function to reset the cluster
+    def reset(self):
+
+        # count the resets
+        self.resets = self.resets + 1
+
+
+# helper function to build a pool of stand-ins
+def fake_pool(*starts):
+
+    # replace the clusters
+    pool = ClusterPool(size = len(starts))
+    pool.clusters = {profile: FakeCluster(profile, ok) for profile, ok in zip(pool.profiles, starts)}
+    return pool
+
+
+# test the lease before start()
+def test_lease_raises_before_start():
+
+    # nothing runs yet, so waiting would never end
+    with pytest.raises(Exception, match = 'none of them runs'):
+        fake_pool(True).lease()
+
+
+# test a profile that did not start
+def test_lease_raises_when_the_running_clusters_are_gone():
+
+    # one of two profiles fails to start
+    pool = fake_pool(True, False)
+    with pytest.raises(Exception, match = 'kubipy-1'):
+        pool.start()
+
+    # the running one is leased, a second lease waits for it
+    cluster = pool.lease()
+    leased = []
+    waiter = threading.Thread(target = lambda: leased.append(pool.lease(timeout = 5)))
+    waiter.start()
+    pool.release(cluster)
+    waiter.join()
+
+    # it came back reset and was leased again
+    assert leased == [cluster]
+    assert cluster.resets == 1
+
+    # a cluster that is lost as well leaves nothing to wait for
+    def broken(*args, **kwargs):
+        raise Exception('broken')
+    cluster.reset = cluster.start = broken
+    with pytest.raises(Exception, match = 'broken'):
+        pool.release(cluster)
+    with pytest.raises(Exception, match = 'none of them runs'):
+        pool.lease()
+
+
+# test the timeout of a lease
+def test_lease_times_out():
+
+    # lease the only cluster
+    pool = fake_pool(True)
+    pool.start()
+    pool.lease()
+
+    # a second lease gives up
+    with pytest.raises(Exception, match = 'No cluster was free'):
+        pool.lease(timeout = 0.2)
@@ -0,0 +1,19 @@
+"""
+test_records.py checks the column-oriented records of RecordTable.
+"""
+
+# import modules
+from kubipy.records import RecordTable
+
+
+# test a generator of objects
+def test_extend_reads_generators_once_for_every_column():
+
+    # add the pods from a generator, e.g. the pages of a list
+    pods = ({'metadata': {'name': 'api-' + str(index), 'namespace': 'default'}} for index in range(3))
+    records = RecordTable('pods', fields = ('name', 'namespace')).extend(pods)
+
+    # every column has a value per pod
+    assert len(records) == 3
+    assert records.column('name') == ['api-0', 'api-1', 'api-2']
+    assert records.column('namespace') == ['default'] * 3
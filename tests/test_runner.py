@@ -0,0 +1,173 @@
+"""
+test_runner.py checks CommandRunner with real sh and sleep children: the
+kill of process groups, the retries and the statistics.
+"""
+
+# import libs
+import threading
+import time
+import os
+import pytest
+
+# import modules
+from kubipy.runner import CommandRunner, CommandTimeout, CommandCancelled, DEFAULT_RETRY_ON, command_name
+
+
+# helper function to check a process
+def alive(pid):
+
+    # a reaped process is gone, an unreaped one is a zombie
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    try:
+        with open('/proc/' + str(pid) + '/stat') as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return True
+
+
+# helper function to wait for a condition
+def eventually(condition, timeout = 5):
+
+    # poll until the condition holds or the time is up
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+# helper function to start a shell that leaves a sleeping child
+def sleeper(tmp_path):
+
+    # the shell writes the pid of its child and waits for it
+    pidfile = tmp_path / 'child.pid'
+    return pidfile, ['sh', '-c', 'sleep 30 & echo $! > ' + str(pidfile) + '; wait']
+
+
+# test the kill on timeout
+def test_timeout_kills_the_process_group(tmp_path):
+
+    # run a shell whose child outlives the timeout
+    pidfile, command = sleeper(tmp_path)
+    runner = CommandRunner(kill_grace = 0.2)
+    started = time.monotonic()
+    with pytest.raises(CommandTimeout):
+        runner.run(command, timeout = 0.5)
+
+    # the child went down with the shell
+    assert time.monotonic() - started < 5
+    assert eventually(lambda: not alive(int(pidfile.read_text())))
+    assert runner.stats()[command_name(command)]['failures'] == 1
+
+
+# test the kill on cancel()
+def test_cancel_kills_running_commands(tmp_path):
+
+    # run a shell whose child would sleep for long in a thread
+    pidfile, command = sleeper(tmp_path)
+    runner = CommandRunner(kill_grace = 0.2)
+    errors = []
+    def run():
+        try:
+            runner.run(command)
+        except CommandCancelled as error:
+            errors.append(error)
+    thread = threading.Thread(target = run)
+    thread.start()
+    assert eventually(lambda: pidfile.exists() and pidfile.read_text().strip())
+
+    # cancel it
+    runner.cancel()
+    thread.join(5)
+
+    # the caller got CommandCancelled, the child is gone and nothing new starts
+    assert not thread.is_alive()
+    assert len(errors) == 1
+    assert eventually(lambda: not alive(int(pidfile.read_text())))
+    with pytest.raises(CommandCancelled):
+        runner.run(['true'])
+
+    # commands run again after reset_cancel()
+    runner.reset_cancel()
+    assert runner.run(['true']).returncode == 0
+
+
+# helper function to build a failing command that counts its attempts
+def failing(tmp_path, message):
+
+    # append a line per attempt and fail with the message
+    counter = tmp_path / 'attempts'
+    return counter, ['sh', '-c', 'echo x >> ' + str(counter) + '; echo "' + message + '" >&2; exit 1']
+
+
+# test the retries of transient failures
+def test_apply_retries_transient_failures(tmp_path):
+
+    # fail like an API server that restarts
+    counter, command = failing(tmp_path, 'The connection to the server was refused: connection refused')
+    result = CommandRunner().run(command, retries = 2, backoff = 0.01, retry_on = DEFAULT_RETRY_ON['apply'])
+
+    # every attempt was used
+    assert result.returncode == 1
+    assert len(counter.read_text().split()) == 3
+
+
+# test the retries of permanent failures
+def test_apply_does_not_retry_rejected_manifests(tmp_path):
+
+    # fail like a rejected manifest
+    counter, command = failing(tmp_path, 'error: error validating "deployment.yaml": unknown field')
+    result = CommandRunner().run(command, retries = 2, backoff = 0.01, retry_on = DEFAULT_RETRY_ON['apply'])
+
+    # it failed right away
+    assert result.returncode == 1
+    assert len(counter.read_text().split()) == 1
+
+
+# test the retries without a filter
+def test_retries_every_failure_by_default(tmp_path):
+
+    # fail with any message
+    counter, command = failing(tmp_path, 'anything')
+    CommandRunner().run(command, retries = 2, backoff = 0.01)
+
+    # every attempt was used
+    assert len(counter.read_text().split()) == 3
+
+
+# test the statistics
+def test_stats_keep_totals_beyond_the_history():
+
+    # run a slow command, then more fast ones than the history keeps
+    runner = CommandRunner(history_size = 2)
+    runner.run(['sleep', '0.3'])
+    for _ in range(3):
+        runner.run(['sleep', '0'])
+    failed = runner.run(['sh', '-c', 'printf abc; exit 3'])
+
+    # count, seconds and max cover every run, the percentiles the recent ones
+    stats = runner.stats()
+    assert stats['sleep 0.3']['count'] == 1
+    assert stats['sleep 0']['count'] == 3
+    assert stats['sleep 0']['max'] <= stats['sleep 0.3']['max']
+    assert stats[failed.name]['failures'] == 1
+    assert stats[failed.name]['stdout_bytes'] == 3
+    assert list(stats)[0] == 'sleep 0.3'
+
+    # the max outlives the history of a command
+    runner = CommandRunner(history_size = 2)
+    for seconds in ('0.3', '0', '0', '0'):
+        runner.run('sleep ' + seconds + ' && true', shell = True)
+    stats = runner.stats()['true']
+    assert stats['count'] == 4
+    assert stats['max'] >= 0.3
+    assert stats['p95'] < 0.3
+    assert stats['seconds'] >= 0.3
+
+    # reset_stats() forgets everything
+    runner.reset_stats()
+    assert runner.stats() == {}